@@ -14,11 +14,13 @@ interface Message {
   payload: string;
   timestamp: string;
   correlation_id?: string;
+  seq?: number;
 }
 
 interface Agent {
   agent_id: string;
   last_message_time?: string;
+  unread_count?: number;
 }
 
 export default function ChatPage() {
@@ -34,7 +36,10 @@ export default function ChatPage() {
   const [isConnected, setIsConnected] = useState(false);
   const [typingAgents, setTypingAgents] = useState<Set<string>>(new Set());
   const messagesEndRef = useRef<HTMLDivElement>(null);
-  const eventSourceRef = useRef<EventSource | null>(null);
+  const socketRef = useRef<WebSocket | null>(null);
+  const lastSeqRef = useRef(0);
+  const selectedAgentRef = useRef('');
+  const pendingSendsRef = useRef<Map<string, Message>>(new Map());
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -53,114 +58,143 @@ export default function ChatPage() {
     }
   }, [isLoggedIn, token]);
 
-  // Setup SSE connection for real-time messages
+  // Setup WebSocket connection for real-time messages and sends
   useEffect(() => {
     if (isLoggedIn && token && agentId) {
-      connectSSE();
+      connectSocket();
       return () => {
-        if (eventSourceRef.current) {
-          eventSourceRef.current.close();
-          eventSourceRef.current = null;
-        }
+        const socket = socketRef.current;
+        socketRef.current = null;
+        socket?.close();
       };
     }
   }, [isLoggedIn, token, agentId]);
 
   // Load initial conversation when agent is selected
   useEffect(() => {
+    selectedAgentRef.current = selectedAgent;
     if (selectedAgent && token) {
       loadConversation();
     }
   }, [selectedAgent, token]);
 
-  const connectSSE = () => {
+  const addIncomingMessage = (newMessage: Message) => {
+    console.log('📨 New message received:', newMessage);
+    if (newMessage.seq) {
+      lastSeqRef.current = Math.max(lastSeqRef.current, newMessage.seq);
+    }
+
+    // Remove typing indicator when agent responds
+    if (newMessage.sender_id !== agentId) {
+      setTypingAgents(prev => {
+        const updated = new Set(prev);
+        updated.delete(newMessage.sender_id);
+        return updated;
+      });
+    }
+
+    setMessages((prevMessages) => {
+      // Check if message already exists (check both temp and real IDs)
+      const exists = prevMessages.some(m => 
+        m.message_id === newMessage.message_id ||
+        (m.sender_id === newMessage.sender_id && 
+         m.recipient_id === newMessage.recipient_id &&
+         m.payload === newMessage.payload &&
+         Math.abs(new Date(m.timestamp).getTime() - new Date(newMessage.timestamp).getTime()) < 2000)
+      );
+      
+      if (exists) {
+        // Replace temp message if this is the real one
+        return prevMessages.map(m => 
+          m.message_id.startsWith('temp-') && 
+          m.payload === newMessage.payload &&
+          m.sender_id === newMessage.sender_id
+            ? newMessage
+            : m
+        );
+      }
+
+      // Check if message is part of selected conversation
+      if (selectedAgent && 
+          ((newMessage.sender_id === agentId && newMessage.recipient_id === selectedAgent) ||
+           (newMessage.sender_id === selectedAgent && newMessage.recipient_id === agentId))) {
+        return [...prevMessages, newMessage];
+      }
+      
+      return prevMessages;
+    });
+
+    // A message arriving in the open conversation is read right away
+    if (newMessage.sender_id !== agentId && newMessage.sender_id === selectedAgentRef.current) {
+      markConversationRead(newMessage.sender_id);
+    } else {
+      // Refresh agents list to update last message time and unread counts
+      loadAgents();
+    }
+  };
+
+  const connectSocket = () => {
     // Close existing connection if any
-    if (eventSourceRef.current) {
-      eventSourceRef.current.close();
+    if (socketRef.current) {
+      socketRef.current.close();
     }
 
-    console.log('🔌 Connecting to SSE stream...');
-    const eventSource = new EventSource(
-      `${API_URL}/messages/stream?agent_id=${agentId}&token=${token}`
+    // One socket for both directions: authenticated once, then sends and deliveries share it
+    console.log('🔌 Connecting WebSocket...');
+    const resume = lastSeqRef.current ? `&after_seq=${lastSeqRef.current}` : '';
+    const socket = new WebSocket(
+      `${API_URL.replace(/^http/, 'ws')}/ws?agent_id=${encodeURIComponent(agentId)}&token=${token}${resume}`
     );
 
-    eventSource.onopen = () => {
-      console.log('✅ SSE Connected');
+    socket.onopen = () => {
+      console.log('✅ WebSocket Connected');
       setIsConnected(true);
     };
 
-    eventSource.onmessage = (event) => {
-      // Skip heartbeat messages
-      if (event.data === 'heartbeat' || event.data === ':heartbeat') {
-        return;
-      }
-
+    socket.onmessage = (event) => {
       try {
-        const newMessage: Message = JSON.parse(event.data);
-        console.log('📨 New message received:', newMessage);
-
-        // Remove typing indicator when agent responds
-        if (newMessage.sender_id !== agentId) {
-          setTypingAgents(prev => {
-            const updated = new Set(prev);
-            updated.delete(newMessage.sender_id);
-            return updated;
-          });
-        }
-
-        setMessages((prevMessages) => {
-          // Check if message already exists (check both temp and real IDs)
-          const exists = prevMessages.some(m => 
-            m.message_id === newMessage.message_id ||
-            (m.sender_id === newMessage.sender_id && 
-             m.recipient_id === newMessage.recipient_id &&
-             m.payload === newMessage.payload &&
-             Math.abs(new Date(m.timestamp).getTime() - new Date(newMessage.timestamp).getTime()) < 2000)
+        const frame = JSON.parse(event.data);
+        if (frame.type === 'message') {
+          addIncomingMessage(frame.message);
+        } else if (frame.type === 'ack') {
+          pendingSendsRef.current.delete(frame.ref);
+          // Replace the optimistic message's temp ID with the real one
+          setMessages((prevMessages) => 
+            prevMessages.map(msg => 
+              msg.message_id === frame.ref 
+                ? { ...msg, message_id: frame.message_id }
+                : msg
+            )
           );
-          
-          if (exists) {
-            // Replace temp message if this is the real one
-            return prevMessages.map(m => 
-              m.message_id.startsWith('temp-') && 
-              m.payload === newMessage.payload &&
-              m.sender_id === newMessage.sender_id
-                ? newMessage
-                : m
-            );
+        } else if (frame.type === 'error') {
+          console.error('Failed to send message:', frame.detail);
+          if (frame.ref) {
+            dropOptimisticMessage(frame.ref);
           }
-
-          // Check if message is part of selected conversation
-          if (selectedAgent && 
-              ((newMessage.sender_id === agentId && newMessage.recipient_id === selectedAgent) ||
-               (newMessage.sender_id === selectedAgent && newMessage.recipient_id === agentId))) {
-            return [...prevMessages, newMessage];
-          }
-          
-          return prevMessages;
-        });
-
-        // Refresh agents list to update last message time
-        loadAgents();
+        }
       } catch (error) {
-        console.error('Failed to parse SSE message:', error);
+        console.error('Failed to parse WebSocket frame:', error);
       }
     };
 
-    eventSource.onerror = (error) => {
-      console.error('❌ SSE Error:', error);
+    socket.onclose = () => {
+      console.error('❌ WebSocket closed');
       setIsConnected(false);
-      eventSource.close();
+      if (socketRef.current !== socket) {
+        return;  // Replaced or cleaned up on purpose
+      }
+      socketRef.current = null;
 
-      // Attempt to reconnect after 3 seconds
+      // Attempt to reconnect after 3 seconds, resuming after the last seq seen
       setTimeout(() => {
         if (isLoggedIn && token && agentId) {
-          console.log('🔄 Reconnecting SSE...');
-          connectSSE();
+          console.log('🔄 Reconnecting WebSocket...');
+          connectSocket();
         }
       }, 3000);
     };
 
-    eventSourceRef.current = eventSource;
+    socketRef.current = socket;
   };
 
   const handleLogin = async (e: React.FormEvent) => {
@@ -208,12 +242,25 @@ export default function ChatPage() {
       );
       // Reverse to show oldest first
       setMessages(response.data.reverse());
+      markConversationRead(selectedAgent);
     } catch (error) {
       console.error('Failed to load conversation:', error);
       setMessages([]);
     }
   };
 
+  const markConversationRead = async (otherAgentId: string) => {
+    try {
+      await axios.post(`${API_URL}/conversations/${otherAgentId}/read`, null, {
+        params: { agent_id: agentId },
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      loadAgents();
+    } catch (error) {
+      console.error('Failed to mark conversation read:', error);
+    }
+  };
+
   const sendMessage = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!messageInput.trim() || !selectedAgent) return;
@@ -238,7 +285,23 @@ export default function ChatPage() {
 
     // Add optimistic message immediately
     setMessages((prevMessages) => [...prevMessages, optimisticMessage]);
+    pendingSendsRef.current.set(optimisticMessage.message_id, optimisticMessage);
+
+    // Over the open socket the ack (or error) arrives as a frame, handled in connectSocket
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({
+        type: 'send',
+        ref: optimisticMessage.message_id,
+        recipient_id: selectedAgent,
+        message_type: 1,
+        payload: messageContent
+      }));
+      setIsLoading(false);
+      return;
+    }
 
+    // Not connected: fall back to the REST endpoint
     try {
       const response = await axios.post(
         `${API_URL}/messages/send`,
@@ -255,6 +318,7 @@ export default function ChatPage() {
       );
       
       // Replace optimistic message with real one from server
+      pendingSendsRef.current.delete(optimisticMessage.message_id);
       const realMessageId = response.data.message_id;
       setMessages((prevMessages) => 
         prevMessages.map(msg => 
@@ -265,19 +329,27 @@ export default function ChatPage() {
       );
     } catch (error) {
       console.error('Failed to send message:', error);
-      // Remove optimistic message on error
-      setMessages((prevMessages) => 
-        prevMessages.filter(msg => msg.message_id !== optimisticMessage.message_id)
-      );
-      // Remove typing indicator on error
+      dropOptimisticMessage(optimisticMessage.message_id);
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
+  const dropOptimisticMessage = (tempId: string) => {
+    const pending = pendingSendsRef.current.get(tempId);
+    pendingSendsRef.current.delete(tempId);
+    // Remove optimistic message on error
+    setMessages((prevMessages) => 
+      prevMessages.filter(msg => msg.message_id !== tempId)
+    );
+    if (pending) {
+      // Remove typing indicator and give the text back to retry
       setTypingAgents(prev => {
         const updated = new Set(prev);
-        updated.delete(selectedAgent);
+        updated.delete(pending.recipient_id);
         return updated;
       });
-      setMessageInput(messageContent);
-    } finally {
-      setIsLoading(false);
+      setMessageInput(pending.payload);
     }
   };
 
@@ -381,7 +453,13 @@ export default function ChatPage() {
                     <Bot className="h-5 w-5" />
                     <span className="font-medium">{agent.agent_id}</span>
                   </div>
-                  <div className="h-2 w-2 rounded-full bg-green-400" />
+                  {agent.unread_count && selectedAgent !== agent.agent_id ? (
+                    <span className="min-w-5 px-1.5 py-0.5 rounded-full bg-purple-500 text-xs font-semibold text-white text-center">
+                      {agent.unread_count}
+                    </span>
+                  ) : (
+                    <div className="h-2 w-2 rounded-full bg-green-400" />
+                  )}
                 </div>
               </button>
             ))}
@@ -56,10 +56,10 @@ export function useSSE(url: string, enabled: boolean = true) {
       }
     });
 
-    eventSource.addEventListener('error', (error) => {
-      console.error('❌ SSE: Connection error');
+    eventSource.addEventListener('error', () => {
+      // Left open so EventSource reconnects with Last-Event-ID and the server replays what was missed
+      console.error('❌ SSE: Connection error, reconnecting');
       setIsConnected(false);
-      eventSource.close();
     });
 
     return () => {
@@ -15,6 +15,7 @@ export interface Message {
 export interface Agent {
   agent_id: string;
   last_message_time: string | null;
+  unread_count: number;
 }
 
 export async function fetchMessages(
@@ -70,3 +71,18 @@ export async function fetchConversation(
   );
   return response.data;
 }
+
+export async function markConversationRead(
+  agentId: string,
+  otherAgentId: string,
+  token: string
+): Promise<void> {
+  await axios.post(`${API_URL}/conversations/${otherAgentId}/read`, null, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
+    params: {
+      agent_id: agentId,
+    },
+  });
+}
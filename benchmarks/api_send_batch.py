@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compare POST /messages/send with POST /messages/send_batch.
+
+Drives the FastAPI app in-process over httpx's ASGI transport, so the
+numbers include request parsing, JWT checks and validation but no network.
+The store comes from AGENT_STORE as usual. It defaults to "memory" here; set
+AGENT_STORE=postgres to include the INSERT vs COPY difference.
+
+Usage: python benchmarks/api_send_batch.py [messages] [batch size]
+"""
+
+import asyncio
+import os
+import sys
+import time
+import warnings
+
+# The repo's development JWT secret is shorter than PyJWT recommends
+warnings.filterwarnings("ignore", message="The HMAC key")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("AGENT_STORE", "memory")
+
+import httpx  # noqa: E402
+from server import api  # noqa: E402
+
+SENDER = "bench-sender"
+
+
+def message(i):
+    return {
+        "sender_id": SENDER,
+        "recipient_id": f"bench-agent-{i % 500}",
+        "message_type": 0,
+        "payload": f'{{"task": {i}, "description": "seeded by the batch benchmark"}}',
+    }
+
+
+async def main(total, batch_size):
+    await api.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post("/token", json={"agent_id": SENDER})).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            start = time.perf_counter()
+            for i in range(total):
+                response = await client.post("/messages/send", json=message(i), headers=headers)
+                response.raise_for_status()
+            single = total / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for offset in range(0, total, batch_size):
+                batch = [message(i) for i in range(offset, min(offset + batch_size, total))]
+                response = await client.post("/messages/send_batch", json=batch, headers=headers)
+                response.raise_for_status()
+            batched = total / (time.perf_counter() - start)
+    finally:
+        await api.shutdown_event()
+
+    print(f"store: {os.environ['AGENT_STORE']}, {total} messages")
+    print(f"{'endpoint':>28}  {'msgs/s':>10}")
+    print(f"{'/messages/send':>28}  {single:>10.0f}")
+    print(f"{f'/messages/send_batch ({batch_size})':>28}  {batched:>10.0f}")
+    print(f"speedup: {batched / single:.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    total = args[0] if args else 5000
+    batch_size = args[1] if len(args) > 1 else 500
+    asyncio.run(main(total, batch_size))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare sending over POST /messages/send with sending over the /ws WebSocket.
+
+Drives the FastAPI app in-process through Starlette's TestClient, so the
+numbers include request parsing, JWT checks and validation but no network.
+"round trip" waits for each response or ack before sending the next message,
+like an interactive chat; "pipelined" sends everything on the socket first
+and then reads the acks. The store comes from AGENT_STORE as usual and
+defaults to "memory" here. The sender's own messages are echoed back on the
+socket, so runs much larger than the per-stream queue (1,000 rows) can be
+closed for falling behind, just like an SSE stream.
+
+Usage: python benchmarks/api_websocket.py [messages]
+"""
+
+import json
+import os
+import sys
+import time
+import warnings
+
+# The repo's development JWT secret is shorter than PyJWT recommends
+warnings.filterwarnings("ignore", message="The HMAC key")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("AGENT_STORE", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from server import api  # noqa: E402
+
+SENDER = "bench-sender"
+
+
+def message(i):
+    return {
+        "recipient_id": f"bench-agent-{i % 500}",
+        "message_type": 0,
+        "payload": f'{{"task": {i}, "description": "seeded by the websocket benchmark"}}',
+    }
+
+
+def read_acks(ws, count):
+    """Read frames until ``count`` acks have arrived (the sender's own messages come back too)"""
+    acks = 0
+    while acks < count:
+        frame = json.loads(ws.receive_text())
+        if frame["type"] == "error":
+            raise RuntimeError(frame)
+        acks += frame["type"] == "ack"
+
+
+def main(total):
+    with TestClient(api.app) as client:
+        token = client.post("/token", json={"agent_id": SENDER}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        start = time.perf_counter()
+        for i in range(total):
+            response = client.post("/messages/send", json={"sender_id": SENDER, **message(i)}, headers=headers)
+            response.raise_for_status()
+        http = time.perf_counter() - start
+
+        with client.websocket_connect(f"/ws?agent_id={SENDER}&token={token}") as ws:
+            start = time.perf_counter()
+            for i in range(total):
+                ws.send_text(json.dumps({"type": "send", "ref": i, **message(i)}))
+                read_acks(ws, 1)
+            round_trip = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(total):
+                ws.send_text(json.dumps({"type": "send", "ref": i, **message(i)}))
+            read_acks(ws, total)
+            pipelined = time.perf_counter() - start
+
+    print(f"store: {os.environ['AGENT_STORE']}, {total} messages")
+    print(f"{'transport':>28}  {'us/msg':>8}  {'msgs/s':>8}")
+    for name, elapsed in (
+        ("POST /messages/send", http),
+        ("/ws round trip", round_trip),
+        ("/ws pipelined", pipelined),
+    ):
+        print(f"{name:>28}  {elapsed / total * 1e6:>8.0f}  {total / elapsed:>8.0f}")
+    print(f"round trip speedup: {http / round_trip:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
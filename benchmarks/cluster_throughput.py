@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark DIRECT message throughput across a hub cluster on localhost.
+
+Starts each node in its own process with real gRPC peer links (no database,
+no agent streams). Every node owns an equal share of in-memory agents,
+picked by the consistent-hash ring, and pushes MESSAGES direct messages from
+its agents to random agents anywhere in the cluster through
+AgentCommServicer.route_message. Messages for agents owned elsewhere take
+one hop over the peer link. The load per node is fixed, so with enough cores
+the total throughput should grow with the node count.
+
+Usage: python benchmarks/cluster_throughput.py [node counts...]
+"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import random
+import sys
+import time
+import warnings
+
+# The repo's development JWT secret is shorter than PyJWT recommends
+warnings.filterwarnings("ignore", message="The HMAC key")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import grpc  # noqa: E402
+import agent_comm_pb2  # noqa: E402
+import agent_comm_pb2_grpc  # noqa: E402
+from cluster import ClusterNode  # noqa: E402
+from delivery import DeliveredSeqs  # noqa: E402
+from main import AgentCommServicer, AgentClusterServicer, JWT_SECRET, JWT_ALGORITHM  # noqa: E402
+from storage import MemoryStore  # noqa: E402
+
+MESSAGES = 20000        # sent by each node
+AGENTS_PER_NODE = 200
+BASE_PORT = 51200
+TIMEOUT = 120
+
+
+async def node_main(node_id, index, nodes, agents, delivered, ready, go, done):
+    cluster = ClusterNode(node_id, nodes, JWT_SECRET, JWT_ALGORITHM)
+    servicer = AgentCommServicer(MemoryStore(), cluster=cluster)
+    server = grpc.aio.server()
+    agent_comm_pb2_grpc.add_AgentClusterServicer_to_server(AgentClusterServicer(servicer), server)
+    server.add_insecure_port(nodes[node_id])
+    await server.start()
+    await cluster.start()
+
+    local_agents = [agent_id for agent_id in agents if cluster.owns(agent_id)]
+    for agent_id in local_agents:
+        queue = await servicer.register_queue(agent_id, DeliveredSeqs())
+        queue.finish_replay()
+
+    async def drain(queue):
+        while True:
+            frames = await queue.get_batch()
+            delivered.value += len(frames)
+
+    drainers = [asyncio.create_task(drain(queue)) for queue in servicer.agent_queues.values()]
+    loop = asyncio.get_running_loop()
+    ready.set()
+    await loop.run_in_executor(None, go.wait)
+
+    rng = random.Random(index)
+    for i in range(MESSAGES):
+        msg = agent_comm_pb2.AgentMessage(
+            sender_id=rng.choice(local_agents),
+            recipient_id=rng.choice(agents),
+            message_type=agent_comm_pb2.AgentMessage.DIRECT,
+            payload=b"cluster benchmark payload",
+        )
+        # Stored first, as the writer would, so local and forwarded messages share the node's seqs
+        await servicer.store.save_messages([msg])
+        await servicer.route_message(msg)
+        if i % 256 == 0:
+            # Let the peer links and drainers catch up instead of overflowing them
+            while any(link.pending.qsize() > 5000 for link in cluster.links.values()):
+                await asyncio.sleep(0.001)
+            await asyncio.sleep(0)
+
+    await loop.run_in_executor(None, done.wait)
+    for task in drainers:
+        task.cancel()
+    await cluster.stop()
+    await server.stop(0)
+
+
+def run_node(*args):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(node_main(*args))
+
+
+def bench(node_count):
+    ctx = multiprocessing.get_context("spawn")
+    nodes = {f"node-{i}": f"127.0.0.1:{BASE_PORT + i}" for i in range(node_count)}
+    agents = [f"agent-{i}" for i in range(AGENTS_PER_NODE * node_count)]
+
+    go, done = ctx.Event(), ctx.Event()
+    counters, readies, processes = [], [], []
+    for index, node_id in enumerate(nodes):
+        delivered, ready = ctx.Value("q", 0, lock=False), ctx.Event()
+        process = ctx.Process(target=run_node, args=(node_id, index, nodes, agents, delivered, ready, go, done))
+        process.start()
+        counters.append(delivered)
+        readies.append(ready)
+        processes.append(process)
+
+    for ready in readies:
+        ready.wait(TIMEOUT)
+    expected = MESSAGES * node_count
+    start = time.perf_counter()
+    go.set()
+    while sum(c.value for c in counters) < expected and time.perf_counter() - start < TIMEOUT:
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    received = sum(c.value for c in counters)
+    done.set()
+    for process in processes:
+        process.join()
+    return received, elapsed
+
+
+def main(counts):
+    print(f"CPU cores: {os.cpu_count()}")
+    print(f"{'nodes':>6} {'messages':>9} {'remote %':>9} {'seconds':>8} {'msgs/s':>10} {'speedup':>8}")
+    baseline = None
+    for count in counts:
+        received, elapsed = bench(count)
+        remote = 1 - 1 / count  # share of recipients owned by another node
+        rate = received / elapsed
+        baseline = baseline or rate
+        print(f"{count:>6} {received:>9} {remote * 100:>8.0f}% {elapsed:>8.2f} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 2, 4])
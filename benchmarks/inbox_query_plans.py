@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Check that the inbox queries in server/storage/postgres.py are index-backed.
+
+Connects with the same AGENT_DB_* settings as the servers (which also applies
+the migrations), then runs EXPLAIN on every inbox query with sequential scans
+disabled. A query that still plans a Seq Scan on agent_messages has no usable
+index, and the script exits non-zero. With --analyze it also runs each query
+and prints its execution time.
+
+Usage: python benchmarks/inbox_query_plans.py [--analyze] [agent_id]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from storage import create_store  # noqa: E402
+from storage.postgres import (  # noqa: E402
+    agent_messages_query,
+    agent_summaries_query,
+    conversation_query,
+    inbox_query,
+    search_query,
+    thread_query,
+)
+
+
+def plan_cases(agent_id):
+    hour_ago = time.time() - 3600
+    cursor = (hour_ago, "00000000-0000-0000-0000-000000000000")
+    return [
+        ("inbox", inbox_query(agent_id, 0)),
+        ("inbox with sent (SSE)", inbox_query(agent_id, 0, include_sent=True)),
+        ("messages", agent_messages_query(agent_id)),
+        ("messages last hour, type 0", agent_messages_query(agent_id, start_time=hour_ago, message_type=0)),
+        ("messages before cursor", agent_messages_query(agent_id, before=cursor)),
+        ("conversation", conversation_query(agent_id, agent_id + "-peer")),
+        ("conversation after cursor", conversation_query(agent_id, agent_id + "-peer", after=cursor)),
+        ("agent summaries", agent_summaries_query(agent_id)),
+        ("search", search_query(agent_id, "status report")),
+        ("search page 2, from sender", search_query(agent_id, "status", sender_id=agent_id + "-peer",
+                                                    cursor=(0.1, hour_ago, cursor[1]))),
+        ("thread", thread_query(agent_id + "_to_code-agent_0", agent_id)),
+        ("thread after cursor", thread_query(agent_id + "_to_code-agent_0", agent_id, after=cursor)),
+    ]
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+async def main(agent_id, analyze):
+    store = create_store("postgres")
+    await store.connect()
+    failures = []
+    try:
+        async with store.pool.acquire() as conn, conn.transaction():
+            # Small test tables make a seq scan cheapest; this asks whether an index scan is possible at all
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            explain = "EXPLAIN (ANALYZE, FORMAT JSON) " if analyze else "EXPLAIN (FORMAT JSON) "
+            for name, (query, *params) in plan_cases(agent_id):
+                plan = json.loads(await conn.fetchval(explain + query, *params))[0]
+                nodes = list(walk(plan["Plan"]))
+                scans = sorted({
+                    f"{node['Node Type']} {node.get('Index Name', '')}".strip()
+                    # agent_messages itself, one of its partitions, or the summary table
+                    for node in nodes
+                    if node.get("Relation Name", "").startswith(("agent_messages", "conversation_summaries"))
+                })
+                seq_scans = [scan for scan in scans if scan.startswith("Seq Scan")]
+                timing = f" {plan['Execution Time']:.2f} ms" if analyze else ""
+                print(f"{'❌' if seq_scans else '✅'} {name}{timing}")
+                for scan in scans:
+                    print(f"     {scan}")
+                if seq_scans:
+                    failures.append(name)
+    finally:
+        await store.close()
+
+    if failures:
+        print(f"Sequential scans in: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    analyze = "--analyze" in args
+    args = [arg for arg in args if arg != "--analyze"]
+    sys.exit(asyncio.run(main(args[0] if args else "agent-1", analyze)))
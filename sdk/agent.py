@@ -7,22 +7,32 @@ from server import agent_comm_pb2, agent_comm_pb2_grpc
 
 import sys
 
+# Most messages coalesced into one AgentMessageBatch frame
+MAX_BATCH_MESSAGES = 256
+# Ping the server so a dead connection is noticed (and reported offline) without waiting on TCP
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 20000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+]
 
 class AgentClient:
-    def __init__(self, agent_id, server_address='localhost:50051'):
+    def __init__(self, agent_id, server_address='localhost:50051', batched=True):
         self.agent_id = agent_id
         self.server_address = server_address
+        self.batched = batched  # Use StreamMessageBatches instead of one frame per message
         self.token = None
         self.send_queue = asyncio.Queue()  # Queue for outgoing messages
+        self.last_seq = 0  # Highest seq received, used to resume after reconnecting
+        self.topics = set()  # Topic patterns to (re)subscribe to on connect
 
     async def message_generator(self):
         """Async generator to send messages from the queue."""
-        # Send initial connection message immediately
+        # Send initial connection message immediately; the server only uses it to mark us online
         initial_msg = agent_comm_pb2.AgentMessage(
             sender_id=self.agent_id,
             recipient_id="",
-            message_type=agent_comm_pb2.AgentMessage.EVENT,
-            payload=b"initial_connection",
+            message_type=agent_comm_pb2.AgentMessage.HEARTBEAT,
             timestamp=int(time.time()),
             correlation_id=str(uuid.uuid4())
         )
@@ -35,33 +45,52 @@ class AgentClient:
                 msg = self.send_queue.get_nowait()
                 yield msg
             except asyncio.QueueEmpty:
-                # No message queued, send heartbeat
+                # No message queued, send heartbeat (updates presence, never stored or broadcast)
                 heartbeat_msg = agent_comm_pb2.AgentMessage(
                     sender_id=self.agent_id,
                     recipient_id="",
-                    message_type=agent_comm_pb2.AgentMessage.EVENT,
-                    payload=b"heartbeat",
+                    message_type=agent_comm_pb2.AgentMessage.HEARTBEAT,
                     timestamp=int(time.time()),
                     correlation_id=str(uuid.uuid4())
                 )
                 yield heartbeat_msg
                 await asyncio.sleep(10)
 
+    async def batch_generator(self):
+        """Coalesce everything queued at the time of sending into one AgentMessageBatch frame."""
+        async for msg in self.message_generator():
+            batch = [msg]
+            while len(batch) < MAX_BATCH_MESSAGES:
+                try:
+                    batch.append(self.send_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            yield agent_comm_pb2.AgentMessageBatch(messages=batch)
+
     async def receive_messages(self, call):
         """Task to receive messages from server."""
         try:
             async for response in call:
-                print(f"Received from server: {response.payload.decode()}")
+                for msg in (response.messages if self.batched else [response]):
+                    self.last_seq = max(self.last_seq, msg.seq)
+                    print(f"Received from server: {msg.payload.decode()}")
         except asyncio.CancelledError:
             print("Receive messages task was cancelled (stream closed).")
         except grpc.aio.AioRpcError as e:
             print(f"gRPC error received: {e}")
 
     async def run(self):
-        async with grpc.aio.insecure_channel(self.server_address) as channel:
+        async with grpc.aio.insecure_channel(self.server_address, options=KEEPALIVE_OPTIONS) as channel:
             stub = agent_comm_pb2_grpc.AgentCommStub(channel)
             metadata = [("authorization", f"Bearer {self.token}")]
-            call = stub.StreamMessages(self.message_generator(), metadata=metadata)
+            if self.last_seq:
+                metadata.append(("resume-from-seq", str(self.last_seq)))
+            if self.topics:
+                metadata.append(("subscribe-topics", ",".join(sorted(self.topics))))
+            if self.batched:
+                call = stub.StreamMessageBatches(self.batch_generator(), metadata=metadata)
+            else:
+                call = stub.StreamMessages(self.message_generator(), metadata=metadata)
 
             receive_task = asyncio.create_task(self.receive_messages(call))
 
@@ -95,14 +124,24 @@ class AgentClient:
             self.token = response.token
             self.agent_id = response.agent_id
 
-    async def send_direct_message(self, recipient_id, text):
+    async def locate(self):
+        """Switch to the cluster node that owns this agent (a no-op against a single server)"""
+        async with grpc.aio.insecure_channel(self.server_address) as channel:
+            stub = agent_comm_pb2_grpc.AgentRegistryStub(channel)
+            response = await stub.LocateAgent(agent_comm_pb2.LocateAgentRequest(agent_id=self.agent_id))
+        if response.address and response.address != self.server_address:
+            print(f"Agent is owned by node {response.node_id} at {response.address}")
+            self.server_address = response.address
+
+    async def send_direct_message(self, recipient_id, text, correlation_id=None):
+        """Pass the correlation_id of a message being answered to keep both in one thread"""
         msg = agent_comm_pb2.AgentMessage(
             sender_id=self.agent_id,
             recipient_id=recipient_id,
             message_type=agent_comm_pb2.AgentMessage.DIRECT,
             payload=text.encode(),
             timestamp=int(time.time()),
-            correlation_id=str(uuid.uuid4())
+            correlation_id=correlation_id or str(uuid.uuid4())
         )
         print(f"Sending direct message: {text}")
         await self.send_queue.put(msg)
@@ -131,9 +170,41 @@ class AgentClient:
         print(f"Sending event message: {event_data}")
         await self.send_queue.put(msg)
 
+    async def publish(self, topic, event_data):
+        """Send an EVENT that only reaches agents subscribed to a matching topic pattern"""
+        msg = agent_comm_pb2.AgentMessage(
+            sender_id=self.agent_id,
+            recipient_id="",
+            message_type=agent_comm_pb2.AgentMessage.EVENT,
+            payload=event_data.encode(),
+            timestamp=int(time.time()),
+            correlation_id=str(uuid.uuid4()),
+            topic=topic
+        )
+        print(f"Publishing to {topic}: {event_data}")
+        await self.send_queue.put(msg)
+
+    async def subscribe(self, pattern):
+        """Subscribe to a topic pattern, e.g. "tasks.code.*" ("*" = one segment, "#" = any)"""
+        self.topics.add(pattern)
+        await self.send_queue.put(agent_comm_pb2.AgentMessage(
+            sender_id=self.agent_id,
+            message_type=agent_comm_pb2.AgentMessage.SUBSCRIBE,
+            topic=pattern
+        ))
+
+    async def unsubscribe(self, pattern):
+        self.topics.discard(pattern)
+        await self.send_queue.put(agent_comm_pb2.AgentMessage(
+            sender_id=self.agent_id,
+            message_type=agent_comm_pb2.AgentMessage.UNSUBSCRIBE,
+            topic=pattern
+        ))
+
 
 async def main(agent):
     await agent.register_agent()
+    await agent.locate()
     await agent.run()
 
 
@@ -1,12 +1,16 @@
 import asyncio
 import requests
 from groq import AsyncGroq
-from agent_comm_pb2 import AgentMessage
+from agent_comm_pb2 import AgentMessage, AgentMessageBatch
 from agent_comm_pb2_grpc import AgentCommStub
 import grpc
 import json
 import time
 import random
+import uuid
+
+# Most messages coalesced into one AgentMessageBatch frame, as in agent.py
+MAX_BATCH_MESSAGES = 256
 
 
 class IntelligentAgent:
@@ -46,20 +50,27 @@ class IntelligentAgent:
         else:
             raise Exception(f"Failed to get token: {response.status_code} - {response.text}")
     
-    async def send_message(self, message_type, recipient_id="", payload=""):
+    async def send_message(self, message_type, recipient_id="", payload="", correlation_id=""):
         """Queue a message to be sent"""
         msg = AgentMessage(
             sender_id=self.agent_id,
             recipient_id=recipient_id,
             message_type=message_type,
-            payload=payload.encode('utf-8')
+            payload=payload.encode('utf-8'),
+            correlation_id=correlation_id or ""
         )
         await self.send_queue.put(msg)
     
-    async def request_from_agent(self, target_agent_id, request_text, request_id=None):
-        """Send a request to another agent and return request ID"""
+    async def request_from_agent(self, target_agent_id, request_text, request_id=None, correlation_id=None):
+        """Send a request to another agent and return request ID.
+        
+        The request goes out with correlation_id set to the request ID (or to
+        ``correlation_id``, to add it to an existing thread), so the server can
+        look the exchange up with /threads/{correlation_id}.
+        """
         if request_id is None:
-            request_id = f"{self.agent_id}_to_{target_agent_id}_{len(self.pending_requests)}"
+            # Unique for good: it becomes a correlation_id stored with the messages
+            request_id = f"{self.agent_id}_to_{target_agent_id}_{uuid.uuid4().hex[:12]}"
         
         # Store the pending request
         self.pending_requests[request_id] = {
@@ -79,7 +90,8 @@ class IntelligentAgent:
         await self.send_message(
             message_type=AgentMessage.DIRECT,
             recipient_id=target_agent_id,
-            payload=json.dumps(request_payload)
+            payload=json.dumps(request_payload),
+            correlation_id=correlation_id or request_id
         )
         
         print(f"📤 Sent request to {target_agent_id}: {request_text}")
@@ -118,6 +130,24 @@ class IntelligentAgent:
                 break
             yield msg
     
+    async def batch_generator(self):
+        """Send everything queued since the last frame as one AgentMessageBatch"""
+        async for msg in self.message_generator():
+            batch = [msg]
+            stopping = False
+            while len(batch) < MAX_BATCH_MESSAGES:
+                try:
+                    queued = self.send_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if queued is None:
+                    stopping = True
+                    break
+                batch.append(queued)
+            yield AgentMessageBatch(messages=batch)
+            if stopping:
+                break
+    
     async def get_ai_response(self, sender, user_message, max_retries=3):
         """Get response from Groq with retry logic for rate limits"""
         if sender not in self.conversation_history:
@@ -171,8 +201,8 @@ class IntelligentAgent:
         # Should not reach here, but just in case
         return "I'm temporarily unavailable. Please try again shortly."
     
-    async def handle_agent_request(self, sender_id, request_data):
-        """Handle requests from other agents"""
+    async def handle_agent_request(self, sender_id, request_data, correlation_id=""):
+        """Handle requests from other agents; the response joins the request's thread"""
         request_id = request_data.get("request_id")
         request_text = request_data.get("request")
         
@@ -192,7 +222,8 @@ class IntelligentAgent:
         await self.send_message(
             message_type=AgentMessage.DIRECT,
             recipient_id=sender_id,
-            payload=json.dumps(response_payload)
+            payload=json.dumps(response_payload),
+            correlation_id=correlation_id or request_id
         )
         
         print(f"📤 Sent response to {sender_id}")
@@ -207,9 +238,14 @@ class IntelligentAgent:
         # Store the response
         self.agent_responses[request_id] = response_text
     
+    async def incoming_messages(self, response_stream):
+        async for batch in response_stream:
+            for msg in batch.messages:
+                yield msg
+    
     async def handle_incoming(self, response_stream):
         """Handle incoming messages with AI and agent communication"""
-        async for msg in response_stream:
+        async for msg in self.incoming_messages(response_stream):
             sender = msg.sender_id
             payload = msg.payload.decode('utf-8')
             
@@ -219,7 +255,7 @@ class IntelligentAgent:
                 try:
                     data = json.loads(payload)
                     if data.get("type") == "agent_request":
-                        await self.handle_agent_request(sender, data)
+                        await self.handle_agent_request(sender, data, msg.correlation_id)
                         continue
                     elif data.get("type") == "agent_response":
                         await self.handle_agent_response(sender, data)
@@ -237,7 +273,8 @@ class IntelligentAgent:
             await self.send_message(
                 message_type=AgentMessage.DIRECT,
                 recipient_id=sender,
-                payload=response
+                payload=response,
+                correlation_id=msg.correlation_id
             )
             print(f"📤 Queued AI response to {sender}")
     
@@ -257,8 +294,8 @@ class IntelligentAgent:
         print(f"👂 Starting bidirectional stream for '{self.agent_id}'...")
         
         # Start bidirectional stream
-        response_stream = self.stub.StreamMessages(
-            self.message_generator(),
+        response_stream = self.stub.StreamMessageBatches(
+            self.batch_generator(),
             metadata=metadata
         )
         
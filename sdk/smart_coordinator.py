@@ -1,5 +1,6 @@
 import asyncio
 import os
+import uuid
 from intelligent_agent import IntelligentAgent
 from agent_comm_pb2 import AgentMessage
 import json
@@ -23,8 +24,13 @@ Be direct, efficient, and thorough in coordinating responses."""
         super().__init__(agent_id, system_prompt, groq_api_key)
         self.specialists = ["research-agent", "code-agent"]
     
-    async def coordinate_request(self, user_message, sender):
-        """Coordinate a complex request across multiple agents"""
+    async def coordinate_request(self, user_message, sender, correlation_id=None):
+        """Coordinate a complex request across multiple agents.
+        
+        Specialist requests and responses share the user message's correlation_id
+        (or a new one), so the whole exchange is one thread on the server.
+        """
+        correlation_id = correlation_id or f"{self.agent_id}_{uuid.uuid4().hex[:12]}"
         print(f"🎯 Coordinating request: {user_message}")
         
         # Determine what each agent should handle
@@ -39,7 +45,7 @@ Be direct, efficient, and thorough in coordinating responses."""
         # Send requests to appropriate agents
         if research_needed:
             research_request = f"Research request: {user_message}"
-            req_id = await self.request_from_agent("research-agent", research_request)
+            req_id = await self.request_from_agent("research-agent", research_request, correlation_id=correlation_id)
             research_response = await self.wait_for_agent_response(req_id, timeout=15)
             if research_response:
                 responses["research"] = research_response
@@ -47,7 +53,7 @@ Be direct, efficient, and thorough in coordinating responses."""
         
         if code_needed:
             code_request = f"Code request: {user_message}"
-            req_id = await self.request_from_agent("code-agent", code_request)
+            req_id = await self.request_from_agent("code-agent", code_request, correlation_id=correlation_id)
             code_response = await self.wait_for_agent_response(req_id, timeout=15)
             if code_response:
                 responses["code"] = code_response
@@ -72,7 +78,7 @@ Provide a unified, actionable response that combines both perspectives."""
     
     async def handle_incoming(self, response_stream):
         """Enhanced message handling with coordination"""
-        async for msg in response_stream:
+        async for msg in self.incoming_messages(response_stream):
             sender = msg.sender_id
             payload = msg.payload.decode('utf-8')
             
@@ -81,7 +87,7 @@ Provide a unified, actionable response that combines both perspectives."""
                 try:
                     data = json.loads(payload)
                     if data.get("type") == "agent_request":
-                        await self.handle_agent_request(sender, data)
+                        await self.handle_agent_request(sender, data, msg.correlation_id)
                         continue
                     elif data.get("type") == "agent_response":
                         await self.handle_agent_response(sender, data)
@@ -90,6 +96,8 @@ Provide a unified, actionable response that combines both perspectives."""
                     continue
             
             print(f"📨 Received from {sender}: {payload}")
+            # Everything this message causes, including the reply, shares one thread
+            correlation_id = msg.correlation_id or f"{self.agent_id}_{uuid.uuid4().hex[:12]}"
             
             # Check if this needs coordination
             needs_coordination = any(keyword in payload.lower() for keyword in 
@@ -97,7 +105,7 @@ Provide a unified, actionable response that combines both perspectives."""
             
             if needs_coordination:
                 print("🎯 This requires multi-agent coordination!")
-                response = await self.coordinate_request(payload, sender)
+                response = await self.coordinate_request(payload, sender, correlation_id)
             else:
                 # Handle simple requests directly
                 response = await self.get_ai_response(sender, payload)
@@ -106,7 +114,8 @@ Provide a unified, actionable response that combines both perspectives."""
             await self.send_message(
                 message_type=AgentMessage.DIRECT,
                 recipient_id=sender,
-                payload=response
+                payload=response,
+                correlation_id=correlation_id
             )
             print(f"📤 Sent coordinated response to {sender}")
 
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10\x61gent_comm.proto\x12\tagentcomm\"\x8d\x02\n\x0c\x41gentMessage\x12\x11\n\tsender_id\x18\x01 \x01(\t\x12\x14\n\x0crecipient_id\x18\x02 \x01(\t\x12\x39\n\x0cmessage_type\x18\x03 \x01(\x0e\x32#.agentcomm.AgentMessage.MessageType\x12\x0f\n\x07payload\x18\x04 \x01(\x0c\x12\x11\n\ttimestamp\x18\x05 \x01(\x03\x12\x16\n\x0e\x63orrelation_id\x18\x06 \x01(\t\"]\n\x0bMessageType\x12\n\n\x06\x44IRECT\x10\x00\x12\r\n\tBROADCAST\x10\x01\x12\t\n\x05\x45VENT\x10\x02\x12\x0b\n\x07REQUEST\x10\x03\x12\x0c\n\x08RESPONSE\x10\x04\x12\r\n\tHEARTBEAT\x10\x05\">\n\x14RegisterAgentRequest\x12\x12\n\nagent_name\x18\x01 \x01(\t\x12\x12\n\nagent_type\x18\x02 \x01(\t\"I\n\x15RegisterAgentResponse\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\r\n\x05token\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t2S\n\tAgentComm\x12\x46\n\x0eStreamMessages\x12\x17.agentcomm.AgentMessage\x1a\x17.agentcomm.AgentMessage(\x01\x30\x01\x32\x63\n\rAgentRegistry\x12R\n\rRegisterAgent\x12\x1f.agentcomm.RegisterAgentRequest\x1a .agentcomm.RegisterAgentResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10\x61gent_comm.proto\x12\tagentcomm\"\xc9\x02\n\x0c\x41gentMessage\x12\x11\n\tsender_id\x18\x01 \x01(\t\x12\x14\n\x0crecipient_id\x18\x02 \x01(\t\x12\x39\n\x0cmessage_type\x18\x03 \x01(\x0e\x32#.agentcomm.AgentMessage.MessageType\x12\x0f\n\x07payload\x18\x04 \x01(\x0c\x12\x11\n\ttimestamp\x18\x05 \x01(\x03\x12\x16\n\x0e\x63orrelation_id\x18\x06 \x01(\t\x12\x0b\n\x03seq\x18\x07 \x01(\x03\x12\r\n\x05topic\x18\x08 \x01(\t\"}\n\x0bMessageType\x12\n\n\x06\x44IRECT\x10\x00\x12\r\n\tBROADCAST\x10\x01\x12\t\n\x05\x45VENT\x10\x02\x12\x0b\n\x07REQUEST\x10\x03\x12\x0c\n\x08RESPONSE\x10\x04\x12\r\n\tHEARTBEAT\x10\x05\x12\r\n\tSUBSCRIBE\x10\x06\x12\x0f\n\x0bUNSUBSCRIBE\x10\x07\">\n\x11\x41gentMessageBatch\x12)\n\x08messages\x18\x01 \x03(\x0b\x32\x17.agentcomm.AgentMessage\">\n\x14RegisterAgentRequest\x12\x12\n\nagent_name\x18\x01 \x01(\t\x12\x12\n\nagent_type\x18\x02 \x01(\t\"I\n\x15RegisterAgentResponse\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\r\n\x05token\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\"&\n\x12LocateAgentRequest\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\"7\n\x13LocateAgentResponse\x12\x0f\n\x07node_id\x18\x01 \x01(\t\x12\x0f\n\x07\x61\x64\x64ress\x18\x02 \x01(\t\"%\n\x11QueueStatsRequest\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\"s\n\nQueueStats\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65pth\x18\x02 \x01(\x03\x12\r\n\x05\x62ytes\x18\x03 \x01(\x03\x12\x0f\n\x07\x64ropped\x18\x04 \x01(\x03\x12\x11\n\tmax_depth\x18\x05 \x01(\x03\x12\x11\n\tmax_bytes\x18\x06 \x01(\x03\";\n\x12QueueStatsResponse\x12%\n\x06queues\x18\x01 \x03(\x0b\x32\x15.agentcomm.QueueStats\"8\n\x0fPresenceRequest\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\x13\n\x0bonline_only\x18\x02 \x01(\x08\"]\n\rAgentPresence\x12\x10\n\x08\x61gent_id\x18\x01 \x01(\t\x12\x0e\n\x06online\x18\x02 \x01(\x08\x12\x11\n\tlast_seen\x18\x03 \x01(\x03\x12\x17\n\x0f\x63onnected_since\x18\x04 \x01(\x03\"<\n\x10PresenceResponse\x12(\n\x06\x61gents\x18\x01 \x03(\x0b\x32\x18.agentcomm.AgentPresence\"\x12\n\x10\x41uthStatsRequest\"R\n\tAuthStats\x12\x0c\n\x04hits\x18\x01 \x01(\x03\x12\x0e\n\x06misses\x18\x02 \x01(\x03\x12\x10\n\x08hit_rate\x18\x03 \x01(\x01\x12\x15\n\rcached_tokens\x18\x04 \x01(\x03\"N\n\x0e\x43lusterForward\x12\x11\n\troot_node\x18\x01 \x01(\t\x12)\n\x08messages\x18\x02 \x03(\x0b\x32\x17.agentcomm.AgentMessage\"*\n\x16\x43lusterForwardResponse\x12\x10\n\x08\x61\x63\x63\x65pted\x18\x01 \x01(\x05\x32\xab\x01\n\tAgentComm\x12\x46\n\x0eStreamMessages\x12\x17.agentcomm.AgentMessage\x1a\x17.agentcomm.AgentMessage(\x01\x30\x01\x12V\n\x14StreamMessageBatches\x12\x1c.agentcomm.AgentMessageBatch\x1a\x1c.agentcomm.AgentMessageBatch(\x01\x30\x01\x32\xb1\x01\n\rAgentRegistry\x12R\n\rRegisterAgent\x12\x1f.agentcomm.RegisterAgentRequest\x1a .agentcomm.RegisterAgentResponse\x12L\n\x0bLocateAgent\x12\x1d.agentcomm.LocateAgentRequest\x1a\x1e.agentcomm.LocateAgentResponse2\xe7\x01\n\x0c\x41gentMonitor\x12L\n\rGetQueueStats\x12\x1c.agentcomm.QueueStatsRequest\x1a\x1d.agentcomm.QueueStatsResponse\x12\x46\n\x0bGetPresence\x12\x1a.agentcomm.PresenceRequest\x1a\x1b.agentcomm.PresenceResponse\x12\x41\n\x0cGetAuthStats\x12\x1b.agentcomm.AuthStatsRequest\x1a\x14.agentcomm.AuthStats2W\n\x0c\x41gentCluster\x12G\n\x07\x46orward\x12\x19.agentcomm.ClusterForward\x1a!.agentcomm.ClusterForwardResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,15 +32,45 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'agent_comm_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_AGENTMESSAGE']._serialized_start=32
-  _globals['_AGENTMESSAGE']._serialized_end=301
-  _globals['_AGENTMESSAGE_MESSAGETYPE']._serialized_start=208
-  _globals['_AGENTMESSAGE_MESSAGETYPE']._serialized_end=301
-  _globals['_REGISTERAGENTREQUEST']._serialized_start=303
-  _globals['_REGISTERAGENTREQUEST']._serialized_end=365
-  _globals['_REGISTERAGENTRESPONSE']._serialized_start=367
-  _globals['_REGISTERAGENTRESPONSE']._serialized_end=440
-  _globals['_AGENTCOMM']._serialized_start=442
-  _globals['_AGENTCOMM']._serialized_end=525
-  _globals['_AGENTREGISTRY']._serialized_start=527
-  _globals['_AGENTREGISTRY']._serialized_end=626
+  _globals['_AGENTMESSAGE']._serialized_end=361
+  _globals['_AGENTMESSAGE_MESSAGETYPE']._serialized_start=236
+  _globals['_AGENTMESSAGE_MESSAGETYPE']._serialized_end=361
+  _globals['_AGENTMESSAGEBATCH']._serialized_start=363
+  _globals['_AGENTMESSAGEBATCH']._serialized_end=425
+  _globals['_REGISTERAGENTREQUEST']._serialized_start=427
+  _globals['_REGISTERAGENTREQUEST']._serialized_end=489
+  _globals['_REGISTERAGENTRESPONSE']._serialized_start=491
+  _globals['_REGISTERAGENTRESPONSE']._serialized_end=564
+  _globals['_LOCATEAGENTREQUEST']._serialized_start=566
+  _globals['_LOCATEAGENTREQUEST']._serialized_end=604
+  _globals['_LOCATEAGENTRESPONSE']._serialized_start=606
+  _globals['_LOCATEAGENTRESPONSE']._serialized_end=661
+  _globals['_QUEUESTATSREQUEST']._serialized_start=663
+  _globals['_QUEUESTATSREQUEST']._serialized_end=700
+  _globals['_QUEUESTATS']._serialized_start=702
+  _globals['_QUEUESTATS']._serialized_end=817
+  _globals['_QUEUESTATSRESPONSE']._serialized_start=819
+  _globals['_QUEUESTATSRESPONSE']._serialized_end=878
+  _globals['_PRESENCEREQUEST']._serialized_start=880
+  _globals['_PRESENCEREQUEST']._serialized_end=936
+  _globals['_AGENTPRESENCE']._serialized_start=938
+  _globals['_AGENTPRESENCE']._serialized_end=1031
+  _globals['_PRESENCERESPONSE']._serialized_start=1033
+  _globals['_PRESENCERESPONSE']._serialized_end=1093
+  _globals['_AUTHSTATSREQUEST']._serialized_start=1095
+  _globals['_AUTHSTATSREQUEST']._serialized_end=1113
+  _globals['_AUTHSTATS']._serialized_start=1115
+  _globals['_AUTHSTATS']._serialized_end=1197
+  _globals['_CLUSTERFORWARD']._serialized_start=1199
+  _globals['_CLUSTERFORWARD']._serialized_end=1277
+  _globals['_CLUSTERFORWARDRESPONSE']._serialized_start=1279
+  _globals['_CLUSTERFORWARDRESPONSE']._serialized_end=1321
+  _globals['_AGENTCOMM']._serialized_start=1324
+  _globals['_AGENTCOMM']._serialized_end=1495
+  _globals['_AGENTREGISTRY']._serialized_start=1498
+  _globals['_AGENTREGISTRY']._serialized_end=1675
+  _globals['_AGENTMONITOR']._serialized_start=1678
+  _globals['_AGENTMONITOR']._serialized_end=1909
+  _globals['_AGENTCLUSTER']._serialized_start=1911
+  _globals['_AGENTCLUSTER']._serialized_end=1998
 # @@protoc_insertion_point(module_scope)
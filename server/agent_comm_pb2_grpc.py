@@ -39,6 +39,11 @@ class AgentCommStub(object):
                 request_serializer=agent__comm__pb2.AgentMessage.SerializeToString,
                 response_deserializer=agent__comm__pb2.AgentMessage.FromString,
                 _registered_method=True)
+        self.StreamMessageBatches = channel.stream_stream(
+                '/agentcomm.AgentComm/StreamMessageBatches',
+                request_serializer=agent__comm__pb2.AgentMessageBatch.SerializeToString,
+                response_deserializer=agent__comm__pb2.AgentMessageBatch.FromString,
+                _registered_method=True)
 
 
 class AgentCommServicer(object):
@@ -50,6 +55,12 @@ class AgentCommServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamMessageBatches(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AgentCommServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +69,11 @@ def add_AgentCommServicer_to_server(servicer, server):
                     request_deserializer=agent__comm__pb2.AgentMessage.FromString,
                     response_serializer=agent__comm__pb2.AgentMessage.SerializeToString,
             ),
+            'StreamMessageBatches': grpc.stream_stream_rpc_method_handler(
+                    servicer.StreamMessageBatches,
+                    request_deserializer=agent__comm__pb2.AgentMessageBatch.FromString,
+                    response_serializer=agent__comm__pb2.AgentMessageBatch.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'agentcomm.AgentComm', rpc_method_handlers)
@@ -96,6 +112,33 @@ class AgentComm(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def StreamMessageBatches(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/agentcomm.AgentComm/StreamMessageBatches',
+            agent__comm__pb2.AgentMessageBatch.SerializeToString,
+            agent__comm__pb2.AgentMessageBatch.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
 
 class AgentRegistryStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -111,6 +154,11 @@ class AgentRegistryStub(object):
                 request_serializer=agent__comm__pb2.RegisterAgentRequest.SerializeToString,
                 response_deserializer=agent__comm__pb2.RegisterAgentResponse.FromString,
                 _registered_method=True)
+        self.LocateAgent = channel.unary_unary(
+                '/agentcomm.AgentRegistry/LocateAgent',
+                request_serializer=agent__comm__pb2.LocateAgentRequest.SerializeToString,
+                response_deserializer=agent__comm__pb2.LocateAgentResponse.FromString,
+                _registered_method=True)
 
 
 class AgentRegistryServicer(object):
@@ -122,6 +170,12 @@ class AgentRegistryServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def LocateAgent(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AgentRegistryServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -130,6 +184,11 @@ def add_AgentRegistryServicer_to_server(servicer, server):
                     request_deserializer=agent__comm__pb2.RegisterAgentRequest.FromString,
                     response_serializer=agent__comm__pb2.RegisterAgentResponse.SerializeToString,
             ),
+            'LocateAgent': grpc.unary_unary_rpc_method_handler(
+                    servicer.LocateAgent,
+                    request_deserializer=agent__comm__pb2.LocateAgentRequest.FromString,
+                    response_serializer=agent__comm__pb2.LocateAgentResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'agentcomm.AgentRegistry', rpc_method_handlers)
@@ -167,3 +226,260 @@ class AgentRegistry(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def LocateAgent(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agentcomm.AgentRegistry/LocateAgent',
+            agent__comm__pb2.LocateAgentRequest.SerializeToString,
+            agent__comm__pb2.LocateAgentResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+
+class AgentMonitorStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.GetQueueStats = channel.unary_unary(
+                '/agentcomm.AgentMonitor/GetQueueStats',
+                request_serializer=agent__comm__pb2.QueueStatsRequest.SerializeToString,
+                response_deserializer=agent__comm__pb2.QueueStatsResponse.FromString,
+                _registered_method=True)
+        self.GetPresence = channel.unary_unary(
+                '/agentcomm.AgentMonitor/GetPresence',
+                request_serializer=agent__comm__pb2.PresenceRequest.SerializeToString,
+                response_deserializer=agent__comm__pb2.PresenceResponse.FromString,
+                _registered_method=True)
+        self.GetAuthStats = channel.unary_unary(
+                '/agentcomm.AgentMonitor/GetAuthStats',
+                request_serializer=agent__comm__pb2.AuthStatsRequest.SerializeToString,
+                response_deserializer=agent__comm__pb2.AuthStats.FromString,
+                _registered_method=True)
+
+
+class AgentMonitorServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def GetQueueStats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetPresence(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetAuthStats(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AgentMonitorServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'GetQueueStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetQueueStats,
+                    request_deserializer=agent__comm__pb2.QueueStatsRequest.FromString,
+                    response_serializer=agent__comm__pb2.QueueStatsResponse.SerializeToString,
+            ),
+            'GetPresence': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetPresence,
+                    request_deserializer=agent__comm__pb2.PresenceRequest.FromString,
+                    response_serializer=agent__comm__pb2.PresenceResponse.SerializeToString,
+            ),
+            'GetAuthStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetAuthStats,
+                    request_deserializer=agent__comm__pb2.AuthStatsRequest.FromString,
+                    response_serializer=agent__comm__pb2.AuthStats.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'agentcomm.AgentMonitor', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('agentcomm.AgentMonitor', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class AgentMonitor(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def GetQueueStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agentcomm.AgentMonitor/GetQueueStats',
+            agent__comm__pb2.QueueStatsRequest.SerializeToString,
+            agent__comm__pb2.QueueStatsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetPresence(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agentcomm.AgentMonitor/GetPresence',
+            agent__comm__pb2.PresenceRequest.SerializeToString,
+            agent__comm__pb2.PresenceResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetAuthStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agentcomm.AgentMonitor/GetAuthStats',
+            agent__comm__pb2.AuthStatsRequest.SerializeToString,
+            agent__comm__pb2.AuthStats.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+
+class AgentClusterStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Forward = channel.unary_unary(
+                '/agentcomm.AgentCluster/Forward',
+                request_serializer=agent__comm__pb2.ClusterForward.SerializeToString,
+                response_deserializer=agent__comm__pb2.ClusterForwardResponse.FromString,
+                _registered_method=True)
+
+
+class AgentClusterServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def Forward(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AgentClusterServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Forward': grpc.unary_unary_rpc_method_handler(
+                    servicer.Forward,
+                    request_deserializer=agent__comm__pb2.ClusterForward.FromString,
+                    response_serializer=agent__comm__pb2.ClusterForwardResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'agentcomm.AgentCluster', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('agentcomm.AgentCluster', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class AgentCluster(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def Forward(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/agentcomm.AgentCluster/Forward',
+            agent__comm__pb2.ClusterForward.SerializeToString,
+            agent__comm__pb2.ClusterForwardResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,14 +1,23 @@
-from fastapi import FastAPI, Query, HTTPException, Depends
+from fastapi import FastAPI, Query, HTTPException, Depends, Header, Response, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
-import asyncpg
 from typing import Optional
 import datetime
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from server.auth import verify_jwt, create_access_token
-from jose import JWTError, jwt
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, ValidationError
+from server.auth import verify_jwt, create_access_token, token_verifier
+from server.storage import create_store
+from server.storage.base import search_key, search_terms
+from server.sse import SSEBroadcaster
+from server.export import ARROW_MEDIA_TYPE, arrow_stream, pa
+from server import agent_comm_pb2
+from jwt import InvalidTokenError
 import asyncio
+import base64
+import binascii
 import json
+import os
+import traceback
 
 # JWT Configuration - should match your server/auth.py
 JWT_SECRET = "your_very_secret_key"
@@ -22,9 +31,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-db_pool = None
+store = None
+sse_broadcaster = SSEBroadcaster()
+
+# Comment lines sent to idle SSE streams so proxies don't time them out
+SSE_HEARTBEAT_INTERVAL = 15
+
+# Milliseconds EventSource waits before reconnecting (and resuming via Last-Event-ID)
+SSE_RETRY_MS = 2000
+
+# Sends queued on one WebSocket before the server stops reading from it; queued sends are saved as one batch
+WS_MAX_PENDING_SENDS = 256
+
+# Close codes: bad token or agent_id (before accept, so the handshake is refused), server-side failure,
+# and fell too far behind
+WS_POLICY_VIOLATION = 1008
+WS_INTERNAL_ERROR = 1011
+WS_TRY_AGAIN_LATER = 1013
 
 # Token request model
 class TokenRequest(BaseModel):
@@ -37,27 +63,140 @@ class SendMessageRequest(BaseModel):
     message_type: int
     payload: str
     correlation_id: Optional[str] = None
+    topic: Optional[str] = None
+
+# Largest /messages/send_batch request
+MAX_SEND_BATCH = 10000
+
+# Rows fetched from the store per /messages/export chunk (one Arrow record batch each)
+EXPORT_CHUNK_SIZE = 1000
+
+# Stream control messages: they only mean something on a gRPC stream and are never stored or delivered
+CONTROL_MESSAGE_TYPES = {
+    agent_comm_pb2.AgentMessage.HEARTBEAT,
+    agent_comm_pb2.AgentMessage.SUBSCRIBE,
+    agent_comm_pb2.AgentMessage.UNSUBSCRIBE,
+}
+
+def message_type_error(message_type):
+    """Why a message_type can't be sent through this API, or None"""
+    if not 0 <= message_type <= 127:
+        return "message_type must be between 0 and 127"
+    if message_type in CONTROL_MESSAGE_TYPES:
+        return "HEARTBEAT, SUBSCRIBE and UNSUBSCRIBE are stream control messages and can't be sent here"
+    return None
+
+def to_agent_message(request):
+    return agent_comm_pb2.AgentMessage(
+        sender_id=request.sender_id,
+        recipient_id=request.recipient_id or "",
+        message_type=request.message_type,
+        payload=request.payload.encode('utf-8'),
+        correlation_id=request.correlation_id or "",
+        topic=request.topic or ""
+    )
+
+def saved_row(msg, saved):
+    """The stored row for a message the store just saved, in query-result shape"""
+    return {
+        "message_id": saved["message_id"],
+        "sender_id": msg.sender_id,
+        "recipient_id": msg.recipient_id or None,
+        "message_type": msg.message_type,
+        "payload": msg.payload,
+        "ts": saved["ts"],
+        "correlation_id": msg.correlation_id or None,
+        "seq": saved["seq"],
+        "topic": msg.topic or None,
+    }
+
+def iso_utc(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat() if ts else None
+
+def iso_local(ts):
+    return datetime.datetime.fromtimestamp(ts).isoformat() if ts else None
+
+def message_to_dict(row, format_time=iso_local):
+    return {
+        "message_id": str(row["message_id"]),
+        "sender_id": row["sender_id"],
+        "recipient_id": row["recipient_id"],
+        "message_type": row["message_type"],
+        "payload": bytes(row["payload"]).decode(errors="replace") if row["payload"] else None,
+        "timestamp": format_time(row["ts"]),
+        "correlation_id": row["correlation_id"],
+        "seq": row["seq"],
+    }
+
+def encode_cursor(row):
+    """Opaque keyset cursor for a row: its (ts, message_id)"""
+    return encode_key([row["ts"], str(row["message_id"])])
+
+def decode_cursor(token):
+    if token is None:
+        return None
+    ts, message_id = decode_key(token, 2)
+    return float(ts), str(message_id)
+
+def encode_key(values):
+    key = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_key(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(token)
+        return values
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def page_response(response, rows, limit, after):
+    """Rows as JSON; a full page sets X-Next-Cursor to continue in the same direction"""
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[0] if after else rows[-1])
+    return [message_to_dict(row) for row in rows]
+
+def sse_event(row):
+    return f"id: {row['seq']}\ndata: {json.dumps(message_to_dict(row, format_time=iso_utc))}\n\n"
+
+async def resume_rows(agent_id, resume_seq):
+    """Messages for a stream resuming after resume_seq; only resumes older than the broadcaster's buffer query the database.
+
+    The buffer also returns lower seqs that committed after resume_seq was
+    published. The database fallback only has seq > resume_seq, so for those
+    older resumes a late-committing lower seq can be missed.
+    """
+    rows = sse_broadcaster.replay_after(agent_id, resume_seq)
+    if rows is None:
+        rows = await store.messages_after(agent_id, resume_seq, include_sent=True)
+    print(f"⏪ Replaying {len(rows)} messages to {agent_id} after seq {resume_seq}")
+    return rows
 
 @app.on_event("startup")
 async def startup_event():
-    global db_pool
-    db_pool = await asyncpg.create_pool(
-        user='prateekganigi',
-        password='43121158312115',
-        database='agent_comm_db',
-        host='localhost',
-    )
+    global store
+    # Messages sent here are announced so the gRPC server delivers them to connected agents
+    store = create_store(announce=True, origin=f"api-{os.getpid()}")
+    await store.connect()
+    await sse_broadcaster.start(store)
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    global db_pool
-    if db_pool:
-        await db_pool.close()
+    global store
+    await sse_broadcaster.stop()
+    if store:
+        await store.close()
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics/auth")
+async def auth_metrics(token_payload: dict = Depends(verify_jwt)):
+    """Hit rate of the verified-token cache (requires a bearer token, like the gRPC monitoring calls)"""
+    return token_verifier.stats()
+
 # Token endpoint for login
 @app.post("/token")
 async def get_token(request: TokenRequest):
@@ -84,34 +223,25 @@ async def send_message(
     if token_payload.get("agent_id") != request.sender_id:
         raise HTTPException(status_code=403, detail="Cannot send messages as another agent")
     
-    if not db_pool:
+    if not store:
         raise HTTPException(status_code=503, detail="Database connection not initialized")
     
-    # Validate message_type range
-    if request.message_type < 0 or request.message_type > 127:
-        raise HTTPException(status_code=400, detail="message_type must be between 0 and 127")
+    type_error = message_type_error(request.message_type)
+    if type_error:
+        raise HTTPException(status_code=400, detail=type_error)
     
-    # Insert message into database
-    query = """
-        INSERT INTO agent_messages (sender_id, recipient_id, message_type, payload, timestamp, correlation_id)
-        VALUES ($1, $2, $3, $4, NOW(), $5)
-        RETURNING message_id, timestamp
-    """
+    # Save the message; the store announces it to the gRPC server's change feed
+    msg = to_agent_message(request)
     
     try:
-        row = await db_pool.fetchrow(
-            query,
-            request.sender_id,
-            request.recipient_id,
-            request.message_type,
-            request.payload.encode('utf-8'),
-            request.correlation_id
-        )
+        saved = await store.save_message(msg)
+        sse_broadcaster.publish_sent([saved_row(msg, saved)])
         
         return {
             "status": "success",
-            "message_id": str(row["message_id"]),
-            "timestamp": row["timestamp"].isoformat(),
+            "message_id": saved["message_id"],
+            "timestamp": iso_utc(saved["ts"]),
+            "seq": saved["seq"],
             "sender_id": request.sender_id,
             "recipient_id": request.recipient_id,
         }
@@ -119,6 +249,69 @@ async def send_message(
         print(f"Error sending message: {e}")
         raise HTTPException(status_code=500, detail="Failed to send message")
 
+@app.post("/messages/send_batch")
+async def send_batch(
+    request: Request,
+    token_payload: dict = Depends(verify_jwt),
+):
+    """
+    Send many messages in one request: a JSON array, or NDJSON (one message per line)
+    with Content-Type application/x-ndjson. All messages are validated first and
+    stored together, or none are.
+    """
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith(("application/x-ndjson", "application/jsonl")):
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > MAX_SEND_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SEND_BATCH} messages per batch")
+    if not items:
+        return {"status": "success", "count": 0, "messages": []}
+    
+    # Validate everything in one pass and report every bad message at once
+    agent_id = token_payload.get("agent_id")
+    msgs = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            message = SendMessageRequest.model_validate(item)
+        except ValidationError as e:
+            errors.append({"index": index, "error": e.errors(include_url=False)})
+            continue
+        if message.sender_id != agent_id:
+            errors.append({"index": index, "error": "Cannot send messages as another agent"})
+        elif message_type_error(message.message_type):
+            errors.append({"index": index, "error": message_type_error(message.message_type)})
+        else:
+            msgs.append(to_agent_message(message))
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+    
+    try:
+        saved = await store.save_messages_bulk(msgs)
+    except Exception as e:
+        print(f"Error sending batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to send messages")
+    sse_broadcaster.publish_sent([saved_row(msg, row) for msg, row in zip(msgs, saved)])
+    
+    return {
+        "status": "success",
+        "count": len(saved),
+        "messages": [
+            {"message_id": row["message_id"], "timestamp": iso_utc(row["ts"]), "seq": row["seq"]}
+            for row in saved
+        ],
+    }
+
 @app.get("/agents")
 async def get_agents(
     agent_id: str = Query(..., description="Current agent ID"),
@@ -130,38 +323,19 @@ async def get_agents(
     if token_payload.get("agent_id") != agent_id:
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    if not db_pool:
+    if not store:
         raise HTTPException(status_code=503, detail="Database connection not initialized")
     
-    # Get unique agents with their most recent message time
-    query = """
-        WITH all_agents AS (
-            SELECT 
-                CASE 
-                    WHEN sender_id = $1 THEN recipient_id
-                    WHEN recipient_id = $1 THEN sender_id
-                END AS agent_id,
-                timestamp
-            FROM agent_messages
-            WHERE (sender_id = $1 OR recipient_id = $1)
-              AND recipient_id IS NOT NULL
-              AND sender_id != recipient_id
-        )
-        SELECT 
-            agent_id,
-            MAX(timestamp) as last_message_time
-        FROM all_agents
-        WHERE agent_id IS NOT NULL AND agent_id != $1
-        GROUP BY agent_id
-        ORDER BY last_message_time DESC
-    """
-    
+    # Read from the conversation summaries kept up to date on the write path
     try:
-        rows = await db_pool.fetch(query, agent_id)
+        rows = await store.agent_summaries(agent_id)
         return [
             {
                 "agent_id": row["agent_id"],
-                "last_message_time": row["last_message_time"].isoformat() if row["last_message_time"] else None,
+                "last_message_time": iso_utc(row["last_message_time"]),
+                "last_message_preview": row["last_message_preview"],
+                "message_count": row["message_count"],
+                "unread_count": row["unread_count"],
             }
             for row in rows
         ]
@@ -169,180 +343,273 @@ async def get_agents(
         print(f"Error fetching agents: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch agents")
 
+@app.post("/conversations/{other_agent_id}/read")
+async def mark_conversation_read(
+    other_agent_id: str,
+    agent_id: str = Query(..., description="Current agent ID"),
+    token_payload: dict = Depends(verify_jwt),
+):
+    """
+    Reset the unread count of the conversation with another agent
+    """
+    if token_payload.get("agent_id") != agent_id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    
+    await store.mark_read(agent_id, other_agent_id)
+    return {"status": "success"}
+
 @app.get("/conversations/{other_agent_id}")
 async def get_conversation(
     other_agent_id: str,
+    response: Response,
     agent_id: str = Query(..., description="Current agent ID"),
     limit: int = Query(50, description="Maximum number of messages"),
-    offset: int = Query(0, description="Offset for pagination"),
+    offset: int = Query(0, description="Offset for pagination (prefer before/after cursors)"),
+    before: Optional[str] = Query(None, description="Cursor: messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: messages newer than this one"),
     token_payload: dict = Depends(verify_jwt),
 ):
     """
-    Get conversation between current agent and another agent
+    Get conversation between current agent and another agent, newest first.
+    Pass the X-Next-Cursor response header as before (or after) to get the next page.
     """
     if token_payload.get("agent_id") != agent_id:
         raise HTTPException(status_code=403, detail="Forbidden")
     
-    if not db_pool:
+    if not store:
         raise HTTPException(status_code=503, detail="Database connection not initialized")
     
     # Get messages between these two agents
-    query = """
-        SELECT message_id, sender_id, recipient_id, message_type, payload, 
-               extract(epoch from timestamp) as ts, correlation_id
-        FROM agent_messages
-        WHERE (sender_id = $1 AND recipient_id = $2) 
-           OR (sender_id = $2 AND recipient_id = $1)
-        ORDER BY timestamp DESC
-        LIMIT $3 OFFSET $4
-    """
-    
     try:
-        rows = await db_pool.fetch(query, agent_id, other_agent_id, limit, offset)
-        return [
-            {
-                "message_id": str(row["message_id"]),
-                "sender_id": row["sender_id"],
-                "recipient_id": row["recipient_id"],
-                "message_type": row["message_type"],
-                "payload": row["payload"].decode(errors="replace") if row["payload"] else None,
-                "timestamp": datetime.datetime.fromtimestamp(row["ts"]).isoformat() if row["ts"] else None,
-                "correlation_id": row["correlation_id"],
-            }
-            for row in rows
-        ]
+        rows = await store.conversation(
+            agent_id, other_agent_id, limit, offset, before=decode_cursor(before), after=decode_cursor(after)
+        )
+        return page_response(response, rows, limit, after)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching conversation: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch conversation")
 
+@app.get("/threads/{correlation_id}")
+async def get_thread(
+    correlation_id: str,
+    response: Response,
+    agent_id: str = Query(..., description="Current agent ID; only messages it sent, received or was broadcast are returned"),
+    limit: int = Query(500, ge=1, description="Maximum number of messages to return, default 500"),
+    after: Optional[str] = Query(None, description="Cursor: continue after this message"),
+    token_payload: dict = Depends(verify_jwt),
+):
+    """
+    The messages sharing a correlation_id (a request, its responses and any
+    follow-up requests) that the agent sent, received or was broadcast, oldest
+    first. A full page sets X-Next-Cursor; pass it back as ``after``.
+    """
+    if token_payload.get("agent_id") != agent_id:
+        raise HTTPException(status_code=403, detail="Forbidden to access other agent's messages")
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    
+    cursor = decode_cursor(after)
+    try:
+        rows = await store.thread(correlation_id, agent_id, limit=limit, after=cursor)
+    except Exception as e:
+        print(f"Error fetching thread: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch thread")
+    if not rows and after is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return [message_to_dict(row) for row in rows]
+
 @app.get("/messages")
 async def get_messages(
+    response: Response,
     agent_id: str = Query(..., description="Agent ID to filter messages"),
     start_time: Optional[datetime.datetime] = Query(None, description="Start time in ISO format"),
     end_time: Optional[datetime.datetime] = Query(None, description="End time in ISO format"),
     message_type: Optional[int] = Query(None, description="Filter by message type"),
     limit: int = Query(100, description="Maximum number of messages to return, default 100"),
-    offset: int = Query(0, description="Number of messages to skip, default 0"),
+    offset: int = Query(0, description="Number of messages to skip, default 0 (prefer before/after cursors)"),
+    before: Optional[str] = Query(None, description="Cursor: messages older than this one"),
+    after: Optional[str] = Query(None, description="Cursor: messages newer than this one"),
     token_payload: dict = Depends(verify_jwt),
 ):
     if token_payload.get("agent_id") != agent_id:
         raise HTTPException(status_code=403, detail="Forbidden to access other agent's messages")
-    if not db_pool:
+    if not store:
         raise HTTPException(status_code=503, detail="Database connection not initialized")
     
-    # Query to get messages sent BY this agent OR sent TO this agent OR broadcast messages
-    query = """
-        SELECT message_id, sender_id, recipient_id, message_type, payload, extract(epoch from timestamp) as ts, correlation_id
-        FROM agent_messages
-        WHERE (sender_id = $1 OR recipient_id = $1 OR recipient_id IS NULL)
+    # Messages sent BY this agent OR sent TO this agent OR broadcast messages
+    rows = await store.agent_messages(
+        agent_id,
+        start_time=start_time.timestamp() if start_time else None,
+        end_time=end_time.timestamp() if end_time else None,
+        message_type=message_type,
+        limit=limit,
+        offset=offset,
+        before=decode_cursor(before),
+        after=decode_cursor(after),
+    )
+    return page_response(response, rows, limit, after)
+
+@app.get("/messages/search")
+async def search_messages(
+    response: Response,
+    agent_id: str = Query(..., description="Agent ID whose messages to search"),
+    q: str = Query(..., description="Words to search message payloads for"),
+    sender_id: Optional[str] = Query(None, description="Only messages from this agent"),
+    recipient_id: Optional[str] = Query(None, description="Only messages to this agent"),
+    message_type: Optional[int] = Query(None, description="Filter by message type"),
+    start_time: Optional[datetime.datetime] = Query(None, description="Start time in ISO format"),
+    end_time: Optional[datetime.datetime] = Query(None, description="End time in ISO format"),
+    limit: int = Query(50, description="Maximum number of results, default 50"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    token_payload: dict = Depends(verify_jwt),
+):
     """
-    params = [agent_id]
-    index = 2
+    Full-text search over the payloads of messages the agent can see, best match
+    first. A full page sets X-Next-Cursor for the next page.
+    """
+    if token_payload.get("agent_id") != agent_id:
+        raise HTTPException(status_code=403, detail="Forbidden to access other agent's messages")
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    if not search_terms(q):
+        raise HTTPException(status_code=400, detail="q must contain at least one word")
+    if cursor is not None:
+        rank, ts, message_id = decode_key(cursor, 3)
+        try:
+            cursor = (float(rank), float(ts), str(message_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    if start_time:
-        query += f" AND timestamp >= to_timestamp(${index})"
-        params.append(start_time.timestamp())
-        index += 1
-    if end_time:
-        query += f" AND timestamp <= to_timestamp(${index})"
-        params.append(end_time.timestamp())
-        index += 1
-    if message_type is not None:
-        query += f" AND message_type = ${index}"
-        params.append(message_type)
-        index += 1
+    try:
+        rows = await store.search_messages(
+            agent_id,
+            q,
+            sender_id=sender_id,
+            recipient_id=recipient_id,
+            message_type=message_type,
+            start_time=start_time.timestamp() if start_time else None,
+            end_time=end_time.timestamp() if end_time else None,
+            limit=limit,
+            cursor=cursor,
+        )
+    except Exception as e:
+        print(f"Error searching messages: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search messages")
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = encode_key(list(search_key(rows[-1])))
+    return [{**message_to_dict(row), "rank": row["rank"]} for row in rows]
+
+@app.get("/messages/export")
+async def export_messages(
+    agent_id: str = Query(..., description="Agent ID to export messages for"),
+    peer_id: Optional[str] = Query(None, description="Only the conversation with this agent"),
+    start_time: Optional[datetime.datetime] = Query(None, description="Start time in ISO format"),
+    end_time: Optional[datetime.datetime] = Query(None, description="End time in ISO format"),
+    message_type: Optional[int] = Query(None, description="Filter by message type"),
+    format: str = Query("ndjson", description="ndjson or arrow (Arrow IPC stream, needs pyarrow)"),
+    token_payload: dict = Depends(verify_jwt),
+):
+    """
+    Stream an agent's whole message history, oldest first, as NDJSON or Arrow IPC.
+    Rows are read from the store in chunks and written as they arrive.
+    """
+    if token_payload.get("agent_id") != agent_id:
+        raise HTTPException(status_code=403, detail="Forbidden to access other agent's messages")
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    if format not in ("ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or arrow")
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="Arrow export needs pyarrow installed on the server")
     
-    query += f" ORDER BY timestamp DESC LIMIT ${index} OFFSET ${index + 1}"
-    params.extend([limit, offset])
+    chunks = store.export_messages(
+        agent_id,
+        start_time=start_time.timestamp() if start_time else None,
+        end_time=end_time.timestamp() if end_time else None,
+        message_type=message_type,
+        peer_id=peer_id,
+        chunk_size=EXPORT_CHUNK_SIZE,
+    )
     
-    rows = await db_pool.fetch(query, *params)
-    return [
-        {
-            "message_id": str(row["message_id"]),
-            "sender_id": row["sender_id"],
-            "recipient_id": row["recipient_id"],
-            "message_type": row["message_type"],
-            "payload": row["payload"].decode(errors="replace") if row["payload"] else None,
-            "timestamp": datetime.datetime.fromtimestamp(row["ts"]).isoformat() if row["ts"] else None,
-            "correlation_id": row["correlation_id"],
-        }
-        for row in rows
-    ]
+    async def ndjson_lines():
+        async for rows in chunks:
+            yield "".join(
+                json.dumps({**message_to_dict(row, format_time=iso_utc), "topic": row["topic"]}) + "\n"
+                for row in rows
+            )
+    
+    if format == "arrow":
+        body, media_type, extension = arrow_stream(chunks), ARROW_MEDIA_TYPE, "arrow"
+    else:
+        body, media_type, extension = ndjson_lines(), "application/x-ndjson", "ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{agent_id}-messages.{extension}"'},
+    )
 
 # SSE endpoint for real-time message streaming
 @app.get("/messages/stream")
 async def stream_messages(
     agent_id: str = Query(..., description="Agent ID to stream messages for"),
     token: str = Query(..., description="JWT token for authentication"),
+    after_seq: Optional[int] = Query(None, description="Resume after this seq (for clients that can't set Last-Event-ID)"),
+    last_event_id: Optional[int] = Header(None, description="Sent by EventSource on reconnect"),
 ):
     """
     Stream new messages in real-time using Server-Sent Events (SSE)
-    Token is passed as query parameter since EventSource doesn't support headers
+    Token is passed as query parameter since EventSource doesn't support headers.
+    Each event's id is the message seq, so a reconnect resumes where the stream left off.
     """
     # Verify the JWT token manually
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = token_verifier.verify(token)
         token_agent_id = payload.get("agent_id")
         if not token_agent_id or token_agent_id != agent_id:
             raise HTTPException(status_code=403, detail="Invalid token or agent_id mismatch")
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid authentication token")
     
+    if not store:
+        raise HTTPException(status_code=503, detail="Database connection not initialized")
+    
+    resume_seq = last_event_id if last_event_id is not None else after_seq
+    
     async def event_generator():
+        # New messages come from the shared broadcaster; only resumes older than its buffer query the database
+        queue = sse_broadcaster.subscribe(agent_id)
+        print(f"🎬 SSE Started for {agent_id} ({sse_broadcaster.connection_count} open)")
+        replayed = set()
         try:
-            # Get timezone-aware current time from the database
-            async with db_pool.acquire() as conn:
-                last_check = await conn.fetchval("SELECT NOW()")
-            
-            print(f"🎬 SSE Started for {agent_id} at {last_check}")
-            
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if resume_seq is not None:
+                # Subscribed first, so rows arriving during the replay are queued, then skipped if replayed
+                for row in await resume_rows(agent_id, resume_seq):
+                    replayed.add(row["seq"])
+                    yield sse_event(row)
             while True:
-                if db_pool:
-                    print(f"🔍 Checking for messages after {last_check}")
-                    
-                    # Query to include messages sent BY this agent OR sent TO this agent OR broadcast
-                    query = """
-                        SELECT message_id, sender_id, recipient_id, message_type, 
-                               payload, timestamp, correlation_id
-                        FROM agent_messages
-                        WHERE (sender_id = $1 OR recipient_id = $1 OR recipient_id IS NULL) 
-                              AND timestamp > $2
-                        ORDER BY timestamp ASC
-                    """
-                    rows = await db_pool.fetch(query, agent_id, last_check)
-                    
-                    if rows:
-                        print(f"📤 Sending {len(rows)} messages via SSE to {agent_id}")
-                        for row in rows:
-                            message = {
-                                "message_id": str(row["message_id"]),
-                                "sender_id": row["sender_id"],
-                                "recipient_id": row["recipient_id"],
-                                "message_type": row["message_type"],
-                                "payload": row["payload"].decode(errors="replace") if row["payload"] else None,
-                                "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None,
-                                "correlation_id": row["correlation_id"],
-                            }
-                            message_json = json.dumps(message)
-                            yield f"data: {message_json}\n\n"
-                            print(f"   ✉️ Sent: {message['payload'][:30] if message['payload'] else 'None'}...")
-                        
-                        # Update last_check to the timestamp of the last message
-                        last_check = rows[-1]["timestamp"]
-                        print(f"   ✅ Updated last_check to {last_check}")
-                    else:
-                        print("   💤 No new messages")
-                
-                # Send heartbeat
-                yield ":heartbeat\n\n"
-                await asyncio.sleep(1)
-                
+                try:
+                    row = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ":heartbeat\n\n"
+                    continue
+                if row is None:
+                    print(f"⚠️  SSE stream for {agent_id} fell behind, closing it")
+                    break
+                if row["seq"] in replayed:
+                    continue
+                yield sse_event(row)
         except asyncio.CancelledError:
             print(f"❌ SSE connection closed by client: {agent_id}")
-        except Exception as e:
-            print(f"❌ SSE error for {agent_id}: {e}")
-            import traceback
-            traceback.print_exc()
+        finally:
+            sse_broadcaster.unsubscribe(agent_id, queue)
     
     return StreamingResponse(
         event_generator(),
@@ -353,3 +620,129 @@ async def stream_messages(
             "X-Accel-Buffering": "no",
         }
     )
+
+# WebSocket endpoint: sends and receives for one agent over a single authenticated connection
+@app.websocket("/ws")
+async def agent_websocket(
+    websocket: WebSocket,
+    agent_id: str = Query(..., description="Agent ID to connect as"),
+    token: str = Query(..., description="JWT token for authentication, checked once per connection"),
+    after_seq: Optional[int] = Query(None, description="Replay messages after this seq before live ones"),
+):
+    """
+    Frames are JSON text. The client sends
+    {"type": "send", "ref": ..., "recipient_id": ..., "message_type": ..., "payload": ...}
+    (optionally correlation_id and topic; the sender is the authenticated agent) and gets
+    {"type": "ack", "ref": ..., "message_id": ..., "timestamp": ..., "seq": ...} or
+    {"type": "error", "ref": ..., "detail": ...} back. Every message the SSE stream would
+    carry arrives as {"type": "message", "message": {...}}.
+    """
+    try:
+        token_agent_id = token_verifier.verify(token).get("agent_id")
+    except InvalidTokenError:
+        token_agent_id = None
+    if not store or not token_agent_id or token_agent_id != agent_id:
+        await websocket.close(code=WS_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    
+    # Same shared fan-out as the SSE streams
+    queue = sse_broadcaster.subscribe(agent_id)
+    sends = asyncio.Queue(WS_MAX_PENDING_SENDS)
+    send_lock = asyncio.Lock()
+    print(f"🔗 WebSocket opened for {agent_id} ({sse_broadcaster.connection_count} streams open)")
+    
+    async def send_frame(frame):
+        async with send_lock:
+            await websocket.send_text(json.dumps(frame))
+    
+    async def deliver():
+        replayed = set()
+        if after_seq is not None:
+            for row in await resume_rows(agent_id, after_seq):
+                replayed.add(row["seq"])
+                await send_frame({"type": "message", "message": message_to_dict(row, format_time=iso_utc)})
+        while True:
+            row = await queue.get()
+            if row is None:
+                print(f"⚠️  WebSocket for {agent_id} fell behind, closing it")
+                await websocket.close(code=WS_TRY_AGAIN_LATER)
+                return
+            if row["seq"] not in replayed:
+                await send_frame({"type": "message", "message": message_to_dict(row, format_time=iso_utc)})
+    
+    async def save():
+        while True:
+            # Everything queued while the previous batch was being written goes in one save
+            batch = [await sends.get()]
+            while not sends.empty():
+                batch.append(sends.get_nowait())
+            msgs = [msg for _, msg in batch]
+            try:
+                saved = await store.save_messages(msgs)
+            except Exception as e:
+                print(f"Error sending message over WebSocket: {e}")
+                for ref, _ in batch:
+                    await send_frame({"type": "error", "ref": ref, "detail": "Failed to send message"})
+                continue
+            for (ref, _), row in zip(batch, saved):
+                await send_frame({
+                    "type": "ack",
+                    "ref": ref,
+                    "message_id": row["message_id"],
+                    "timestamp": iso_utc(row["ts"]),
+                    "seq": row["seq"],
+                })
+            sse_broadcaster.publish_sent([saved_row(msg, row) for msg, row in zip(msgs, saved)])
+    
+    async def supervise(work, name):
+        """Run deliver()/save(); if one fails other than by the socket going away, log it and close with 1011"""
+        try:
+            await work
+        except WebSocketDisconnect:
+            pass  # the receive loop below sees the disconnect too
+        except Exception:
+            if websocket.application_state != WebSocketState.CONNECTED:
+                return  # a send raced the socket being closed
+            print(f"❌ WebSocket {name} task for {agent_id} failed")
+            traceback.print_exc()
+            try:
+                await websocket.close(code=WS_INTERNAL_ERROR)
+            except Exception:
+                pass
+
+    tasks = [asyncio.create_task(supervise(deliver(), "deliver")), asyncio.create_task(supervise(save(), "save"))]
+    try:
+        # deliver() may close the socket itself when the stream falls behind
+        while websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                frame = json.loads(await websocket.receive_text())
+                if not isinstance(frame, dict):
+                    raise ValueError(frame)
+            except ValueError:
+                await send_frame({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            ref = frame.get("ref")
+            if frame.get("type") != "send":
+                await send_frame({"type": "error", "ref": ref, "detail": "Unknown frame type"})
+                continue
+            if frame.get("sender_id", agent_id) != agent_id:
+                await send_frame({"type": "error", "ref": ref, "detail": "Cannot send messages as another agent"})
+                continue
+            try:
+                message = SendMessageRequest.model_validate({**frame, "sender_id": agent_id})
+            except ValidationError as e:
+                await send_frame({"type": "error", "ref": ref, "detail": e.errors(include_url=False)})
+                continue
+            type_error = message_type_error(message.message_type)
+            if type_error:
+                await send_frame({"type": "error", "ref": ref, "detail": type_error})
+                continue
+            await sends.put((ref, to_agent_message(message)))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sse_broadcaster.unsubscribe(agent_id, queue)
+        for task in tasks:
+            task.cancel()
+    print(f"❌ WebSocket closed: {agent_id}")
@@ -0,0 +1,203 @@
+"""Static hub cluster: consistent-hash agent ownership and node-to-node forwarding.
+
+Every node is started with the same member list. An agent is owned by the
+node its id hashes to on the ring, and opens its stream there. DIRECT,
+REQUEST and RESPONSE messages for an agent owned elsewhere are forwarded to
+the owner. Broadcasts travel down a k-ary tree rooted at the node they
+entered on, so every node receives each broadcast exactly once and no
+inter-node link carries it twice.
+
+Forwarding is only for nodes with stores of their own. Nodes sharing a
+Postgres database already see each other's messages through the change
+feed, so they route from that alone and never forward. The receiving node
+stores what it is forwarded, so its agents can catch up on it after a
+reconnect, but a forward that never arrives is lost.
+"""
+
+import asyncio
+import bisect
+import hashlib
+
+import grpc
+import jwt
+
+import agent_comm_pb2
+from delivery import encode_batch, varint
+
+# Points per node on the hash ring; more points spread agents more evenly
+VIRTUAL_NODES = 128
+# Children per node in the broadcast tree
+BROADCAST_FANOUT = 2
+# Most messages sent to a peer in one Forward call
+MAX_FORWARD_BATCH = 256
+# Messages waiting for a slow or unreachable peer before new ones are dropped. Only the
+# entry node has stored them, so a dropped (or failed) forward never reaches its recipients.
+MAX_FORWARD_PENDING = 50000
+FORWARD_TIMEOUT = 5.0
+
+_ROOT_NODE_TAG = b"\x0a"   # ClusterForward.root_node
+_MESSAGES_TAG = b"\x12"    # ClusterForward.messages
+
+
+def parse_nodes(spec):
+    """Parse "n1=host:port,n2=host:port" into {node_id: address}"""
+    nodes = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        node_id, sep, address = entry.strip().partition("=")
+        if not sep or not node_id or not address:
+            raise ValueError(f"Invalid cluster node entry: {entry!r} (expected node_id=host:port)")
+        nodes[node_id] = address
+    return nodes
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping agent ids to node ids"""
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [key for key, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, agent_id):
+        index = bisect.bisect(self._keys, _hash(agent_id)) % len(self._keys)
+        return self._owners[index]
+
+
+def broadcast_children(nodes, root, node, fanout=BROADCAST_FANOUT):
+    """Children of ``node`` in the broadcast tree rooted at ``root``.
+
+    Members are laid out in sorted order starting at the root; the node at
+    position p forwards to positions p*fanout+1 .. p*fanout+fanout.
+    """
+    order = sorted(nodes)
+    start = order.index(root)
+    order = order[start:] + order[:start]
+    position = order.index(node)
+    return order[position * fanout + 1:position * fanout + fanout + 1]
+
+
+def encode_forward(root_node, frames):
+    """ClusterForward wire bytes, reusing each frame's cached encoding"""
+    root = root_node.encode()
+    return _ROOT_NODE_TAG + varint(len(root)) + root + encode_batch(frames, tag=_MESSAGES_TAG)
+
+
+class PeerLink:
+    """Outbound queue and channel to one peer; queued frames are sent in batches"""
+
+    def __init__(self, peer_id, address, token):
+        self.peer_id = peer_id
+        self.address = address
+        self.metadata = (("authorization", f"Bearer {token}"),)
+        self.pending = asyncio.Queue(maxsize=MAX_FORWARD_PENDING)
+        self.dropped = 0
+        self.channel = None
+        self.forward = None
+        self.task = None
+
+    async def start(self):
+        self.channel = grpc.aio.insecure_channel(self.address)
+        self.forward = self.channel.unary_unary(
+            "/agentcomm.AgentCluster/Forward",
+            request_serializer=lambda data: data,
+            response_deserializer=agent_comm_pb2.ClusterForwardResponse.FromString,
+        )
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.channel:
+            await self.channel.close()
+
+    def send(self, root_node, frame):
+        try:
+            self.pending.put_nowait((root_node, frame))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"⚠️  Forward queue to {self.peer_id} is full; dropped {self.dropped} messages so far")
+
+    async def _run(self):
+        while True:
+            items = [await self.pending.get()]
+            while len(items) < MAX_FORWARD_BATCH:
+                try:
+                    items.append(self.pending.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            by_root = {}
+            for root_node, frame in items:
+                by_root.setdefault(root_node, []).append(frame)
+            for root_node, frames in by_root.items():
+                try:
+                    await self.forward(encode_forward(root_node, frames), metadata=self.metadata,
+                                       timeout=FORWARD_TIMEOUT)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Error forwarding {len(frames)} messages to {self.peer_id}: {e}")
+
+
+class ClusterNode:
+    """This server's view of the cluster: who owns which agent, and links to every peer"""
+
+    def __init__(self, node_id, nodes, secret, algorithm, fanout=BROADCAST_FANOUT):
+        if node_id not in nodes:
+            raise ValueError(f"Node {node_id!r} is not in the cluster member list {sorted(nodes)}")
+        self.node_id = node_id
+        self.nodes = nodes
+        self.fanout = fanout
+        self.ring = HashRing(nodes)
+        self.secret = secret
+        self.algorithm = algorithm
+        token = jwt.encode({"node_id": node_id}, secret, algorithm=algorithm)
+        self.links = {peer: PeerLink(peer, address, token) for peer, address in nodes.items() if peer != node_id}
+
+    @property
+    def address(self):
+        return self.nodes[self.node_id]
+
+    async def start(self):
+        for link in self.links.values():
+            await link.start()
+        print(f"🕸️  Cluster node {self.node_id} with peers {sorted(self.links)}")
+
+    async def stop(self):
+        for link in self.links.values():
+            await link.stop()
+
+    def owner(self, agent_id):
+        return self.ring.owner(agent_id)
+
+    def owns(self, agent_id):
+        return self.ring.owner(agent_id) == self.node_id
+
+    def verify_peer(self, token):
+        """Return the node id a peer token was issued to, or None if it is not a cluster member"""
+        try:
+            node_id = jwt.decode(token, self.secret, algorithms=[self.algorithm]).get("node_id")
+        except jwt.InvalidTokenError:
+            return None
+        return node_id if node_id in self.nodes else None
+
+    def forward_to_owner(self, frame, recipient):
+        """Queue a frame for the node that owns ``recipient``; returns that node id"""
+        owner = self.ring.owner(recipient)
+        self.links[owner].send(self.node_id, frame)
+        return owner
+
+    def broadcast(self, frame, root_node):
+        """Pass a broadcast on to this node's children in the tree rooted at ``root_node``"""
+        children = broadcast_children(self.nodes, root_node, self.node_id, self.fanout)
+        for child in children:
+            self.links[child].send(root_node, frame)
+        return len(children)
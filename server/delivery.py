@@ -0,0 +1,379 @@
+import asyncio
+import collections
+
+import agent_comm_pb2
+
+# What to do when a message arrives for an agent whose queue is full
+OVERFLOW_BLOCK = "block"              # park the message until there is space (then disconnect on timeout)
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # evict the oldest droppable messages to make room
+OVERFLOW_DISCONNECT = "disconnect"    # close the consumer; it resumes from its cursor on reconnect
+
+DEFAULT_OVERFLOW_POLICIES = {
+    agent_comm_pb2.AgentMessage.DIRECT: OVERFLOW_BLOCK,
+    agent_comm_pb2.AgentMessage.REQUEST: OVERFLOW_BLOCK,
+    agent_comm_pb2.AgentMessage.RESPONSE: OVERFLOW_BLOCK,
+    agent_comm_pb2.AgentMessage.BROADCAST: OVERFLOW_DISCONNECT,
+    agent_comm_pb2.AgentMessage.EVENT: OVERFLOW_DROP_OLDEST,
+    agent_comm_pb2.AgentMessage.HEARTBEAT: OVERFLOW_DROP_OLDEST,
+}
+
+DEFAULT_MAX_DEPTH = 10000
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BLOCK_TIMEOUT = 5.0
+# How far (in seqs) a batch may commit behind one with higher seqs and still be delivered
+DEFAULT_REORDER_WINDOW = 4096
+
+# Limits for one AgentMessageBatch frame on a batched stream (gRPC's default max message is 4 MiB)
+MAX_BATCH_FRAMES = 256
+MAX_BATCH_BYTES = 1024 * 1024
+
+# Field 1 of AgentMessageBatch (repeated AgentMessage messages), length-delimited
+_BATCH_MESSAGES_TAG = b"\x0a"
+
+# Results of AgentQueue.offer / AgentQueue.put / AgentQueue.push
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+DROPPED = "dropped"
+FULL = "full"
+
+
+class Frame:
+    """An AgentMessage plus its wire encoding, computed at most once.
+
+    The same Frame is offered to every recipient of a message, so a broadcast
+    to N agents is serialized once and the same bytes are written to N streams.
+    """
+
+    __slots__ = ("msg", "seq", "message_type", "sender_id", "topic", "_data")
+
+    def __init__(self, msg, data=None):
+        self.msg = msg
+        self.seq = msg.seq
+        self.message_type = msg.message_type
+        self.sender_id = msg.sender_id
+        self.topic = msg.topic
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.msg.SerializeToString()
+        return self._data
+
+    @property
+    def size(self):
+        return len(self.data)
+
+
+def varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def encode_batch(frames, tag=_BATCH_MESSAGES_TAG):
+    """Wire encoding of an AgentMessageBatch holding these frames, built from their cached bytes.
+
+    ``tag`` selects another repeated AgentMessage field to encode them as.
+    """
+    parts = []
+    for frame in frames:
+        data = frame.data
+        parts.append(tag)
+        parts.append(varint(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+class DeliveredSeqs:
+    """Seqs already handed to one recipient.
+
+    Seqs are assigned at insert, but batches from different writers (the REST
+    API, sibling workers, the COPY path) can commit out of seq order, so a seq
+    below the highest one delivered may still turn up. Every delivered seq
+    within ``window`` of the highest is kept in a set; only seqs at or below
+    ``floor``, which never moves past ``highest - window``, count as delivered
+    without being in it.
+    """
+
+    def __init__(self, floor=0, seqs=(), window=DEFAULT_REORDER_WINDOW):
+        self.floor = floor
+        self.window = window
+        self.above = {seq for seq in seqs if seq > floor}
+        self.highest = max(self.above, default=floor)
+
+    @classmethod
+    def resume(cls, seq, recent=None, window=DEFAULT_REORDER_WINDOW):
+        """Delivered seqs for a cursor at ``seq`` that also recorded the ``recent`` seqs delivered below it.
+
+        Without ``recent`` (cursors saved before it was recorded) everything up to ``seq`` counts as delivered.
+        """
+        if recent is None:
+            return cls(seq, window=window)
+        return cls(max(seq - window, 0), [s for s in recent if s <= seq] + [seq], window)
+
+    def __contains__(self, seq):
+        return seq <= self.floor or seq in self.above
+
+    def add(self, seq):
+        """Record a seq, returning False if it was already delivered"""
+        if seq in self:
+            return False
+        self.above.add(seq)
+        if seq > self.highest:
+            self.highest = seq
+        if len(self.above) > 2 * self.window:
+            self.floor = max(self.floor, self.highest - self.window)
+            self.above = {s for s in self.above if s > self.floor}
+        return True
+
+    def recent(self):
+        """Delivered seqs within the window below the highest, oldest first, for a durable cursor"""
+        return sorted(seq for seq in self.above if seq > self.highest - self.window)
+
+
+class AgentQueue:
+    """Bounded outbound queue for one connected agent that delivers each seq exactly once.
+
+    Live routing, the change feed and the reconnect catch-up all put into the
+    same queue. While the catch-up is running, live messages are held back so
+    the agent receives its backlog first and in seq order. Once the queue is
+    over ``max_depth`` messages or ``max_bytes`` bytes, the overflow policy for
+    the incoming message's type decides what happens; held messages count
+    towards those limits too.
+
+    Routing uses push(), which never waits: frames that have to wait for
+    space are parked in order and queued by a task of this queue's own, so a
+    slow consumer never stalls the writer's commit callback or the change feed.
+    """
+
+    def __init__(self, delivered=None, max_depth=DEFAULT_MAX_DEPTH, max_bytes=DEFAULT_MAX_BYTES,
+                 policies=None, block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        self.items = collections.deque()  # Frames
+        self.bytes = 0
+        self.dropped = 0
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.policies = DEFAULT_OVERFLOW_POLICIES if policies is None else policies
+        self.block_timeout = block_timeout
+        self.delivered = DeliveredSeqs() if delivered is None else delivered
+        self.replaying = True
+        self.held = []
+        self.held_bytes = 0
+        self.parked = collections.deque()  # Frames waiting for space under the block policy, in order
+        self._unparker = None
+        self.close_reason = None
+        self.overflowed = False
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+
+    @property
+    def closed(self):
+        return self.close_reason is not None
+
+    def close(self, reason, overflow=False):
+        """Stop delivering; the consumer's get() returns None from now on.
+
+        ``overflow`` marks a consumer disconnected for falling behind rather
+        than one whose stream simply ended.
+        """
+        if self.close_reason is None:
+            self.close_reason = reason
+            self.overflowed = overflow
+        self._readable.set()
+        self._writable.set()
+
+    def _is_full(self, size):
+        return len(self.items) >= self.max_depth or self.bytes + size > self.max_bytes
+
+    def _is_held_full(self, size):
+        return (len(self.items) + len(self.held) >= self.max_depth
+                or self.bytes + self.held_bytes + size > self.max_bytes)
+
+    def _append(self, frame):
+        self.items.append(frame)
+        self.bytes += frame.size
+        self._readable.set()
+
+    def _evict_droppable(self, size):
+        """Drop the oldest drop_oldest-policy messages until ``size`` more bytes fit"""
+        kept = collections.deque()
+        while self.items and self._is_full(size):
+            frame = self.items.popleft()
+            if self.policies.get(frame.message_type) == OVERFLOW_DROP_OLDEST:
+                self.bytes -= frame.size
+                self.dropped += 1
+            else:
+                kept.append(frame)
+        kept.extend(self.items)
+        self.items = kept
+        return not self._is_full(size)
+
+    def _evict_held(self, size):
+        """_evict_droppable for the messages held back during the catch-up"""
+        depth = len(self.items) + len(self.held)
+        kept = []
+        for frame in self.held:
+            over = depth >= self.max_depth or self.bytes + self.held_bytes + size > self.max_bytes
+            if over and self.policies.get(frame.message_type) == OVERFLOW_DROP_OLDEST:
+                depth -= 1
+                self.held_bytes -= frame.size
+                self.dropped += 1
+            else:
+                kept.append(frame)
+        self.held = kept
+        return not self._is_held_full(size)
+
+    def _overflow(self, frame):
+        """Apply the incoming frame's overflow policy once nothing droppable is left to evict"""
+        policy = self.policies.get(frame.message_type, OVERFLOW_BLOCK)
+        if policy == OVERFLOW_DROP_OLDEST:
+            self.dropped += 1
+            return DROPPED
+        elif policy == OVERFLOW_DISCONNECT:
+            self.close(f"outbound queue overflow ({len(self.items) + len(self.held)} messages, "
+                       f"{self.bytes + self.held_bytes} bytes)", overflow=True)
+            print(f"⚠️  Disconnecting consumer: {self.close_reason}")
+            return DROPPED
+        else:
+            return FULL
+
+    def offer(self, frame):
+        """Try to queue a frame without blocking; returns QUEUED, DUPLICATE, DROPPED or FULL"""
+        if self.closed:
+            return DROPPED
+        if frame.seq:
+            if self.replaying:
+                size = frame.size
+                if self._is_held_full(size) and not self._evict_held(size):
+                    return self._overflow(frame)
+                self.held.append(frame)
+                self.held_bytes += size
+                return QUEUED
+            if frame.seq in self.delivered:
+                return DUPLICATE
+
+        size = frame.size
+        # Queued drop_oldest messages always make way first, whatever the incoming type
+        if self._is_full(size) and not self._evict_droppable(size):
+            return self._overflow(frame)
+
+        if frame.seq:
+            self.delivered.add(frame.seq)
+        self._append(frame)
+        return QUEUED
+
+    async def put(self, frame):
+        """Queue a frame, waiting for space when its overflow policy blocks the sender"""
+        status = self.offer(frame)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.block_timeout
+        while status == FULL:
+            self._writable.clear()
+            try:
+                await asyncio.wait_for(self._writable.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                self.close(f"consumer did not drain its queue within {self.block_timeout}s", overflow=True)
+                print(f"⚠️  Disconnecting consumer: {self.close_reason}")
+                return DROPPED
+            status = self.offer(frame)
+        return status
+
+    def push(self, frame):
+        """Queue a frame without ever waiting; returns QUEUED, DUPLICATE or DROPPED.
+
+        A frame that would make the sender wait under the block policy is
+        parked instead (and counted as QUEUED), as is every frame after it
+        until the parked ones are in, so the agent still gets them in order.
+        """
+        if not self.parked:
+            status = self.offer(frame)
+            if status != FULL:
+                return status
+        if self.closed:
+            return DROPPED
+        if len(self.parked) >= self.max_depth:
+            self.close(f"{len(self.parked)} messages waiting for space in the outbound queue", overflow=True)
+            print(f"⚠️  Disconnecting consumer: {self.close_reason}")
+            return DROPPED
+        self.parked.append(frame)
+        if self._unparker is None:
+            self._unparker = asyncio.get_running_loop().create_task(self._unpark())
+        return QUEUED
+
+    async def _unpark(self):
+        """Move parked frames into the queue as the consumer makes room, as put() would"""
+        try:
+            while self.parked and not self.closed:
+                await self.put(self.parked[0])
+                self.parked.popleft()
+        finally:
+            self.parked.clear()
+            self._unparker = None
+
+    async def put_backlog(self, frames):
+        """Queue catch-up frames read from storage, waiting for the consumer as needed; returns how many were new"""
+        queued = 0
+        for frame in frames:
+            if frame.seq in self.delivered:
+                continue
+            while self._is_full(frame.size) and not self.closed:
+                self._writable.clear()
+                await self._writable.wait()
+            if self.closed:
+                break
+            self.delivered.add(frame.seq)
+            self._append(frame)
+            queued += 1
+        return queued
+
+    def finish_replay(self):
+        """Release live messages that arrived during the catch-up"""
+        self.replaying = False
+        held, self.held = self.held, []
+        self.held_bytes = 0
+        for frame in sorted(held, key=lambda f: f.seq):
+            self.push(frame)
+
+    async def get(self):
+        """Next frame to send, or None once the queue has been closed"""
+        while not self.items:
+            if self.closed:
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+        if self.closed:
+            return None
+        frame = self.items.popleft()
+        self.bytes -= frame.size
+        self._writable.set()
+        return frame
+
+    async def get_batch(self, max_frames=MAX_BATCH_FRAMES, max_bytes=MAX_BATCH_BYTES):
+        """Wait for at least one frame, then take whatever else is already queued up to the limits"""
+        frame = await self.get()
+        if frame is None:
+            return []
+        frames = [frame]
+        size = frame.size
+        while self.items and len(frames) < max_frames and size + self.items[0].size <= max_bytes:
+            frame = self.items.popleft()
+            self.bytes -= frame.size
+            size += frame.size
+            frames.append(frame)
+        return frames
+
+    def qsize(self):
+        return len(self.items)
+
+    def stats(self):
+        return {
+            "depth": len(self.items),
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "max_depth": self.max_depth,
+            "max_bytes": self.max_bytes,
+        }
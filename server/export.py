@@ -0,0 +1,81 @@
+"""Arrow IPC encoding for GET /messages/export.
+
+pyarrow is optional: without it ``pa`` is None and the API only offers NDJSON.
+Each chunk of rows from the store becomes one record batch, written to an
+in-memory sink that is drained after every batch, so an export never holds
+more than one chunk.
+"""
+
+import datetime
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+if pa is not None:
+    ARROW_SCHEMA = pa.schema([
+        ("message_id", pa.string()),
+        ("sender_id", pa.string()),
+        ("recipient_id", pa.string()),
+        ("message_type", pa.int32()),
+        ("payload", pa.binary()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("correlation_id", pa.string()),
+        ("seq", pa.int64()),
+        ("topic", pa.string()),
+    ])
+
+
+class _Sink:
+    """File-like target for the IPC writer that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self.buffers = []
+        self.closed = False
+
+    def write(self, data):
+        self.buffers.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.buffers)
+        self.buffers.clear()
+        return data
+
+
+def record_batch(rows):
+    return pa.record_batch([
+        pa.array([str(row["message_id"]) for row in rows], pa.string()),
+        pa.array([row["sender_id"] for row in rows], pa.string()),
+        pa.array([row["recipient_id"] for row in rows], pa.string()),
+        pa.array([row["message_type"] for row in rows], pa.int32()),
+        pa.array([bytes(row["payload"]) if row["payload"] is not None else None for row in rows], pa.binary()),
+        pa.array(
+            [datetime.datetime.fromtimestamp(row["ts"], datetime.timezone.utc) for row in rows],
+            pa.timestamp("us", tz="UTC"),
+        ),
+        pa.array([row["correlation_id"] for row in rows], pa.string()),
+        pa.array([row["seq"] for row in rows], pa.int64()),
+        pa.array([row["topic"] for row in rows], pa.string()),
+    ], schema=ARROW_SCHEMA)
+
+
+async def arrow_stream(chunks):
+    """Arrow IPC stream bytes for an async iterator of row lists: the schema, then one batch per chunk"""
+    sink = _Sink()
+    writer = pa.ipc.new_stream(sink, ARROW_SCHEMA)
+    yield sink.drain()
+    async for rows in chunks:
+        writer.write_batch(record_batch(rows))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
@@ -1,17 +1,88 @@
 import asyncio
+import multiprocessing
+import os
 import uuid
-import asyncpg
 import agent_comm_pb2
 import agent_comm_pb2_grpc
 import grpc
 import jwt
 import datetime
+from cluster import ClusterNode, parse_nodes
+from delivery import AgentQueue, DeliveredSeqs, Frame, QUEUED, DEFAULT_MAX_DEPTH, DEFAULT_MAX_BYTES, encode_batch
+from persistence import MessageWriter, ACK_AFTER_COMMIT, DEFAULT_DEAD_LETTER_PATH
+from storage import create_store
+from topics import SubscriptionIndex
+from presence import PresenceTable
+from tokens import TokenVerifier
 
 # JWT secret and algorithm - replace secret with environment variable in production
 JWT_SECRET = "your_very_secret_key"
 JWT_ALGORITHM = "HS256"
+# Every stream and monitor call re-presents the same token; verified ones are cached until expiry
+token_verifier = TokenVerifier(JWT_SECRET, JWT_ALGORITHM)
+
+# Clients may send this metadata key to resume delivery after a given seq
+RESUME_METADATA_KEY = "resume-from-seq"
+# Comma-separated topic patterns to subscribe to before the catch-up runs
+SUBSCRIBE_METADATA_KEY = "subscribe-topics"
+# How often delivered-seq cursors are written back to agent_cursors
+CURSOR_FLUSH_INTERVAL = 5
+# "commit" acks a received message after its batch commits, "enqueue" as soon as it is queued
+WRITE_DURABILITY = os.getenv("AGENT_WRITE_DURABILITY", ACK_AFTER_COMMIT)
+# Where messages that were acked on enqueue but could not be saved are kept for recovery
+DEAD_LETTER_PATH = os.getenv("AGENT_DEAD_LETTER_PATH", DEFAULT_DEAD_LETTER_PATH)
+# Per-agent outbound queue limits; overflow policies per message type live in delivery.py
+QUEUE_MAX_DEPTH = int(os.getenv("AGENT_QUEUE_MAX_DEPTH", DEFAULT_MAX_DEPTH))
+QUEUE_MAX_BYTES = int(os.getenv("AGENT_QUEUE_MAX_BYTES", DEFAULT_MAX_BYTES))
+# Number of server processes sharing the port; >1 routes between them through Postgres NOTIFY
+WORKERS = int(os.getenv("AGENT_WORKERS", "1"))
+# Hub cluster membership, e.g. "n1=10.0.0.1:50051,n2=10.0.0.2:50051", and this node's id
+CLUSTER_NODES = os.getenv("AGENT_CLUSTER_NODES", "")
+NODE_ID = os.getenv("AGENT_NODE_ID", "")
+# Trailing metadata telling an agent which node owns it
+OWNER_METADATA_KEY = "agent-owner"
+# HTTP/2 keepalive pings detect dead agent connections, which ends their streams and presence
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 20000),
+    ("grpc.keepalive_timeout_ms", 10000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.http2.min_ping_interval_without_data_ms", 5000),
+]
+# Message types delivered to recipient_id, and those fanned out to every interested agent; others are never routed
+DIRECT_TYPES = (agent_comm_pb2.AgentMessage.DIRECT, agent_comm_pb2.AgentMessage.REQUEST, agent_comm_pb2.AgentMessage.RESPONSE)
+FAN_OUT_TYPES = (agent_comm_pb2.AgentMessage.BROADCAST, agent_comm_pb2.AgentMessage.EVENT)
+
+def is_heartbeat(msg):
+    """HEARTBEAT messages, plus the EVENT with a b"heartbeat" payload that older SDKs send"""
+    return msg.message_type == agent_comm_pb2.AgentMessage.HEARTBEAT or (
+        msg.message_type == agent_comm_pb2.AgentMessage.EVENT and msg.payload == b"heartbeat"
+    )
+
+async def authenticate(context):
+    """Verify the bearer token in the call metadata and return its agent_id"""
+    metadata = dict(context.invocation_metadata())
+
+    # Extract token from 'authorization' metadata header
+    auth_header = metadata.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Missing or invalid authorization token")
+
+    token = auth_header[len("Bearer "):]
+
+    # Verify JWT token
+    try:
+        payload = token_verifier.verify(token)
+        return payload.get("agent_id")
+    except jwt.ExpiredSignatureError:
+        await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Token expired")
+    except jwt.InvalidTokenError:
+        await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid token")
 
 class AgentRegistryServicer(agent_comm_pb2_grpc.AgentRegistryServicer):
+    def __init__(self, cluster=None):
+        self.cluster = cluster
+
     def RegisterAgent(self, request, context):
         agent_id = str(uuid.uuid4())
         # Create JWT payload with expiration (1 hour)
@@ -28,129 +99,294 @@ class AgentRegistryServicer(agent_comm_pb2_grpc.AgentRegistryServicer):
             message="Registration successful"
         )
 
+    def LocateAgent(self, request, context):
+        """Tell an agent which cluster node to stream from (empty when not clustered)"""
+        if self.cluster is None:
+            return agent_comm_pb2.LocateAgentResponse()
+        owner = self.cluster.owner(request.agent_id)
+        return agent_comm_pb2.LocateAgentResponse(node_id=owner, address=self.cluster.nodes[owner])
+
 class AgentCommServicer(agent_comm_pb2_grpc.AgentCommServicer):
-    def __init__(self, db_pool):
+    def __init__(self, store, durability=WRITE_DURABILITY, cluster=None):
         self.agent_queues = {}
+        # Copy-on-write snapshot of agent_queues for fan-out, replaced (never mutated) on connect/disconnect
+        self.subscribers = {}
+        self.topic_index = SubscriptionIndex()
+        self.presence = PresenceTable()
         self.lock = asyncio.Lock()
-        self.db_pool = db_pool
-        self.db_poller_tasks = {}  # Track database polling tasks per agent
+        self.store = store
+        self.cluster = cluster
+        # One feed of rows written by other processes (REST API, sibling workers) replaces
+        # per-agent polling; None when the store is private to this process
+        self.change_feed = store.change_feed(self.deliver_rows)
+        # A shared store's feed already brings every node the rows committed on the others,
+        # so cluster peers only forward messages when each node has a store of its own
+        self.peer_forwarding = cluster is not None and self.change_feed is None
+        # Inserts from all streams are group-committed by a single writer
+        self.writer = MessageWriter(store, self.route_committed, durability=durability,
+                                    dead_letter_path=DEAD_LETTER_PATH)
+        self.acked = {}  # DeliveredSeqs written to each connected agent's stream
+        self.dirty_cursors = set()
+        self.cursor_task = None
+
+    async def start(self):
+        await self.writer.start()
+        if self.change_feed:
+            await self.change_feed.start()
+        if self.cluster:
+            await self.cluster.start()
+        self.cursor_task = asyncio.create_task(self.flush_cursors_periodically())
+
+    async def stop(self):
+        await self.writer.stop()
+        if self.change_feed:
+            await self.change_feed.stop()
+        if self.cluster:
+            await self.cluster.stop()
+        if self.cursor_task:
+            self.cursor_task.cancel()
+        await self.flush_cursors()
 
     async def save_message(self, msg):
-        """Save message to database with current timestamp"""
-        async with self.db_pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO agent_messages(message_id, sender_id, recipient_id, message_type, payload, timestamp, correlation_id)
-                VALUES($1, $2, $3, $4, $5, NOW(), $6)
-                """,
-                uuid.uuid4(),
-                msg.sender_id,
-                msg.recipient_id if msg.recipient_id else None,
-                msg.message_type,
-                msg.payload,
-                msg.correlation_id if msg.correlation_id else None
+        """Hand a message to the write-behind writer; it is routed once its batch commits"""
+        await self.writer.submit(msg)
+
+    async def save_messages(self, msgs):
+        """Hand a client batch to the writer in one go, so it usually lands in a single commit"""
+        if len(msgs) == 1:
+            await self.save_message(msgs[0])
+        else:
+            await self.writer.submit_many(msgs)
+
+    async def route_committed(self, msgs):
+        """Route a batch of messages the writer has just committed"""
+        for msg in msgs:
+            await self.route_message(msg)
+
+    def row_to_message(self, row):
+        """Convert an agent_messages row to an AgentMessage"""
+        return agent_comm_pb2.AgentMessage(
+            sender_id=row['sender_id'],
+            recipient_id=row['recipient_id'] or "",
+            message_type=row['message_type'],
+            payload=bytes(row['payload']) if row['payload'] else b"",
+            timestamp=int(row['ts']),
+            correlation_id=row['correlation_id'] or "",
+            seq=row['seq'],
+            topic=row['topic'] or ""
+        )
+
+    async def deliver_rows(self, rows):
+        """Fan rows from the shared change feed out to the connected recipients"""
+        for row in rows:
+            msg = self.row_to_message(row)
+            # Same type filter as route_message, so control types written through the API go nowhere
+            if msg.message_type in DIRECT_TYPES:
+                queue = self.agent_queues.get(msg.recipient_id) if msg.recipient_id else None
+                if queue is not None and queue.push(Frame(msg)) == QUEUED:
+                    print(f"📤 Forwarded message to {msg.recipient_id} from {msg.sender_id}")
+            elif msg.message_type in FAN_OUT_TYPES:
+                delivered = self.fan_out(Frame(msg))
+                print(f"📤 Forwarded broadcast from {msg.sender_id} to {delivered} agents")
+
+    def fan_out(self, frame):
+        """Push a frame to every interested agent except its sender.
+
+        Frames with a topic only go to agents subscribed to a matching pattern;
+        frames without one go to every connected agent. Pushes never wait and
+        take no lock; a queue that is full under a block policy parks the frame
+        itself. All recipients share the frame, so the message is encoded only
+        once.
+        """
+        subscribers = self.subscribers
+        if frame.topic:
+            targets = [(agent_id, subscribers.get(agent_id)) for agent_id in self.topic_index.match(frame.topic)]
+        else:
+            targets = subscribers.items()
+
+        delivered = 0
+        for agent_id, queue in targets:
+            if queue is not None and agent_id != frame.sender_id and queue.push(frame) == QUEUED:
+                delivered += 1
+        return delivered
+
+    def queue_stats(self):
+        """Outbound queue depth and memory for every connected agent"""
+        return {agent_id: queue.stats() for agent_id, queue in self.subscribers.items()}
+
+    async def register_queue(self, agent_id, delivered, patterns=()):
+        """Create a queue for a new stream of this agent, subscribed to ``patterns``.
+
+        A stream the agent still has open is superseded: its queue is closed
+        and its subscriptions dropped, so every stream owns its own queue.
+        """
+        async with self.lock:
+            previous = self.agent_queues.get(agent_id)
+            if previous is not None:
+                previous.close("superseded by a newer stream from the same agent")
+                self.topic_index.remove_agent(agent_id)
+            for pattern in patterns:
+                self.topic_index.subscribe(agent_id, pattern)
+            queue = self.agent_queues[agent_id] = AgentQueue(
+                delivered, max_depth=QUEUE_MAX_DEPTH, max_bytes=QUEUE_MAX_BYTES
             )
-            print(f"✅ Saved message from {msg.sender_id} to {msg.recipient_id or 'BROADCAST'}")
+            self.acked[agent_id] = DeliveredSeqs(delivered.floor, delivered.above, delivered.window)
+            self.subscribers = dict(self.agent_queues)
+            return queue
 
-    async def poll_database_for_messages(self, agent_id):
-        """Poll database for new messages for this agent"""
-        print(f"🔄 Starting database polling for {agent_id}")
-        last_check = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)  # Start from far in the past
+    async def unregister_queue(self, agent_id, queue):
+        """Remove a stream's queue, returning False if a newer stream has already replaced it"""
+        async with self.lock:
+            # Release anything still parked on this queue
+            queue.close("agent disconnected")
+            if self.agent_queues.get(agent_id) is not queue:
+                return False
+            del self.agent_queues[agent_id]
+            self.subscribers = dict(self.agent_queues)
+            return True
 
+    async def resolve_resume(self, agent_id, metadata):
+        """Seqs to treat as delivered: client handshake, then durable cursor, then the log head.
 
-    
-        while True:
+        Batches can commit out of seq order, so a resumed agent is sent
+        everything in the reorder window below its cursor that the cursor
+        doesn't record as delivered, not just what lies above it.
+        """
+        cursor = await self.store.get_cursor(agent_id)
+        requested = metadata.get(RESUME_METADATA_KEY)
+        if requested:
             try:
-                print(f"🔍 Polling database for {agent_id}...")  # ADD THIS
-                await asyncio.sleep(2)  # Poll every 2 seconds
-
-                async with self.db_pool.acquire() as conn:
-                    # Query messages sent to this agent or broadcasts after last check
-                    rows = await conn.fetch(
-                        """
-                        SELECT message_id, sender_id, recipient_id, message_type, payload, 
-                            EXTRACT(EPOCH FROM timestamp) as ts, correlation_id
-                        FROM agent_messages
-                        WHERE (recipient_id = $1 OR recipient_id IS NULL OR recipient_id = '')
-                        AND timestamp > $2
-                        AND sender_id != $1
-                        ORDER BY timestamp ASC
-                        """,
-                        agent_id,
-                        last_check
-                    )
-    
-                    print(f"🔎 Query returned {len(rows)} rows for {agent_id}. Last check: {last_check}")  # ADD THIS LINE
-    
-                    if rows:
-                        print(f"📬 Found {len(rows)} new messages for {agent_id}")
-
-                        
-                        for row in rows:
-                            # Convert database row to AgentMessage
-                            msg = agent_comm_pb2.AgentMessage(
-                                sender_id=row['sender_id'],
-                                recipient_id=row['recipient_id'] or "",
-                                message_type=row['message_type'],
-                                payload=bytes(row['payload']),
-                                timestamp=int(row['ts']),
-                                correlation_id=row['correlation_id'] or ""
-                            )
-                            
-                            # Send to agent's queue
-                            if agent_id in self.agent_queues:
-                                await self.agent_queues[agent_id].put(msg)
-                                print(f"📤 Forwarded message to {agent_id} from {msg.sender_id}")
-                    
-                    # Update last check time
-                    last_check = datetime.datetime.now(datetime.timezone.utc)
-
-                    
-            except asyncio.CancelledError:
-                print(f"🛑 Stopped polling for {agent_id}")
-                break
-            except Exception as e:
-                print(f"❌ Error polling database for {agent_id}: {e}")
-                await asyncio.sleep(5)  # Back off on error
+                # Seqs the stored cursor recorded above the client's are re-sent: they may not have arrived
+                return DeliveredSeqs.resume(max(int(requested), 0), cursor[1] if cursor is not None else None)
+            except ValueError:
+                print(f"⚠️  Ignoring invalid {RESUME_METADATA_KEY} from {agent_id}: {requested!r}")
+
+        if cursor is not None:
+            return DeliveredSeqs.resume(*cursor)
+        # First connection for this agent: start from the live end of the log
+        return DeliveredSeqs(await self.store.max_seq())
 
-    async def message_sender(self, agent_id, context):
-        """Send messages from queue to agent"""
-        queue = self.agent_queues[agent_id]
+    async def replay_backlog(self, agent_id, queue, after_seq):
+        """Queue the stored messages an agent missed after the given seq"""
+        rows = await self.store.messages_after(agent_id, after_seq)
+        if queue.closed:
+            return
+        # Topic messages only belong in the backlog of agents subscribed to them
+        rows = [row for row in rows if not row['topic'] or agent_id in self.topic_index.match(row['topic'])]
+        queued = await queue.put_backlog([Frame(self.row_to_message(row)) for row in rows])
+        if queued:
+            print(f"📬 Replayed {queued} stored messages to {agent_id} after seq {after_seq}")
+
+    def ack(self, agent_id, seq):
+        """Record a seq as written to an agent's stream"""
+        acked = self.acked.get(agent_id)
+        if acked is not None and acked.add(seq):
+            self.dirty_cursors.add(agent_id)
+
+    async def flush_cursors(self, agent_ids=None):
+        """Persist changed delivery cursors, with the seqs delivered just below them, to agent_cursors"""
+        agent_ids = self.dirty_cursors if agent_ids is None else self.dirty_cursors & set(agent_ids)
+        if not agent_ids:
+            return
+        cursors = {agent_id: (self.acked[agent_id].highest, self.acked[agent_id].recent()) for agent_id in agent_ids}
+        self.dirty_cursors -= set(agent_ids)
+        try:
+            await self.store.save_cursors(cursors)
+        except Exception as e:
+            self.dirty_cursors.update(cursors)
+            print(f"❌ Error saving delivery cursors: {e}")
+
+    async def flush_cursors_periodically(self):
+        while True:
+            await asyncio.sleep(CURSOR_FLUSH_INTERVAL)
+            await self.flush_cursors()
+
+    async def message_sender(self, agent_id, queue, context, batched=False):
+        """Write frames from a stream's queue to it as pre-encoded bytes.
+
+        On a batched stream everything already queued goes out as one
+        AgentMessageBatch frame, built by concatenating the cached encodings.
+        """
         while True:
             try:
-                msg = await queue.get()
-                if msg is None:
-                    return
-                await context.write(msg)
-                print(f"✉️  Sent message to {agent_id}")
+                if batched:
+                    frames = await queue.get_batch()
+                    if not frames:
+                        return
+                    await context.write(encode_batch(frames))
+                else:
+                    frame = await queue.get()
+                    if frame is None:
+                        return
+                    frames = [frame]
+                    await context.write(frame.data)
+                for frame in frames:
+                    if frame.seq:
+                        self.ack(agent_id, frame.seq)
+                print(f"✉️  Sent {len(frames)} message(s) to {agent_id}")
             except Exception as e:
                 print(f"❌ Error sending message to {agent_id}: {e}")
                 return
 
+    async def receive_messages(self, agent_id, incoming_batches):
+        """Persist everything the agent sends until its stream ends"""
+        try:
+            async for batch in incoming_batches:
+                print(f"📨 Received {len(batch)} message(s) from {agent_id}")
+                self.presence.seen(agent_id)
+                msgs = []
+                for incoming_msg in batch:
+                    if is_heartbeat(incoming_msg):
+                        # Heartbeats only refresh presence: never persisted or routed
+                        continue
+                    if incoming_msg.message_type in (agent_comm_pb2.AgentMessage.SUBSCRIBE, agent_comm_pb2.AgentMessage.UNSUBSCRIBE):
+                        # Subscription changes are control messages: never persisted or routed
+                        self.update_subscription(agent_id, incoming_msg)
+                        continue
+                    msgs.append(incoming_msg)
+                if msgs:
+                    await self.save_messages(msgs)
+        except Exception as e:
+            print(f"❌ Error during streaming for {agent_id}: {e}")
+
+    def update_subscription(self, agent_id, msg):
+        pattern = msg.topic.strip()
+        if not pattern:
+            print(f"⚠️  Ignoring subscription change without a topic from {agent_id}")
+            return
+        if msg.message_type == agent_comm_pb2.AgentMessage.SUBSCRIBE:
+            self.topic_index.subscribe(agent_id, pattern)
+            print(f"🔔 {agent_id} subscribed to {pattern}")
+        else:
+            self.topic_index.unsubscribe(agent_id, pattern)
+            print(f"🔕 {agent_id} unsubscribed from {pattern}")
+
     async def StreamMessages(self, request_iterator, context):
-        metadata = dict(context.invocation_metadata())
-        print(f"Metadata received: {metadata}")
+        await self._serve_stream(self._single_batches(request_iterator), context, batched=False)
 
-        # Extract token from 'authorization' metadata header
-        auth_header = metadata.get("authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Missing or invalid authorization token")
+    async def StreamMessageBatches(self, request_iterator, context):
+        await self._serve_stream(self._unpacked_batches(request_iterator), context, batched=True)
 
-        token = auth_header[len("Bearer "):]
+    async def _single_batches(self, request_iterator):
+        async for msg in request_iterator:
+            yield [msg]
 
-        # Verify JWT token
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            agent_id_from_token = payload.get("agent_id")
-        except jwt.ExpiredSignatureError:
-            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Token expired")
-        except jwt.InvalidTokenError:
-            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Invalid token")
+    async def _unpacked_batches(self, request_iterator):
+        async for batch in request_iterator:
+            if batch.messages:
+                yield list(batch.messages)
+
+    async def _serve_stream(self, request_batches, context, batched):
+        """Shared body of both stream RPCs; ``request_batches`` yields lists of AgentMessages"""
+        metadata = dict(context.invocation_metadata())
+        print(f"Metadata received: {metadata}")
+
+        agent_id_from_token = await authenticate(context)
 
         print(f"Authenticated agent ID from token: {agent_id_from_token}")
 
         try:
-            first_msg = await request_iterator.__anext__()
+            first_batch = await request_batches.__anext__()
         except StopAsyncIteration:
             print("No messages received; closing stream.")
             return
@@ -159,83 +395,261 @@ class AgentCommServicer(agent_comm_pb2_grpc.AgentCommServicer):
             return
 
         # Verify sender_id matches token
-        if first_msg.sender_id != agent_id_from_token:
+        if first_batch[0].sender_id != agent_id_from_token:
             await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Sender ID does not match token agent ID")
 
         agent_id = agent_id_from_token
-        print(f"✅ Agent connected: {agent_id}")
+        if self.cluster and not self.cluster.owns(agent_id):
+            owner = self.cluster.owner(agent_id)
+            await context.abort(
+                grpc.StatusCode.FAILED_PRECONDITION,
+                f"Agent {agent_id} is owned by cluster node {owner}",
+                trailing_metadata=((OWNER_METADATA_KEY, self.cluster.nodes[owner]),)
+            )
 
-        async with self.lock:
-            if agent_id not in self.agent_queues:
-                self.agent_queues[agent_id] = asyncio.Queue()
-            
-            # Start message sender task
-            send_task = asyncio.create_task(self.message_sender(agent_id, context))
-            
-            # Start database polling task
-            poll_task = asyncio.create_task(self.poll_database_for_messages(agent_id))
-            self.db_poller_tasks[agent_id] = poll_task
-
-        incoming_messages = self._message_generator(first_msg, request_iterator)
+        if agent_id in self.agent_queues:
+            # Reconnected before its old stream ended: resume after what that stream delivered
+            await self.flush_cursors([agent_id])
+        delivered = await self.resolve_resume(agent_id, metadata)
+        print(f"✅ Agent connected: {agent_id} (resuming after seq {delivered.highest})")
+
+        patterns = [pattern.strip() for pattern in metadata.get(SUBSCRIBE_METADATA_KEY, "").split(",") if pattern.strip()]
+        queue = await self.register_queue(agent_id, delivered, patterns)
+        self.presence.connected(agent_id)
+
+        # Start message sender task
+        send_task = asyncio.create_task(self.message_sender(agent_id, queue, context, batched))
 
         try:
-            async for incoming_msg in incoming_messages:
-                print(f"📨 Received message from {agent_id}: type={incoming_msg.message_type}")
-                await self.save_message(incoming_msg)
-                await self.route_message(incoming_msg)
+            await self.replay_backlog(agent_id, queue, delivered.floor)
         except Exception as e:
-            print(f"❌ Error during streaming for {agent_id}: {e}")
+            print(f"❌ Error replaying stored messages for {agent_id}: {e}")
+        finally:
+            queue.finish_replay()
+
+        incoming_batches = self._message_generator(first_batch, request_batches)
+        receive_task = asyncio.create_task(self.receive_messages(agent_id, incoming_batches))
+
+        overflow_reason = None
+        try:
+            # Ends when the agent closes its side or its queue is closed (overflow, or a newer stream)
+            await asyncio.wait({receive_task, send_task}, return_when=asyncio.FIRST_COMPLETED)
+            if queue.overflowed:
+                overflow_reason = queue.close_reason
         finally:
             # Cleanup
             send_task.cancel()
-            poll_task.cancel()
-            
-            async with self.lock:
-                self.agent_queues.pop(agent_id, None)
-                self.db_poller_tasks.pop(agent_id, None)
-            
+            receive_task.cancel()
+
+            # Presence counts streams, so every stream that ends is subtracted. A newer stream
+            # for this agent owns its subscriptions and cursor from here on
+            self.presence.disconnected(agent_id)
+            owned = await self.unregister_queue(agent_id, queue)
+            await self.flush_cursors([agent_id])
+            if owned:
+                self.topic_index.remove_agent(agent_id)
+                self.acked.pop(agent_id, None)
+                self.dirty_cursors.discard(agent_id)
+
             print(f"🔌 Agent disconnected: {agent_id}")
 
-    async def _message_generator(self, first_msg, request_iterator):
-        yield first_msg
-        async for msg in request_iterator:
-            yield msg
+        if overflow_reason:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, overflow_reason)
+
+    async def _message_generator(self, first_batch, request_batches):
+        yield first_batch
+        async for batch in request_batches:
+            yield batch
 
     async def route_message(self, msg):
-        """Route message to connected agents (real-time)"""
-        sender = msg.sender_id
-        
-        if msg.message_type == agent_comm_pb2.AgentMessage.DIRECT:
+        """Route message to connected agents (real-time), forwarding to cluster peers if they need it"""
+        if msg.message_type in DIRECT_TYPES:
             recipient = msg.recipient_id
-            if recipient and recipient in self.agent_queues:
-                await self.agent_queues[recipient].put(msg)
-                print(f"🔀 Routed DIRECT message to {recipient}")
-        elif msg.message_type in (agent_comm_pb2.AgentMessage.BROADCAST, agent_comm_pb2.AgentMessage.EVENT):
-            async with self.lock:
-                for agent_id, queue in self.agent_queues.items():
-                    if agent_id != sender:
-                        await queue.put(msg)
-                print(f"📢 Broadcasted message to {len(self.agent_queues)-1} agents")
+            queue = self.agent_queues.get(recipient) if recipient else None
+            if queue is not None:
+                if queue.push(Frame(msg)) == QUEUED:
+                    print(f"🔀 Routed direct message to {recipient}")
+            elif recipient and self.peer_forwarding and not self.cluster.owns(recipient):
+                owner = self.cluster.forward_to_owner(Frame(msg), recipient)
+                print(f"🛰️  Forwarded direct message for {recipient} to node {owner}")
+        elif msg.message_type in FAN_OUT_TYPES:
+            frame = Frame(msg)
+            delivered = self.fan_out(frame)
+            if self.peer_forwarding:
+                self.cluster.broadcast(frame, self.cluster.node_id)
+            print(f"📢 Broadcasted message to {delivered} agents")
         elif msg.message_type == agent_comm_pb2.AgentMessage.HEARTBEAT:
-            pass  # Ignore heartbeats
-
-async def serve():
-    db_pool = await asyncpg.create_pool(
-        user='prateekganigi',
-        password='43121158312115',
-        database='agent_comm_db',
-        host='localhost'
-    )
+            pass  # Heartbeats only update presence and never reach here from streams
+
+    async def deliver_forwarded(self, root_node, msgs):
+        """Store and deliver messages another cluster node forwarded here, passing broadcasts down the tree.
+
+        Forwarding only runs with a store per node, so each forwarded batch is
+        saved here too. That gives it seqs from this node's own sequence (the
+        sender's seqs would collide with local ones in the recipients'
+        DeliveredSeqs) and lets owned agents that aren't connected catch up on
+        it from storage when they reconnect.
+        """
+        local = []
+        for msg in msgs:
+            if msg.message_type in FAN_OUT_TYPES:
+                self.cluster.broadcast(Frame(msg), root_node)
+            copy = agent_comm_pb2.AgentMessage()
+            copy.CopyFrom(msg)
+            copy.seq = 0
+            local.append(copy)
+        await self.store.save_messages(local)
+
+        accepted = 0
+        for msg in local:
+            if msg.message_type in FAN_OUT_TYPES:
+                accepted += self.fan_out(Frame(msg))
+            else:
+                queue = self.agent_queues.get(msg.recipient_id)
+                if queue is not None and queue.push(Frame(msg)) == QUEUED:
+                    accepted += 1
+        return accepted
+
+def add_comm_servicer_to_server(servicer, server):
+    """Register AgentComm like the generated helper, but with a pass-through response serializer.
+
+    message_sender writes frames that are already encoded, so the bytes go
+    straight onto the stream instead of being serialized again per recipient.
+    """
+    rpc_method_handlers = {
+        'StreamMessages': grpc.stream_stream_rpc_method_handler(
+            servicer.StreamMessages,
+            request_deserializer=agent_comm_pb2.AgentMessage.FromString,
+            response_serializer=lambda data: data,
+        ),
+        'StreamMessageBatches': grpc.stream_stream_rpc_method_handler(
+            servicer.StreamMessageBatches,
+            request_deserializer=agent_comm_pb2.AgentMessageBatch.FromString,
+            response_serializer=lambda data: data,
+        ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler('agentcomm.AgentComm', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('agentcomm.AgentComm', rpc_method_handlers)
+
+class AgentMonitorServicer(agent_comm_pb2_grpc.AgentMonitorServicer):
+    def __init__(self, comm_servicer):
+        self.comm_servicer = comm_servicer
+
+    async def GetQueueStats(self, request, context):
+        await authenticate(context)
+        stats = self.comm_servicer.queue_stats()
+        if request.agent_id:
+            stats = {request.agent_id: stats[request.agent_id]} if request.agent_id in stats else {}
+        return agent_comm_pb2.QueueStatsResponse(queues=[
+            agent_comm_pb2.QueueStats(agent_id=agent_id, **queue_stats)
+            for agent_id, queue_stats in sorted(stats.items(), key=lambda item: -item[1]["bytes"])
+        ])
+
+    async def GetAuthStats(self, request, context):
+        await authenticate(context)
+        stats = token_verifier.stats()
+        return agent_comm_pb2.AuthStats(
+            hits=stats["hits"],
+            misses=stats["misses"],
+            hit_rate=stats["hit_rate"],
+            cached_tokens=stats["size"]
+        )
+
+    async def GetPresence(self, request, context):
+        await authenticate(context)
+        agents = self.comm_servicer.presence.snapshot(online_only=request.online_only)
+        if request.agent_id:
+            agents = [p for p in agents if p.agent_id == request.agent_id]
+        return agent_comm_pb2.PresenceResponse(agents=[
+            agent_comm_pb2.AgentPresence(
+                agent_id=p.agent_id,
+                online=p.online,
+                last_seen=int(p.last_seen),
+                connected_since=int(p.connected_since)
+            )
+            for p in agents
+        ])
+
+class AgentClusterServicer(agent_comm_pb2_grpc.AgentClusterServicer):
+    def __init__(self, comm_servicer):
+        self.comm_servicer = comm_servicer
+
+    async def Forward(self, request, context):
+        auth_header = dict(context.invocation_metadata()).get("authorization", "")
+        peer = self.comm_servicer.cluster.verify_peer(auth_header[len("Bearer "):])
+        if peer is None:
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED, "Not a cluster peer")
+        accepted = await self.comm_servicer.deliver_forwarded(request.root_node, request.messages)
+        return agent_comm_pb2.ClusterForwardResponse(accepted=accepted)
 
-    server = grpc.aio.server()
-    agent_comm_pb2_grpc.add_AgentRegistryServicer_to_server(AgentRegistryServicer(), server)
-    agent_comm_pb2_grpc.add_AgentCommServicer_to_server(AgentCommServicer(db_pool), server)
+async def serve(worker_id=None):
+    # Announce every batch so sibling workers and the REST API's SSE feed deliver it
+    store = create_store(announce=True, origin=worker_id or f"grpc-{uuid.uuid4().hex[:8]}")
+    await store.connect()
+
+    cluster = None
+    if CLUSTER_NODES:
+        cluster = ClusterNode(NODE_ID, parse_nodes(CLUSTER_NODES), JWT_SECRET, JWT_ALGORITHM)
+
+    comm_servicer = AgentCommServicer(store, cluster=cluster)
+    await comm_servicer.start()
+
+    # Workers all bind the same port; the kernel spreads new connections across them
+    server = grpc.aio.server(options=KEEPALIVE_OPTIONS + [("grpc.so_reuseport", 1)])
+    agent_comm_pb2_grpc.add_AgentRegistryServicer_to_server(AgentRegistryServicer(cluster), server)
+    add_comm_servicer_to_server(comm_servicer, server)
+    agent_comm_pb2_grpc.add_AgentMonitorServicer_to_server(AgentMonitorServicer(comm_servicer), server)
     listen_addr = '[::]:50051'
+    if cluster:
+        agent_comm_pb2_grpc.add_AgentClusterServicer_to_server(AgentClusterServicer(comm_servicer), server)
+        listen_addr = f"[::]:{cluster.address.rsplit(':', 1)[1]}"
     server.add_insecure_port(listen_addr)
-    print(f"🚀 Starting gRPC server on {listen_addr}...")
+    print(f"🚀 Starting gRPC server on {listen_addr}{f' (worker {worker_id})' if worker_id else ''}...")
     await server.start()
     print("✅ Server started and ready!")
-    await server.wait_for_termination()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await comm_servicer.stop()
+        await store.close()
+
+def run_worker(worker_id):
+    try:
+        asyncio.run(serve(worker_id))
+    except KeyboardInterrupt:
+        pass
+
+def serve_workers(count):
+    """Run ``count`` server processes on one port so routing and protobuf work use every core"""
+    # Spawned, not forked: gRPC must not be initialised before the child starts
+    ctx = multiprocessing.get_context("spawn")
+    run_id = uuid.uuid4().hex[:8]
+    workers = [
+        ctx.Process(target=run_worker, args=(f"{run_id}-{i}",), name=f"agent-worker-{i}")
+        for i in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    print(f"👷 Started {count} workers")
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
 
 if __name__ == '__main__':
-    asyncio.run(serve())
+    if WORKERS > 1 and CLUSTER_NODES:
+        raise SystemExit("AGENT_WORKERS cannot be combined with AGENT_CLUSTER_NODES; run one process per node")
+    if WORKERS > 1 and os.getenv("AGENT_STORE", "postgres").lower() != "postgres":
+        # Only Postgres has a change feed; with other stores each worker would only route its own streams
+        raise SystemExit("AGENT_WORKERS > 1 requires AGENT_STORE=postgres")
+    if WORKERS > 1:
+        serve_workers(WORKERS)
+    else:
+        asyncio.run(serve())
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+import traceback
+
+from google.protobuf import json_format
+
+# Durability modes for MessageWriter.submit
+ACK_AFTER_COMMIT = "commit"    # submit() returns once the message's batch is committed
+ACK_AFTER_ENQUEUE = "enqueue"  # submit() returns as soon as the message is queued
+
+# Messages acked before their commit that then could not be saved, one JSON object per line
+DEFAULT_DEAD_LETTER_PATH = "failed_messages.jsonl"
+
+
+class MessageWriter:
+    """Write-behind persistence stage that group-commits messages from every stream.
+
+    Messages are collected until ``max_batch`` are pending or ``max_delay``
+    seconds have passed since the first one, then saved with a single
+    MessageStore.save_messages call. ``on_commit`` receives each committed
+    batch, with ``seq`` set on every message, in commit order.
+
+    A batch that still fails after ``max_attempts`` is split in half until
+    the rows that can't be saved are isolated, so one bad message doesn't
+    fail the rest. Failed messages nobody is waiting for (ack-after-enqueue)
+    are appended to ``dead_letter_path`` to be re-sent by hand.
+    """
+
+    def __init__(self, store, on_commit, durability=ACK_AFTER_COMMIT,
+                 max_batch=1000, max_delay=0.005, max_pending=50000, max_attempts=3,
+                 dead_letter_path=DEFAULT_DEAD_LETTER_PATH):
+        if durability not in (ACK_AFTER_COMMIT, ACK_AFTER_ENQUEUE):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.store = store
+        self.on_commit = on_commit
+        self.durability = durability
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.pending = asyncio.Queue(maxsize=max_pending)
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is still queued, then stop the writer task"""
+        if self.task is None:
+            return
+        await self.pending.put(None)
+        await self.task
+        self.task = None
+
+    async def submit(self, msg):
+        """Queue a message for persistence, waiting for its commit in ack-after-commit mode"""
+        future = asyncio.get_running_loop().create_future() if self.durability == ACK_AFTER_COMMIT else None
+        await self.pending.put((msg, future))
+        if future is not None:
+            await future
+
+    async def submit_many(self, msgs):
+        """Queue several messages at once, waiting for all of their commits in ack-after-commit mode"""
+        futures = []
+        for msg in msgs:
+            future = asyncio.get_running_loop().create_future() if self.durability == ACK_AFTER_COMMIT else None
+            await self.pending.put((msg, future))
+            if future is not None:
+                futures.append(future)
+        if futures:
+            await asyncio.gather(*futures)
+
+    async def _run(self):
+        while True:
+            item = await self.pending.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.pending.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        msgs = [msg for msg, _ in batch]
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.store.save_messages(msgs)
+                error = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                print(f"⚠️  Error saving batch of {len(msgs)} messages (attempt {attempt}/{self.max_attempts}): {e}")
+                if self.store.is_data_error(e):
+                    break  # the same rows would fail the same way again
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(0.1 * attempt)
+
+        if error is not None:
+            if len(batch) > 1 and self.store.is_data_error(error):
+                # Bisect down to the rows the database rejects; the rest still commit, in order
+                middle = len(batch) // 2
+                await self._flush(batch[:middle])
+                await self._flush(batch[middle:])
+            else:
+                await self._fail(batch, error)
+            return
+
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+        print(f"✅ Saved batch of {len(msgs)} messages")
+        try:
+            await self.on_commit(msgs)
+        except Exception:
+            print(f"❌ Error routing committed batch of {len(msgs)} messages")
+            traceback.print_exc()
+
+    async def _fail(self, batch, error):
+        print(f"❌ Could not save {len(batch)} message(s): {error}")
+        unacked = []
+        for msg, future in batch:
+            if future is None:
+                unacked.append(msg)
+            elif not future.done():
+                future.set_exception(error)
+        if not unacked:
+            return
+        # Already acked to their senders, so keep them where they can be recovered
+        failed_at = time.time()
+        lines = [
+            json.dumps({"failed_at": failed_at, "error": str(error), "message": json_format.MessageToDict(msg)})
+            for msg in unacked
+        ]
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._append_dead_letters, lines)
+            print(f"❌ Wrote {len(lines)} unsaved message(s) to {self.dead_letter_path}")
+        except Exception:
+            print(f"❌ Could not write {len(lines)} unsaved message(s) to {self.dead_letter_path}: {lines}")
+            traceback.print_exc()
+
+    def _append_dead_letters(self, lines):
+        with open(self.dead_letter_path, "a") as f:
+            f.writelines(line + "\n" for line in lines)
@@ -0,0 +1,62 @@
+"""In-memory presence table for agents connected to this server.
+
+Whether an agent is online follows its open streams, which gRPC keepalive
+pings keep honest: a dead connection fails its pings and the stream is torn
+down. ``last_seen`` moves on every heartbeat or other inbound message. None
+of this is ever written to agent_messages.
+"""
+
+import time
+
+# Offline agents are forgotten after this many seconds
+OFFLINE_RETENTION = 24 * 60 * 60
+
+
+class Presence:
+    __slots__ = ("agent_id", "streams", "connected_since", "last_seen")
+
+    def __init__(self, agent_id, now):
+        self.agent_id = agent_id
+        self.streams = 0
+        self.connected_since = now
+        self.last_seen = now
+
+    @property
+    def online(self):
+        return self.streams > 0
+
+
+class PresenceTable:
+    def __init__(self, offline_retention=OFFLINE_RETENTION):
+        self.agents = {}  # agent_id -> Presence
+        self.offline_retention = offline_retention
+
+    def connected(self, agent_id):
+        now = time.time()
+        presence = self.agents.get(agent_id)
+        if presence is None:
+            presence = self.agents[agent_id] = Presence(agent_id, now)
+        if not presence.online:
+            presence.connected_since = now
+        presence.streams += 1
+        presence.last_seen = now
+
+    def disconnected(self, agent_id):
+        presence = self.agents.get(agent_id)
+        if presence is not None:
+            presence.streams = max(presence.streams - 1, 0)
+            presence.last_seen = time.time()
+
+    def seen(self, agent_id):
+        """Record a heartbeat or any other sign of life from a connected agent"""
+        presence = self.agents.get(agent_id)
+        if presence is not None:
+            presence.last_seen = time.time()
+
+    def snapshot(self, online_only=False):
+        """Every known agent, most recently seen first"""
+        cutoff = time.time() - self.offline_retention
+        for agent_id in [a for a, p in self.agents.items() if not p.online and p.last_seen < cutoff]:
+            del self.agents[agent_id]
+        agents = [p for p in self.agents.values() if p.online or not online_only]
+        return sorted(agents, key=lambda p: -p.last_seen)
@@ -0,0 +1,162 @@
+import asyncio
+import bisect
+import collections
+import itertools
+
+# Rows buffered per SSE connection before it is dropped as too slow; EventSource reconnects on its own
+MAX_SUBSCRIBER_QUEUE = 1000
+
+# How often the fallback tailer polls a store that has no change feed
+POLL_INTERVAL = 1.0
+
+# Most recent rows kept for Last-Event-ID resumes; older resume points go to the database
+REPLAY_BUFFER_SIZE = 10000
+
+
+class SSEBroadcaster:
+    """One change-feed consumer per API process, fanned out to per-agent SSE queues.
+
+    Rows reach the broadcaster from the store's change feed (other processes)
+    and from ``publish`` (messages sent through this API), so database load
+    depends on the message rate, not on the number of open dashboards. Stores
+    without a change feed are tailed by seq once per POLL_INTERVAL instead.
+
+    The last ``replay_size`` rows are also kept in seq order so a reconnecting
+    stream can be sent what it missed without a query, and in the order they
+    were published. Batches can commit out of seq order, so a stream resuming
+    after a seq it was sent gets everything published after that row,
+    including lower seqs that committed later.
+    """
+
+    def __init__(self, max_queue=MAX_SUBSCRIBER_QUEUE, replay_size=REPLAY_BUFFER_SIZE):
+        self.max_queue = max_queue
+        self.subscribers = {}  # agent_id -> set of asyncio.Queue
+        self.replay_size = replay_size
+        self.replay = []  # rows sorted by seq
+        self.replay_seqs = []  # their seqs, for bisect
+        self.replay_floor = 0  # every row with a higher seq is in self.replay
+        self.published = collections.deque()  # (position, row) in publish order, the last replay_size rows
+        self.positions = {}  # seq -> position, for the rows in self.published
+        self._position = itertools.count()
+        self._feed = None
+        self._poller = None
+
+    async def start(self, store):
+        self.replay_floor = await store.max_seq()
+        self._feed = store.change_feed(self.on_rows)
+        if self._feed:
+            await self._feed.start()
+        else:
+            self._poller = asyncio.create_task(self._tail(store))
+
+    async def stop(self):
+        if self._feed:
+            await self._feed.stop()
+            self._feed = None
+        if self._poller:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+    def subscribe(self, agent_id):
+        queue = asyncio.Queue(self.max_queue)
+        self.subscribers.setdefault(agent_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, agent_id, queue):
+        queues = self.subscribers.get(agent_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[agent_id]
+
+    @property
+    def connection_count(self):
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    async def on_rows(self, rows):
+        self.publish(rows)
+
+    def publish_sent(self, rows):
+        """Rows saved by this process: the change feed skips our own announcements, the tailer does not"""
+        if self._poller is None:
+            self.publish(rows)
+
+    def replay_after(self, agent_id, after_seq):
+        """Buffered rows an agent missed after being sent after_seq, or None if the buffer no longer reaches back that far.
+
+        When after_seq is still buffered this is every row published after it;
+        otherwise (a seq this process never published) rows with a higher seq.
+        """
+        position = self.positions.get(after_seq)
+        if position is not None:
+            rows = (row for _, row in itertools.islice(self.published, position - self.published[0][0] + 1, None))
+        elif after_seq < self.replay_floor:
+            return None
+        else:
+            rows = self.replay[bisect.bisect_right(self.replay_seqs, after_seq):]
+        return [row for row in rows if not row["recipient_id"] or agent_id in (row["sender_id"], row["recipient_id"])]
+
+    def _remember(self, row):
+        """Buffer a row for replay; False if it was already published (a change feed catch-up repeats rows)"""
+        seq = row["seq"]
+        if seq in self.positions:
+            return False
+        position = next(self._position)
+        self.published.append((position, row))
+        self.positions[seq] = position
+        if len(self.published) > self.replay_size:
+            _, oldest = self.published.popleft()
+            del self.positions[oldest["seq"]]
+        if seq <= self.replay_floor:
+            return True
+        if not self.replay_seqs or seq > self.replay_seqs[-1]:
+            self.replay.append(row)
+            self.replay_seqs.append(seq)
+        else:
+            # Announcements from different processes can arrive out of seq order
+            index = bisect.bisect_left(self.replay_seqs, seq)
+            if index < len(self.replay_seqs) and self.replay_seqs[index] == seq:
+                return False
+            self.replay.insert(index, row)
+            self.replay_seqs.insert(index, seq)
+        # Trim in chunks so the lists aren't shifted on every message
+        if len(self.replay) > self.replay_size + self.replay_size // 4:
+            drop = len(self.replay) - self.replay_size
+            self.replay_floor = self.replay_seqs[drop - 1]
+            del self.replay[:drop]
+            del self.replay_seqs[:drop]
+        return True
+
+    def publish(self, rows):
+        """Hand rows to the streams of their sender and recipient, or to every stream for broadcasts"""
+        for row in rows:
+            if not self._remember(row):
+                continue
+            recipient_id = row["recipient_id"]
+            if recipient_id:
+                targets = {row["sender_id"], recipient_id}
+            else:
+                targets = list(self.subscribers)
+            for agent_id in targets:
+                for queue in list(self.subscribers.get(agent_id, ())):
+                    try:
+                        queue.put_nowait(row)
+                    except asyncio.QueueFull:
+                        # Too far behind: end that stream instead of buffering without bound
+                        self.unsubscribe(agent_id, queue)
+                        queue.get_nowait()
+                        queue.put_nowait(None)
+
+    async def _tail(self, store):
+        last_seq = await store.max_seq()
+        while True:
+            try:
+                rows = await store.messages_since(last_seq)
+                if rows:
+                    last_seq = rows[-1]["seq"]
+                    self.publish(rows)
+                    continue
+            except Exception as e:
+                print(f"❌ SSE tail error: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
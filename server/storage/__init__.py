@@ -0,0 +1,43 @@
+"""Message storage backends.
+
+``create_store()`` picks the backend from AGENT_STORE: "postgres" (the
+default), "sqlite" or "memory". Postgres connection settings come from the
+AGENT_DB_* variables, partitioning and retention from AGENT_PARTITION_* and
+AGENT_RETENTION_DAYS.
+"""
+
+import os
+
+from .base import MessageStore
+from .memory import MemoryStore
+from .partitions import PartitionManager, parse_retention
+from .postgres import PostgresStore
+from .sqlite import SQLiteStore
+
+__all__ = ["MessageStore", "MemoryStore", "PartitionManager", "PostgresStore", "SQLiteStore", "create_store"]
+
+
+def create_store(kind=None, announce=False, origin=None):
+    """Build the configured store; ``announce``/``origin`` only matter for Postgres (see PostgresStore)"""
+    kind = (kind or os.getenv("AGENT_STORE", "postgres")).lower()
+    if kind == "postgres":
+        return PostgresStore(
+            announce=announce,
+            origin=origin,
+            partitions=PartitionManager(
+                interval=os.getenv("AGENT_PARTITION_INTERVAL", "day"),
+                premake=int(os.getenv("AGENT_PARTITION_PREMAKE", "3")),
+                retention=parse_retention(os.getenv("AGENT_RETENTION_DAYS")),
+                archive_dir=os.getenv("AGENT_ARCHIVE_DIR", "archive"),
+            ),
+            user=os.getenv("AGENT_DB_USER"),
+            password=os.getenv("AGENT_DB_PASSWORD"),
+            database=os.getenv("AGENT_DB_NAME", "agent_comm_db"),
+            host=os.getenv("AGENT_DB_HOST", "localhost"),
+            port=int(os.getenv("AGENT_DB_PORT", "5432")),
+        )
+    if kind == "sqlite":
+        return SQLiteStore(os.getenv("AGENT_SQLITE_PATH", "agent_comm.db"))
+    if kind == "memory":
+        return MemoryStore(int(os.getenv("AGENT_MEMORY_CAPACITY", "100000")))
+    raise ValueError(f"Unknown AGENT_STORE: {kind!r} (expected postgres, sqlite or memory)")
@@ -0,0 +1,154 @@
+import re
+
+# Characters of the last message kept in conversation_summaries
+PREVIEW_LENGTH = 120
+
+# Words for full-text search; underscores and punctuation split words as in the Postgres and FTS5 parsers
+SEARCH_WORD = re.compile(r"[^\W_]+")
+
+
+def preview_text(payload):
+    return bytes(payload[:PREVIEW_LENGTH * 4]).decode("utf-8", errors="replace")[:PREVIEW_LENGTH]
+
+
+def search_terms(text):
+    """Lower-cased words of a payload or search query"""
+    return SEARCH_WORD.findall(text.lower())
+
+
+def search_key(row):
+    """Order of search results: best rank first, then newest first"""
+    return (row["rank"], row["ts"], str(row["message_id"]))
+
+
+def summary_updates(msgs):
+    """Conversation summary changes for a batch as [(agent_id, peer_id, preview, count, unread)].
+
+    Every direct message counts once for each side; only the recipient's side
+    gets an unread. Sorted by pair so concurrent upserts lock rows in the same order.
+    """
+    updates = {}
+    for msg in msgs:
+        recipient_id = msg.recipient_id
+        if not recipient_id or recipient_id == msg.sender_id:
+            continue
+        preview = preview_text(msg.payload)
+        for key, unread in (((msg.sender_id, recipient_id), 0), ((recipient_id, msg.sender_id), 1)):
+            update = updates.setdefault(key, [preview, 0, 0])
+            update[0] = preview
+            update[1] += 1
+            update[2] += unread
+    return [(agent_id, peer_id, *update) for (agent_id, peer_id), update in sorted(updates.items())]
+
+
+class MessageStore:
+    """Storage interface shared by the gRPC server and the REST API.
+
+    Query methods return rows as mappings with ``message_id``, ``sender_id``,
+    ``recipient_id``, ``message_type``, ``payload`` (bytes), ``ts`` (unix
+    seconds), ``correlation_id``, ``seq`` and ``topic``. Broadcasts have no
+    recipient_id.
+    """
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def save_messages(self, msgs):
+        """Insert AgentMessages as one batch, set ``seq`` on each and return [{message_id, seq, ts}]"""
+        raise NotImplementedError
+
+    async def save_messages_bulk(self, msgs):
+        """save_messages for large client-submitted batches; backends with a faster bulk path override it"""
+        return await self.save_messages(msgs)
+
+    async def save_message(self, msg):
+        return (await self.save_messages([msg]))[0]
+
+    def is_data_error(self, error):
+        """True if save_messages raised ``error`` because of the rows themselves (too long, invalid text...)
+        rather than the database being unavailable; MessageWriter then bisects the batch to find them"""
+        return False
+
+    async def get_cursor(self, agent_id):
+        """(highest seq delivered to an agent, the seqs recently delivered below it), or None if it has never
+        connected. The list is None for cursors saved before recent seqs were recorded."""
+        raise NotImplementedError
+
+    async def save_cursors(self, cursors):
+        """Store {agent_id: (seq, recent seqs)} delivery cursors; a cursor never moves backwards"""
+        raise NotImplementedError
+
+    async def max_seq(self):
+        raise NotImplementedError
+
+    async def messages_after(self, agent_id, after_seq, include_sent=False):
+        """Messages for an agent (direct or broadcast) with seq > after_seq, oldest first.
+
+        ``include_sent`` also returns the agent's own messages, as the dashboard shows both sides.
+        """
+        raise NotImplementedError
+
+    async def messages_since(self, after_seq, limit=1000):
+        """Up to ``limit`` messages for any agent with seq > after_seq, oldest first"""
+        raise NotImplementedError
+
+    async def fetch_messages(self, message_ids=(), seqs=()):
+        """Rows matching any of the given message_ids or seqs, oldest first"""
+        raise NotImplementedError
+
+    async def conversation(self, agent_id, other_agent_id, limit=50, offset=0, before=None, after=None):
+        """Direct messages between two agents, newest first.
+
+        ``before``/``after`` are (ts, message_id) keyset cursors: the page holds
+        the ``limit`` rows just older/newer than that row, in (ts, message_id) order.
+        """
+        raise NotImplementedError
+
+    async def agent_messages(self, agent_id, start_time=None, end_time=None, message_type=None,
+                             limit=100, offset=0, before=None, after=None):
+        """Messages sent by, sent to or broadcast to an agent, newest first; times are unix seconds.
+
+        ``before``/``after`` work as in ``conversation``.
+        """
+        raise NotImplementedError
+
+    async def export_messages(self, agent_id, start_time=None, end_time=None, message_type=None, peer_id=None,
+                              chunk_size=1000):
+        """Async generator of row lists (at most chunk_size each) covering an agent's history, oldest first.
+
+        Same rows as agent_messages, or as conversation with ``peer_id``, without
+        ever holding more than one chunk in memory.
+        """
+        raise NotImplementedError
+        yield
+
+    async def search_messages(self, agent_id, query, sender_id=None, recipient_id=None, message_type=None,
+                              start_time=None, end_time=None, limit=50, cursor=None):
+        """Messages visible to an agent (as in agent_messages) that contain every word of ``query``.
+
+        Rows carry an extra ``rank`` (higher is better) and come best first,
+        ties newest first. ``cursor`` is the search_key of the last row of the
+        previous page.
+        """
+        raise NotImplementedError
+
+    async def thread(self, correlation_id, agent_id, limit=500, after=None):
+        """The messages with ``correlation_id`` that the agent sent, received or was broadcast, oldest first,
+        like every other read. ``after`` is a (ts, message_id) cursor to continue from."""
+        raise NotImplementedError
+
+    async def agent_summaries(self, agent_id):
+        """[{agent_id, last_message_time, last_message_preview, message_count, unread_count}], most recent first,
+        for every agent this one has exchanged direct messages with"""
+        raise NotImplementedError
+
+    async def mark_read(self, agent_id, peer_id):
+        """Reset the unread count of agent_id's conversation with peer_id"""
+        raise NotImplementedError
+
+    def change_feed(self, on_rows):
+        """A feed of rows written by other processes, or None if the backend is single-process"""
+        return None
@@ -0,0 +1,170 @@
+import asyncio
+
+# Channel that announcing stores NOTIFY with "<origin>:<seq ranges>" once per committed
+# batch; a bare message_id from older writers is still accepted
+NOTIFY_CHANNEL = "agent_messages"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_PAYLOAD = 7900
+
+# Queued by the listener after a reconnect: fetch whatever was committed while it was down
+_CATCH_UP = object()
+
+
+def encode_seq_payloads(origin, seqs):
+    """NOTIFY payloads announcing a committed batch, e.g. "w1:101-140,145", split to fit the limit"""
+    ranges = []
+    for seq in sorted(seqs):
+        if ranges and seq == ranges[-1][1] + 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+
+    payloads = []
+    current = ""
+    for start, end in ranges:
+        part = str(start) if start == end else f"{start}-{end}"
+        if current and len(origin) + len(current) + len(part) + 2 > MAX_NOTIFY_PAYLOAD:
+            payloads.append(f"{origin}:{current}")
+            current = ""
+        current = f"{current},{part}" if current else part
+    if current:
+        payloads.append(f"{origin}:{current}")
+    return payloads
+
+
+def decode_seq_ranges(text):
+    seqs = []
+    for part in text.split(","):
+        start, _, end = part.partition("-")
+        seqs.extend(range(int(start), int(end or start) + 1))
+    return seqs
+
+
+class ChangeFeed:
+    """Single shared LISTEN connection that fans new agent_messages rows out to a callback.
+
+    One feed serves every connected agent, so Postgres load depends on the
+    message rate instead of on the number of open streams. Batches announced
+    by ``origin`` (this process) are skipped: they were already routed locally.
+    NOTIFYs sent while the LISTEN connection is down are lost, so after a
+    reconnect every row above the last seq seen is fetched before notifications
+    are handled again; rows this process already routed come back too, and the
+    callback must tolerate seeing a seq twice.
+    """
+
+    def __init__(self, store, on_rows, channel=NOTIFY_CHANNEL, max_batch=500, origin=None):
+        self.store = store
+        self.on_rows = on_rows
+        self.channel = channel
+        self.max_batch = max_batch
+        self.origin = origin
+        self.last_seq = None  # highest seq delivered or announced by this origin
+        self._missed_after = None  # catch-up position after a reconnect, None when caught up
+        self._pending = asyncio.Queue()
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._dispatch()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _on_notify(self, conn, pid, channel, payload):
+        origin, sep, ranges = payload.partition(":")
+        if not sep:
+            self._pending.put_nowait(payload)  # a single message_id
+            return
+        try:
+            seqs = decode_seq_ranges(ranges)
+        except ValueError:
+            print(f"⚠️  Ignoring malformed notification: {payload[:80]!r}")
+            return
+        if origin != self.origin:
+            self._pending.put_nowait(seqs)
+        elif seqs:
+            self._advance(max(seqs))
+
+    def _advance(self, seq):
+        if self.last_seq is None or seq > self.last_seq:
+            self.last_seq = seq
+
+    async def _listen(self):
+        """Hold one pooled connection in LISTEN mode, reconnecting (and catching up) if it drops"""
+        while True:
+            try:
+                async with self.store.pool.acquire() as conn:
+                    closed = asyncio.Event()
+                    conn.add_termination_listener(lambda _conn: closed.set())
+                    await conn.add_listener(self.channel, self._on_notify)
+                    print(f"👂 Listening for new messages on '{self.channel}'")
+                    if self.last_seq is None:
+                        self._advance(await self.store.max_seq())
+                    else:
+                        # Queued behind anything received before the drop, ahead of anything after it
+                        if self._missed_after is None:
+                            self._missed_after = self.last_seq
+                        self._pending.put_nowait(_CATCH_UP)
+                    try:
+                        await closed.wait()
+                    finally:
+                        if not conn.is_closed():
+                            await conn.remove_listener(self.channel, self._on_notify)
+                print("⚠️  Change feed connection lost, reconnecting...")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Change feed listener error: {e}")
+            await asyncio.sleep(1)
+
+    async def _dispatch(self):
+        """Coalesce bursts of notifications into one fetch and hand the rows to the callback"""
+        while True:
+            notifications = [await self._pending.get()]
+            while notifications[-1] is not _CATCH_UP and len(notifications) < self.max_batch:
+                try:
+                    notifications.append(self._pending.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            catch_up = notifications[-1] is _CATCH_UP
+            message_ids = [n for n in notifications if isinstance(n, str)]
+            seqs = [seq for n in notifications if isinstance(n, list) for seq in n]
+
+            try:
+                if message_ids or seqs:
+                    await self._deliver(await self.store.fetch_messages(message_ids, seqs))
+                if catch_up:
+                    await self._catch_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Change feed dispatch error: {e}")
+                if catch_up:
+                    await asyncio.sleep(1)
+                    self._pending.put_nowait(_CATCH_UP)
+
+    async def _deliver(self, rows):
+        if rows:
+            self._advance(max(row["seq"] for row in rows))
+            await self.on_rows(rows)
+
+    async def _catch_up(self):
+        """Deliver rows committed while the LISTEN connection was down"""
+        total = 0
+        while True:
+            # Not last_seq: our own announcements keep advancing it while this runs
+            rows = await self.store.messages_since(self._missed_after, self.max_batch)
+            if not rows:
+                break
+            await self._deliver(rows)
+            self._missed_after = rows[-1]["seq"]
+            total += len(rows)
+        self._missed_after = None
+        if total:
+            print(f"📬 Change feed caught up on {total} messages committed while it was reconnecting")
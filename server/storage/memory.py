@@ -0,0 +1,220 @@
+import collections
+import heapq
+import math
+import time
+import uuid
+
+from .base import MessageStore, search_key, search_terms, summary_updates
+
+DEFAULT_CAPACITY = 100000
+
+
+def row_key(row):
+    return (row["ts"], row["message_id"])
+
+
+class MemoryStore(MessageStore):
+    """Keeps the most recent ``capacity`` messages in a ring buffer; nothing survives a restart.
+
+    Meant for benchmarks and load tests that should measure the hub, not the database.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.messages = collections.deque(maxlen=capacity)  # rows in seq order
+        self.cursors = {}
+        self.summaries = {}  # agent_id -> {peer_id: summary row}; not trimmed with the ring buffer
+        self.search_index = {}  # word -> deque of seqs, oldest first
+        self.search_docs = {}  # seq -> (row, {word: count}, word count) for rows still in the ring buffer
+        self.threads = {}  # correlation_id -> deque of rows, oldest first
+        self.last_seq = 0
+
+    async def save_messages(self, msgs):
+        saved = []
+        now = time.time()
+        for msg in msgs:
+            self.last_seq += 1
+            row = {
+                "message_id": str(uuid.uuid4()),
+                "sender_id": msg.sender_id,
+                "recipient_id": msg.recipient_id or None,
+                "message_type": msg.message_type,
+                "payload": msg.payload,
+                "ts": now,
+                "correlation_id": msg.correlation_id or None,
+                "seq": self.last_seq,
+                "topic": msg.topic or None,
+            }
+            if len(self.messages) == self.messages.maxlen:
+                self._unindex(self.messages[0])
+            self.messages.append(row)
+            self._index(row)
+            msg.seq = self.last_seq
+            saved.append({"message_id": row["message_id"], "seq": row["seq"], "ts": now})
+        for agent_id, peer_id, preview, count, unread in summary_updates(msgs):
+            summary = self.summaries.setdefault(agent_id, {}).setdefault(peer_id, {
+                "agent_id": peer_id, "message_count": 0, "unread_count": 0,
+            })
+            summary["last_message_time"] = now
+            summary["last_message_preview"] = preview
+            summary["message_count"] += count
+            summary["unread_count"] += unread
+        return saved
+
+    def _index(self, row):
+        counts = collections.Counter(search_terms(bytes(row["payload"]).decode(errors="replace")))
+        self.search_docs[row["seq"]] = (row, counts, sum(counts.values()))
+        for term in counts:
+            self.search_index.setdefault(term, collections.deque()).append(row["seq"])
+        if row["correlation_id"]:
+            self.threads.setdefault(row["correlation_id"], collections.deque()).append(row)
+
+    def _unindex(self, row):
+        """Drop the oldest row; it is first in every posting list and thread it is in"""
+        _, counts, _ = self.search_docs.pop(row["seq"])
+        for term in counts:
+            postings = self.search_index[term]
+            postings.popleft()
+            if not postings:
+                del self.search_index[term]
+        if row["correlation_id"]:
+            thread = self.threads[row["correlation_id"]]
+            thread.popleft()
+            if not thread:
+                del self.threads[row["correlation_id"]]
+
+    async def get_cursor(self, agent_id):
+        return self.cursors.get(agent_id)
+
+    async def save_cursors(self, cursors):
+        for agent_id, (seq, recent) in cursors.items():
+            if agent_id not in self.cursors or seq >= self.cursors[agent_id][0]:
+                self.cursors[agent_id] = (seq, list(recent))
+
+    async def max_seq(self):
+        return self.last_seq
+
+    def _newest_first(self):
+        return reversed(self.messages)
+
+    async def messages_after(self, agent_id, after_seq, include_sent=False):
+        rows = []
+        for row in self._newest_first():
+            if row["seq"] <= after_seq:
+                break
+            if include_sent:
+                wanted = row["sender_id"] == agent_id or row["recipient_id"] in (agent_id, None)
+            else:
+                wanted = row["sender_id"] != agent_id and row["recipient_id"] in (agent_id, None)
+            if wanted:
+                rows.append(row)
+        rows.reverse()
+        return rows
+
+    async def messages_since(self, after_seq, limit=1000):
+        rows = []
+        for row in self._newest_first():
+            if row["seq"] <= after_seq:
+                break
+            rows.append(row)
+        return rows[::-1][:limit]
+
+    async def fetch_messages(self, message_ids=(), seqs=()):
+        message_ids = {str(message_id) for message_id in message_ids}
+        seqs = set(seqs)
+        return [row for row in self.messages if row["seq"] in seqs or row["message_id"] in message_ids]
+
+    def _page(self, rows, limit, offset, before=None, after=None):
+        """Keyset page of ``rows`` by (ts, message_id), newest first; see MessageStore.conversation"""
+        if after is not None:
+            after = tuple(after)
+            page = heapq.nsmallest(offset + limit, (row for row in rows if row_key(row) > after), key=row_key)
+            return page[offset:][::-1]
+        if before is not None:
+            before = tuple(before)
+            rows = (row for row in rows if row_key(row) < before)
+        return heapq.nlargest(offset + limit, rows, key=row_key)[offset:]
+
+    async def conversation(self, agent_id, other_agent_id, limit=50, offset=0, before=None, after=None):
+        pair = {(agent_id, other_agent_id), (other_agent_id, agent_id)}
+        rows = (row for row in self.messages if (row["sender_id"], row["recipient_id"]) in pair)
+        return self._page(rows, limit, offset, before, after)
+
+    async def agent_messages(self, agent_id, start_time=None, end_time=None, message_type=None,
+                             limit=100, offset=0, before=None, after=None):
+        rows = (
+            row for row in self.messages
+            if (row["sender_id"] == agent_id or row["recipient_id"] in (agent_id, None))
+            and (start_time is None or row["ts"] >= start_time)
+            and (end_time is None or row["ts"] <= end_time)
+            and (message_type is None or row["message_type"] == message_type)
+        )
+        return self._page(rows, limit, offset, before, after)
+
+    async def export_messages(self, agent_id, start_time=None, end_time=None, message_type=None, peer_id=None,
+                              chunk_size=1000):
+        if peer_id is not None:
+            pair = {(agent_id, peer_id), (peer_id, agent_id)}
+            wanted = lambda row: (row["sender_id"], row["recipient_id"]) in pair
+        else:
+            wanted = lambda row: row["sender_id"] == agent_id or row["recipient_id"] in (agent_id, None)
+        rows = sorted(
+            (
+                row for row in self.messages
+                if wanted(row)
+                and (start_time is None or row["ts"] >= start_time)
+                and (end_time is None or row["ts"] <= end_time)
+                and (message_type is None or row["message_type"] == message_type)
+            ),
+            key=row_key,
+        )
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    async def search_messages(self, agent_id, query, sender_id=None, recipient_id=None, message_type=None,
+                              start_time=None, end_time=None, limit=50, cursor=None):
+        terms = set(search_terms(query))
+        postings = sorted((self.search_index.get(term, ()) for term in terms), key=len)
+        if not postings or not postings[0]:
+            return []
+        # Intersect starting from the rarest word
+        seqs = set(postings[0])
+        for other in postings[1:]:
+            seqs.intersection_update(other)
+
+        hits = []
+        for seq in seqs:
+            row, counts, length = self.search_docs[seq]
+            if not (row["sender_id"] == agent_id or row["recipient_id"] in (agent_id, None)):
+                continue
+            if ((sender_id is not None and row["sender_id"] != sender_id)
+                    or (recipient_id is not None and row["recipient_id"] != recipient_id)
+                    or (message_type is not None and row["message_type"] != message_type)
+                    or (start_time is not None and row["ts"] < start_time)
+                    or (end_time is not None and row["ts"] > end_time)):
+                continue
+            # Like ts_rank: matched word frequency, damped by message length
+            hit = dict(row, rank=sum(counts[term] for term in terms) / (1 + math.log(length)))
+            if cursor is None or search_key(hit) < tuple(cursor):
+                hits.append(hit)
+        return heapq.nlargest(limit, hits, key=search_key)
+
+    async def thread(self, correlation_id, agent_id, limit=500, after=None):
+        rows = [
+            row for row in self.threads.get(correlation_id, ())
+            if row["sender_id"] == agent_id or row["recipient_id"] in (agent_id, None)
+        ]
+        # Rows are appended in seq order, which is (ts, message_id) order only up to ties within a batch
+        rows = sorted(rows, key=row_key)
+        if after is not None:
+            rows = [row for row in rows if row_key(row) > tuple(after)]
+        return rows[:limit]
+
+    async def agent_summaries(self, agent_id):
+        rows = [dict(summary) for summary in self.summaries.get(agent_id, {}).values()]
+        rows.sort(key=lambda row: -row["last_message_time"])
+        return rows
+
+    async def mark_read(self, agent_id, peer_id):
+        summary = self.summaries.get(agent_id, {}).get(peer_id)
+        if summary is not None:
+            summary["unread_count"] = 0
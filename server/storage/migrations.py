@@ -0,0 +1,268 @@
+"""Ordered schema migrations for the agent_messages database.
+
+PostgresStore applies these on connect, in both the gRPC server and the
+REST API; each one runs once and is recorded in schema_migrations.
+"""
+
+# Arbitrary key so concurrent servers don't apply the same migration twice
+MIGRATION_LOCK_ID = 804201
+
+MIGRATIONS = [
+    (
+        "001_agent_messages",
+        """
+        CREATE TABLE IF NOT EXISTS agent_messages (
+            message_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            sender_id TEXT NOT NULL,
+            recipient_id TEXT,
+            message_type INTEGER NOT NULL,
+            payload BYTEA,
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            correlation_id TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_recipient_timestamp ON agent_messages(recipient_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_sender_timestamp ON agent_messages(sender_id, timestamp);
+        """,
+    ),
+    (
+        "002_message_seq",
+        """
+        ALTER TABLE agent_messages ADD COLUMN IF NOT EXISTS seq BIGSERIAL;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_agent_messages_seq ON agent_messages(seq);
+        """,
+    ),
+    (
+        "003_agent_cursors",
+        """
+        CREATE TABLE IF NOT EXISTS agent_cursors (
+            agent_id TEXT PRIMARY KEY,
+            acked_seq BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+        );
+        """,
+    ),
+    (
+        "004_message_topic",
+        """
+        ALTER TABLE agent_messages ADD COLUMN IF NOT EXISTS topic TEXT;
+        """,
+    ),
+    (
+        # One index per UNION ALL branch of the inbox queries in postgres.py
+        "005_inbox_indexes",
+        """
+        UPDATE agent_messages SET recipient_id = NULL WHERE recipient_id = '';
+        CREATE INDEX IF NOT EXISTS idx_recipient_seq ON agent_messages(recipient_id, seq)
+            WHERE recipient_id IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_sender_seq ON agent_messages(sender_id, seq);
+        CREATE INDEX IF NOT EXISTS idx_broadcast_seq ON agent_messages(seq)
+            WHERE recipient_id IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_broadcast_timestamp ON agent_messages(timestamp)
+            WHERE recipient_id IS NULL;
+        CREATE INDEX IF NOT EXISTS idx_sender_recipient_timestamp
+            ON agent_messages(sender_id, recipient_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_recipient_timestamp_covering
+            ON agent_messages(recipient_id, timestamp) INCLUDE (sender_id);
+        DROP INDEX IF EXISTS idx_recipient_timestamp;
+        """,
+    ),
+    (
+        # LIST by retention class, then RANGE by time (see partitions.py). Existing rows go into
+        # one "initial" partition per class ending tomorrow; PartitionManager adds the rest.
+        "006_partition_agent_messages",
+        """
+        ALTER TABLE agent_messages RENAME TO agent_messages_unpartitioned;
+        ALTER TABLE agent_messages_unpartitioned RENAME CONSTRAINT agent_messages_pkey TO agent_messages_unpartitioned_pkey;
+        ALTER SEQUENCE agent_messages_seq_seq OWNED BY NONE;
+
+        CREATE TABLE agent_messages (
+            message_id UUID NOT NULL DEFAULT gen_random_uuid(),
+            sender_id TEXT NOT NULL,
+            recipient_id TEXT,
+            message_type INTEGER NOT NULL,
+            payload BYTEA,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            correlation_id TEXT,
+            seq BIGINT NOT NULL DEFAULT nextval('agent_messages_seq_seq'),
+            topic TEXT,
+            PRIMARY KEY (message_id, message_type, timestamp)
+        ) PARTITION BY LIST (message_type);
+        ALTER SEQUENCE agent_messages_seq_seq OWNED BY agent_messages.seq;
+
+        CREATE TABLE agent_messages_events PARTITION OF agent_messages
+            FOR VALUES IN (2, 5, 6, 7) PARTITION BY RANGE (timestamp);
+        CREATE TABLE agent_messages_broadcast PARTITION OF agent_messages
+            FOR VALUES IN (1) PARTITION BY RANGE (timestamp);
+        CREATE TABLE agent_messages_direct PARTITION OF agent_messages
+            DEFAULT PARTITION BY RANGE (timestamp);
+
+        CREATE TABLE agent_message_partitions (
+            name TEXT PRIMARY KEY,
+            retention_class TEXT NOT NULL,
+            range_start TIMESTAMP WITH TIME ZONE NOT NULL,
+            range_end TIMESTAMP WITH TIME ZONE NOT NULL,
+            archived_at TIMESTAMP WITH TIME ZONE,
+            archive_path TEXT
+        );
+
+        DO $$
+        DECLARE
+            retention_class TEXT;
+            initial_end TIMESTAMP WITH TIME ZONE :=
+                (date_trunc('day', NOW() AT TIME ZONE 'UTC') + INTERVAL '1 day') AT TIME ZONE 'UTC';
+        BEGIN
+            FOREACH retention_class IN ARRAY ARRAY['events', 'broadcast', 'direct'] LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (MINVALUE) TO (%L)',
+                    'agent_messages_' || retention_class || '_initial',
+                    'agent_messages_' || retention_class,
+                    initial_end
+                );
+                INSERT INTO agent_message_partitions(name, retention_class, range_start, range_end)
+                VALUES ('agent_messages_' || retention_class || '_initial', retention_class, '-infinity', initial_end);
+            END LOOP;
+        END $$;
+
+        INSERT INTO agent_messages(message_id, sender_id, recipient_id, message_type, payload,
+                                   timestamp, correlation_id, seq, topic)
+        SELECT message_id, sender_id, recipient_id, message_type, payload,
+               COALESCE(timestamp, NOW()), correlation_id, seq, topic
+        FROM agent_messages_unpartitioned;
+        DROP TABLE agent_messages_unpartitioned;
+
+        -- seq can't be UNIQUE on a partitioned table (it would have to include the partition keys)
+        CREATE INDEX idx_agent_messages_seq ON agent_messages(seq);
+        CREATE INDEX idx_sender_timestamp ON agent_messages(sender_id, timestamp);
+        CREATE INDEX idx_recipient_seq ON agent_messages(recipient_id, seq)
+            WHERE recipient_id IS NOT NULL;
+        CREATE INDEX idx_sender_seq ON agent_messages(sender_id, seq);
+        CREATE INDEX idx_broadcast_seq ON agent_messages(seq)
+            WHERE recipient_id IS NULL;
+        CREATE INDEX idx_broadcast_timestamp ON agent_messages(timestamp)
+            WHERE recipient_id IS NULL;
+        CREATE INDEX idx_sender_recipient_timestamp
+            ON agent_messages(sender_id, recipient_id, timestamp);
+        CREATE INDEX idx_recipient_timestamp_covering
+            ON agent_messages(recipient_id, timestamp) INCLUDE (sender_id);
+        """,
+    ),
+    (
+        # message_id breaks timestamp ties (a batch shares one NOW()), so keyset cursors
+        # on (timestamp, message_id) seek straight into these indexes
+        "007_keyset_indexes",
+        """
+        CREATE INDEX idx_recipient_timestamp_id
+            ON agent_messages(recipient_id, timestamp, message_id) INCLUDE (sender_id);
+        CREATE INDEX idx_sender_timestamp_id ON agent_messages(sender_id, timestamp, message_id);
+        CREATE INDEX idx_broadcast_timestamp_id ON agent_messages(timestamp, message_id)
+            WHERE recipient_id IS NULL;
+        CREATE INDEX idx_sender_recipient_timestamp_id
+            ON agent_messages(sender_id, recipient_id, timestamp, message_id);
+        DROP INDEX idx_recipient_timestamp_covering;
+        DROP INDEX idx_sender_timestamp;
+        DROP INDEX idx_broadcast_timestamp;
+        DROP INDEX idx_sender_recipient_timestamp;
+        """,
+    ),
+    (
+        # One row per side of each direct conversation, kept current by PostgresStore.save_messages.
+        # Backfilled previews use escape encoding since payloads need not be valid UTF-8.
+        "008_conversation_summaries",
+        """
+        CREATE TABLE conversation_summaries (
+            agent_id TEXT NOT NULL,
+            peer_id TEXT NOT NULL,
+            last_message_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            last_message_preview TEXT,
+            message_count BIGINT NOT NULL DEFAULT 0,
+            unread_count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (agent_id, peer_id)
+        );
+        CREATE INDEX idx_conversation_summaries_recent ON conversation_summaries(agent_id, last_message_at DESC);
+
+        INSERT INTO conversation_summaries(agent_id, peer_id, last_message_at, last_message_preview, message_count)
+        SELECT agent_id, peer_id, MAX(timestamp),
+               (array_agg(encode(substring(payload FROM 1 FOR 120), 'escape') ORDER BY seq DESC))[1],
+               COUNT(*)
+        FROM (
+            SELECT sender_id AS agent_id, recipient_id AS peer_id, timestamp, seq, payload
+            FROM agent_messages WHERE recipient_id IS NOT NULL AND sender_id <> recipient_id
+            UNION ALL
+            SELECT recipient_id, sender_id, timestamp, seq, payload
+            FROM agent_messages WHERE recipient_id IS NOT NULL AND sender_id <> recipient_id
+        ) sides
+        GROUP BY agent_id, peer_id;
+        """,
+    ),
+    (
+        # Maintained by Postgres on every INSERT and COPY, over the first 64 KiB of the payload.
+        # A plain SQL function: a plpgsql EXCEPTION block would cost a subtransaction per row.
+        # UTF-8 validity is checked with a regex over the bytes read as LATIN1 (one character
+        # per byte); the longest valid prefix is indexed, so a character cut off by the
+        # truncation is dropped. Anything else that isn't valid UTF-8, or contains NUL, is
+        # indexed in escape encoding rather than rejected.
+        "009_message_search",
+        r"""
+        CREATE FUNCTION message_search_vector(payload BYTEA) RETURNS tsvector
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT to_tsvector('simple', CASE
+                WHEN length(valid) >= length(head) - 3 THEN convert_from(convert_to(valid, 'LATIN1'), 'UTF8')
+                ELSE encode(head, 'escape')
+            END)
+            FROM (SELECT substring(payload FROM 1 FOR 65536) AS head) h,
+            LATERAL (SELECT CASE WHEN position('\x00'::bytea IN head) = 0
+                                 THEN convert_from(head, 'LATIN1') END AS latin) l,
+            LATERAL (SELECT substring(latin FROM '^(?:[\x01-\x7F]|[\xC2-\xDF][\x80-\xBF]'
+                '|\xE0[\xA0-\xBF][\x80-\xBF]|[\xE1-\xEC\xEE\xEF][\x80-\xBF]{2}|\xED[\x80-\x9F][\x80-\xBF]'
+                '|\xF0[\x90-\xBF][\x80-\xBF]{2}|[\xF1-\xF3][\x80-\xBF]{3}|\xF4[\x80-\x8F][\x80-\xBF]{2})*'
+            ) AS valid) v
+        $$;
+        ALTER TABLE agent_messages ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (message_search_vector(payload)) STORED;
+        CREATE INDEX idx_agent_messages_search ON agent_messages USING GIN (search_vector);
+        """,
+    ),
+    (
+        # Thread lookups read the chain and check participation from this index alone
+        "010_correlation_index",
+        """
+        CREATE INDEX idx_correlation_timestamp_id
+            ON agent_messages(correlation_id, timestamp, message_id) INCLUDE (sender_id, recipient_id)
+            WHERE correlation_id IS NOT NULL;
+        """,
+    ),
+    (
+        # Seqs delivered just below acked_seq; batches can commit out of seq order, so resuming
+        # re-reads that window and skips only these. NULL for cursors saved before this migration.
+        "011_cursor_recent_seqs",
+        """
+        ALTER TABLE agent_cursors ADD COLUMN recent_seqs BIGINT[];
+        """,
+    ),
+]
+
+
+async def apply_migrations(db_pool):
+    """Apply any migrations that have not run yet, in order"""
+    async with db_pool.acquire() as conn:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            await conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name TEXT PRIMARY KEY,
+                    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+                )
+                """
+            )
+            applied = {row["name"] for row in await conn.fetch("SELECT name FROM schema_migrations")}
+
+            for name, sql in MIGRATIONS:
+                if name in applied:
+                    continue
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute("INSERT INTO schema_migrations(name) VALUES($1)", name)
+                print(f"🗄️  Applied migration {name}")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
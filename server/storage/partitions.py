@@ -0,0 +1,155 @@
+"""Time partitions, retention and archival for agent_messages.
+
+Migration 006 splits agent_messages by LIST on message_type into the
+retention classes below, and each class by RANGE on timestamp. The
+PartitionManager keeps ``premake`` partitions ahead of the current time in
+every class. It also archives partitions older than their class's retention:
+each one is written to a gzipped CSV in ``archive_dir`` and then dropped
+whole, so rows are never deleted one by one.
+"""
+
+import asyncio
+import datetime
+import gzip
+import os
+
+# name -> message types; "direct" is the DEFAULT partition, so it also takes any
+# type not listed. Must match the partitions created by migration 006.
+RETENTION_CLASSES = {
+    "events": (2, 5, 6, 7),    # EVENT, HEARTBEAT, SUBSCRIBE, UNSUBSCRIBE
+    "broadcast": (1,),
+    "direct": (0, 3, 4),       # DIRECT, REQUEST, RESPONSE
+}
+DEFAULT_RETENTION_DAYS = {"events": 3, "broadcast": 30, "direct": 90}
+
+INTERVALS = ("day", "week")
+
+# Arbitrary key so only one process at a time creates or archives partitions
+PARTITION_LOCK_ID = 804202
+
+
+def parse_retention(text):
+    """'events=3,direct=180' -> {"events": 3, "direct": 180}, on top of the defaults"""
+    retention = dict(DEFAULT_RETENTION_DAYS)
+    for part in filter(None, (part.strip() for part in (text or "").split(","))):
+        name, _, days = part.partition("=")
+        if name not in RETENTION_CLASSES:
+            raise ValueError(f"Unknown retention class {name!r} (expected one of {', '.join(RETENTION_CLASSES)})")
+        retention[name] = float(days)
+    return retention
+
+
+def next_boundary(moment, interval):
+    """Start of the day/week (Monday, UTC) after ``moment``"""
+    start = moment.astimezone(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return start + datetime.timedelta(days=7 - start.weekday())
+    return start + datetime.timedelta(days=1)
+
+
+class PartitionManager:
+    """Creates upcoming partitions and archives expired ones; see the module docstring"""
+
+    def __init__(self, interval="day", premake=3, retention=None, archive_dir="archive", check_interval=3600):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown partition interval {interval!r} (expected day or week)")
+        self.interval = interval
+        self.premake = premake
+        self.retention = retention or dict(DEFAULT_RETENTION_DAYS)
+        self.archive_dir = archive_dir
+        self.check_interval = check_interval
+        self._task = None
+
+    def start(self, pool):
+        self._task = asyncio.create_task(self._run(pool))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, pool):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.maintain(pool)
+            except Exception as e:
+                print(f"⚠️  Partition maintenance failed: {e}")
+
+    async def maintain(self, pool):
+        """One pass: create upcoming partitions, then archive expired ones. Skipped if another process holds the lock."""
+        async with pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", PARTITION_LOCK_ID):
+                return
+            try:
+                now = datetime.datetime.now(datetime.timezone.utc)
+                for retention_class in RETENTION_CLASSES:
+                    await self._create_upcoming(conn, retention_class, now)
+                    await self._archive_expired(conn, retention_class, now)
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", PARTITION_LOCK_ID)
+
+    async def _create_upcoming(self, conn, retention_class, now):
+        start = await conn.fetchval(
+            "SELECT MAX(range_end) FROM agent_message_partitions WHERE retention_class = $1", retention_class
+        ) or now
+        horizon = now
+        for _ in range(self.premake):
+            horizon = next_boundary(horizon, self.interval)
+        # Each new partition starts where the last one ends, so changing the interval never leaves gaps
+        while start < horizon:
+            end = next_boundary(start, self.interval)
+            name = f"agent_messages_{retention_class}_{start:%Y%m%d}"
+            async with conn.transaction():
+                await conn.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "agent_messages_{retention_class}" '
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+                await conn.execute(
+                    """
+                    INSERT INTO agent_message_partitions(name, retention_class, range_start, range_end)
+                    VALUES($1, $2, $3, $4)
+                    """,
+                    name, retention_class, start, end
+                )
+            print(f"🗂️  Created partition {name}")
+            start = end
+
+    async def _archive_expired(self, conn, retention_class, now):
+        cutoff = now - datetime.timedelta(days=self.retention[retention_class])
+        expired = await conn.fetch(
+            """
+            SELECT name FROM agent_message_partitions
+            WHERE retention_class = $1 AND archived_at IS NULL AND range_end <= $2
+            ORDER BY range_end
+            """,
+            retention_class, cutoff
+        )
+        for row in expired:
+            name = row["name"]
+            path = await self._archive(conn, name)
+            async with conn.transaction():
+                await conn.execute(f'DROP TABLE "{name}"')
+                await conn.execute(
+                    "UPDATE agent_message_partitions SET archived_at = NOW(), archive_path = $2 WHERE name = $1",
+                    name, path
+                )
+            print(f"📦 Archived partition {name} to {path}")
+
+    async def _archive(self, conn, name):
+        """COPY a partition into archive_dir/<name>.csv.gz and return the path"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{name}.csv.gz")
+        partial = path + ".partial"
+        archive = await asyncio.to_thread(gzip.open, partial, "wb")
+        try:
+            async def write(chunk):
+                await asyncio.to_thread(archive.write, chunk)
+
+            await conn.copy_from_table(name, output=write, format="csv", header=True)
+        finally:
+            await asyncio.to_thread(archive.close)
+        # Only a complete archive gets the final name, so a crash mid-copy never drops unarchived rows
+        os.replace(partial, path)
+        return path
@@ -0,0 +1,423 @@
+import uuid
+
+import asyncpg
+
+from .base import MessageStore, summary_updates
+from .change_feed import ChangeFeed, NOTIFY_CHANNEL, encode_seq_payloads
+from .migrations import apply_migrations
+from .partitions import PartitionManager
+
+COLUMNS = """message_id, sender_id, recipient_id, message_type, payload,
+           EXTRACT(EPOCH FROM timestamp)::float8 AS ts, correlation_id, seq, topic"""
+# The same columns with the timestamp left raw, for subqueries that are sorted on it outside
+RAW_COLUMNS = "message_id, sender_id, recipient_id, message_type, payload, timestamp, correlation_id, seq, topic"
+
+# One round trip per batch; RETURNING gives back the seq assigned to each row
+INSERT_BATCH_QUERY = """
+    INSERT INTO agent_messages(message_id, sender_id, recipient_id, message_type, payload, timestamp, correlation_id, topic)
+    SELECT m.message_id, m.sender_id, m.recipient_id, m.message_type, m.payload, NOW(), m.correlation_id, m.topic
+    FROM unnest($1::uuid[], $2::text[], $3::text[], $4::int[], $5::bytea[], $6::text[], $7::text[])
+        WITH ORDINALITY AS m(message_id, sender_id, recipient_id, message_type, payload, correlation_id, topic, ord)
+    ORDER BY m.ord
+    RETURNING message_id, seq, EXTRACT(EPOCH FROM timestamp)::float8 AS ts
+"""
+
+RESERVE_SEQS_QUERY = """
+    SELECT nextval('agent_messages_seq_seq') AS seq, NOW() AS now
+    FROM generate_series(1, $1)
+    ORDER BY seq
+"""
+
+# SQLSTATE classes caused by the rows being written: data exception, integrity violation, program limit exceeded
+DATA_ERROR_CLASSES = ("22", "23", "54")
+
+COPY_COLUMNS = [
+    "message_id", "sender_id", "recipient_id", "message_type", "payload",
+    "timestamp", "correlation_id", "seq", "topic",
+]
+
+# Applied in the insert's transaction; rows from summary_updates() are already sorted by pair
+UPSERT_SUMMARIES_QUERY = """
+    INSERT INTO conversation_summaries(agent_id, peer_id, last_message_at, last_message_preview,
+                                       message_count, unread_count)
+    SELECT u.agent_id, u.peer_id, NOW(), u.preview, u.message_count, u.unread_count
+    FROM unnest($1::text[], $2::text[], $3::text[], $4::bigint[], $5::bigint[])
+        WITH ORDINALITY AS u(agent_id, peer_id, preview, message_count, unread_count, ord)
+    ORDER BY u.ord
+    ON CONFLICT (agent_id, peer_id) DO UPDATE
+    SET last_message_at = GREATEST(conversation_summaries.last_message_at, EXCLUDED.last_message_at),
+        last_message_preview = CASE
+            WHEN EXCLUDED.last_message_at >= conversation_summaries.last_message_at
+            THEN EXCLUDED.last_message_preview
+            ELSE conversation_summaries.last_message_preview
+        END,
+        message_count = conversation_summaries.message_count + EXCLUDED.message_count,
+        unread_count = conversation_summaries.unread_count + EXCLUDED.unread_count
+"""
+
+# An OR across sender_id/recipient_id can't use either index, so inbox
+# queries are split into one UNION ALL branch per index (see migration
+# 005_inbox_indexes). The branches are disjoint, so no row comes back twice.
+INBOX_BRANCHES = [
+    "recipient_id = $1 AND sender_id <> $1",
+    "recipient_id IS NULL AND sender_id <> $1",
+]
+INBOX_WITH_SENT_BRANCHES = [
+    "recipient_id = $1",
+    "recipient_id IS NULL",
+    "sender_id = $1 AND recipient_id <> $1",
+]
+
+
+def union_all(branches, condition="", order_by=None, limit=None, columns=COLUMNS):
+    """One SELECT per branch sharing ``condition``.
+
+    Without a limit the branches flatten into a single append the planner can
+    merge in index order; with one, each branch stops after its own top rows.
+    """
+    top = f" ORDER BY {order_by} LIMIT {limit}" if limit else ""
+    parts = [f"(SELECT {columns} FROM agent_messages WHERE {branch} {condition}{top})" for branch in branches]
+    return "\n    UNION ALL\n    ".join(parts)
+
+
+def inbox_query(agent_id, after_seq, include_sent=False):
+    """Messages for an agent after a seq, oldest first; ``include_sent`` adds its own messages"""
+    branches = INBOX_WITH_SENT_BRANCHES if include_sent else INBOX_BRANCHES
+    query = f"""
+    SELECT * FROM (
+    {union_all(branches, "AND seq > $2")}
+    ) inbox ORDER BY seq
+    """
+    return query, agent_id, after_seq
+
+
+def keyset(params, before=None, after=None):
+    """Condition and (branch, outer) ORDER BY for a (timestamp, message_id) cursor page.
+
+    ``after`` pages run oldest first so each branch can stop early; the caller
+    reverses them back to newest first.
+    """
+    cursor, op = (after, ">") if after is not None else (before, "<")
+    condition = ""
+    if cursor is not None:
+        params.extend(cursor)
+        condition = f" AND (timestamp, message_id) {op} (to_timestamp(${len(params) - 1}), ${len(params)}::uuid)"
+    direction = "ASC" if after is not None else "DESC"
+    return condition, f"timestamp {direction}, message_id {direction}", f"ts {direction}, message_id {direction}"
+
+
+def message_filters(params, start_time=None, end_time=None, message_type=None):
+    """Time range and type conditions shared by the history queries; appends to ``params``"""
+    condition = ""
+    if start_time is not None:
+        params.append(start_time)
+        condition += f" AND timestamp >= to_timestamp(${len(params)})"
+    if end_time is not None:
+        params.append(end_time)
+        condition += f" AND timestamp <= to_timestamp(${len(params)})"
+    if message_type is not None:
+        params.append(message_type)
+        condition += f" AND message_type = ${len(params)}"
+    return condition
+
+
+def agent_messages_query(agent_id, start_time=None, end_time=None, message_type=None, limit=100, offset=0,
+                         before=None, after=None):
+    """Messages sent by, to or broadcast to an agent, newest first (oldest first with ``after``)"""
+    params = [agent_id]
+    condition = message_filters(params, start_time, end_time, message_type)
+    cursor_condition, branch_order, order = keyset(params, before, after)
+    # Each branch only needs its first limit + offset rows for the merged page
+    params.extend([limit + offset, limit, offset])
+    window, limit_param, offset_param = len(params) - 2, len(params) - 1, len(params)
+    query = f"""
+    SELECT * FROM (
+    {union_all(INBOX_WITH_SENT_BRANCHES, condition + cursor_condition, branch_order, f"${window}")}
+    ) inbox ORDER BY {order} LIMIT ${limit_param} OFFSET ${offset_param}
+    """
+    return (query, *params)
+
+
+def conversation_query(agent_id, other_agent_id, limit=50, offset=0, before=None, after=None):
+    """Direct messages between two agents, newest first (oldest first with ``after``)"""
+    branches = [
+        "sender_id = $1 AND recipient_id = $2",
+        "sender_id = $2 AND recipient_id = $1 AND sender_id <> recipient_id",
+    ]
+    params = [agent_id, other_agent_id]
+    cursor_condition, branch_order, order = keyset(params, before, after)
+    params.extend([limit + offset, limit, offset])
+    window, limit_param, offset_param = len(params) - 2, len(params) - 1, len(params)
+    query = f"""
+    SELECT * FROM (
+    {union_all(branches, cursor_condition, branch_order, f"${window}")}
+    ) conversation ORDER BY {order} LIMIT ${limit_param} OFFSET ${offset_param}
+    """
+    return (query, *params)
+
+
+def export_query(agent_id, start_time=None, end_time=None, message_type=None, peer_id=None):
+    """An agent's whole history (or its conversation with peer_id), oldest first, for a server-side cursor"""
+    params = [agent_id]
+    if peer_id is not None:
+        params.append(peer_id)
+        branches = [
+            "sender_id = $1 AND recipient_id = $2",
+            "sender_id = $2 AND recipient_id = $1 AND sender_id <> recipient_id",
+        ]
+    else:
+        branches = INBOX_WITH_SENT_BRANCHES
+    condition = message_filters(params, start_time, end_time, message_type)
+    # Sorting on the raw column lets the planner Merge Append the branches' (..., timestamp, message_id)
+    # index scans; ORDER BY the computed ts would need a full sort. The epoch is only computed for output.
+    query = f"""
+    SELECT {COLUMNS} FROM (
+    {union_all(branches, condition, columns=RAW_COLUMNS)}
+    ) export ORDER BY timestamp, message_id
+    """
+    return (query, *params)
+
+
+def search_query(agent_id, text, sender_id=None, recipient_id=None, message_type=None, start_time=None,
+                 end_time=None, limit=50, cursor=None):
+    """Ranked full-text matches visible to an agent; the GIN index on search_vector drives the scan"""
+    params = [agent_id, text]
+    condition = message_filters(params, start_time, end_time, message_type)
+    if sender_id is not None:
+        params.append(sender_id)
+        condition += f" AND sender_id = ${len(params)}"
+    if recipient_id is not None:
+        params.append(recipient_id)
+        condition += f" AND recipient_id = ${len(params)}"
+    cursor_condition = ""
+    if cursor is not None:
+        # Compared with the same expressions the cursor was read from, so the floats match exactly
+        params.extend(cursor)
+        n = len(params)
+        cursor_condition = f"WHERE (rank, ts, message_id) < (${n - 2}::real, ${n - 1}, ${n}::uuid)"
+    params.append(limit)
+    query = f"""
+    SELECT * FROM (
+        SELECT {COLUMNS}, ts_rank(search_vector, search) AS rank
+        FROM agent_messages, websearch_to_tsquery('simple', $2) search
+        WHERE search_vector @@ search
+          AND (sender_id = $1 OR recipient_id = $1 OR recipient_id IS NULL) {condition}
+    ) hits {cursor_condition}
+    ORDER BY rank DESC, ts DESC, message_id DESC
+    LIMIT ${len(params)}
+    """
+    return (query, *params)
+
+
+def thread_query(correlation_id, agent_id, limit=500, after=None):
+    """The messages of a correlation thread the agent can see, oldest first.
+
+    The visibility check reads sender_id/recipient_id from the correlation index, so it adds no heap lookups.
+    """
+    params = [correlation_id, agent_id]
+    cursor_condition, branch_order, _ = keyset(params, after=after)
+    params.append(limit)
+    query = f"""
+    SELECT {COLUMNS} FROM agent_messages
+    WHERE correlation_id = $1 {cursor_condition}
+      AND (sender_id = $2 OR recipient_id = $2 OR recipient_id IS NULL)
+    ORDER BY {branch_order}
+    LIMIT ${len(params)}
+    """
+    return (query, *params)
+
+
+def agent_summaries_query(agent_id):
+    """Conversation partners, most recent first; an index read of the agent's conversation_summaries rows"""
+    query = """
+    SELECT peer_id AS agent_id, EXTRACT(EPOCH FROM last_message_at)::float8 AS last_message_time,
+           last_message_preview, message_count, unread_count
+    FROM conversation_summaries
+    WHERE agent_id = $1
+    ORDER BY last_message_at DESC
+    """
+    return query, agent_id
+
+
+class PostgresStore(MessageStore):
+    """asyncpg-backed store; applies the migrations in migrations.py on connect.
+
+    With ``announce`` set, every saved batch is also NOTIFYed as seq ranges
+    tagged with ``origin`` in the same transaction, so other processes' change
+    feeds can deliver it. ``partitions`` maintains the time partitions
+    (see partitions.py); every process runs it, guarded by an advisory lock.
+    """
+
+    def __init__(self, announce=False, origin=None, partitions=None, **pool_options):
+        self.announce = announce
+        self.origin = origin
+        self.partitions = partitions or PartitionManager()
+        self.pool_options = pool_options
+        self.pool = None
+
+    async def connect(self):
+        self.pool = await asyncpg.create_pool(**self.pool_options)
+        await apply_migrations(self.pool)
+        # Make sure the current partitions exist before the first insert
+        await self.partitions.maintain(self.pool)
+        self.partitions.start(self.pool)
+
+    async def close(self):
+        await self.partitions.stop()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def change_feed(self, on_rows):
+        return ChangeFeed(self, on_rows, origin=self.origin)
+
+    async def save_messages(self, msgs):
+        message_ids = [uuid.uuid4() for _ in msgs]
+        async with self.pool.acquire() as conn, conn.transaction():
+            rows = await conn.fetch(
+                INSERT_BATCH_QUERY,
+                message_ids,
+                [msg.sender_id for msg in msgs],
+                [msg.recipient_id or None for msg in msgs],
+                [msg.message_type for msg in msgs],
+                [msg.payload for msg in msgs],
+                [msg.correlation_id or None for msg in msgs],
+                [msg.topic or None for msg in msgs],
+            )
+            await self._after_insert(conn, msgs, [row["seq"] for row in rows])
+
+        by_id = {row["message_id"]: row for row in rows}
+        saved = []
+        for message_id, msg in zip(message_ids, msgs):
+            row = by_id[message_id]
+            msg.seq = row["seq"]
+            saved.append({"message_id": str(message_id), "seq": row["seq"], "ts": row["ts"]})
+        return saved
+
+    async def save_messages_bulk(self, msgs):
+        """Like save_messages, but streams the rows with COPY.
+
+        COPY can't return generated values, so the seqs and the shared timestamp
+        are reserved first in one query and written explicitly.
+        """
+        message_ids = [uuid.uuid4() for _ in msgs]
+        async with self.pool.acquire() as conn, conn.transaction():
+            reserved = await conn.fetch(RESERVE_SEQS_QUERY, len(msgs))
+            seqs = [row["seq"] for row in reserved]
+            now = reserved[0]["now"]
+            await conn.copy_records_to_table(
+                "agent_messages",
+                columns=COPY_COLUMNS,
+                records=[
+                    (message_id, msg.sender_id, msg.recipient_id or None, msg.message_type, msg.payload,
+                     now, msg.correlation_id or None, seq, msg.topic or None)
+                    for message_id, seq, msg in zip(message_ids, seqs, msgs)
+                ],
+            )
+            await self._after_insert(conn, msgs, seqs)
+
+        ts = now.timestamp()
+        saved = []
+        for message_id, seq, msg in zip(message_ids, seqs, msgs):
+            msg.seq = seq
+            saved.append({"message_id": str(message_id), "seq": seq, "ts": ts})
+        return saved
+
+    async def _after_insert(self, conn, msgs, seqs):
+        """Update conversation summaries and announce the batch, inside the insert's transaction"""
+        summaries = summary_updates(msgs)
+        if summaries:
+            await conn.execute(UPSERT_SUMMARIES_QUERY, *(list(column) for column in zip(*summaries)))
+        if self.announce:
+            # Delivered by Postgres only if the insert commits
+            for payload in encode_seq_payloads(self.origin, seqs):
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, payload)
+
+    def is_data_error(self, error):
+        if isinstance(error, asyncpg.PostgresError):
+            return (error.sqlstate or "")[:2] in DATA_ERROR_CLASSES
+        # asyncpg raises a ValueError subclass itself when a value can't be encoded
+        return isinstance(error, ValueError)
+
+    async def get_cursor(self, agent_id):
+        row = await self.pool.fetchrow("SELECT acked_seq, recent_seqs FROM agent_cursors WHERE agent_id = $1", agent_id)
+        return (row["acked_seq"], row["recent_seqs"]) if row is not None else None
+
+    async def save_cursors(self, cursors):
+        await self.pool.executemany(
+            """
+            INSERT INTO agent_cursors(agent_id, acked_seq, recent_seqs, updated_at)
+            VALUES($1, $2, $3, NOW())
+            ON CONFLICT (agent_id) DO UPDATE
+            SET acked_seq = GREATEST(agent_cursors.acked_seq, EXCLUDED.acked_seq),
+                recent_seqs = CASE
+                    WHEN EXCLUDED.acked_seq >= agent_cursors.acked_seq THEN EXCLUDED.recent_seqs
+                    ELSE agent_cursors.recent_seqs
+                END,
+                updated_at = NOW()
+            """,
+            [(agent_id, seq, list(recent)) for agent_id, (seq, recent) in cursors.items()]
+        )
+
+    async def max_seq(self):
+        return await self.pool.fetchval("SELECT COALESCE(MAX(seq), 0) FROM agent_messages")
+
+    async def messages_after(self, agent_id, after_seq, include_sent=False):
+        return await self.pool.fetch(*inbox_query(agent_id, after_seq, include_sent))
+
+    async def messages_since(self, after_seq, limit=1000):
+        return await self.pool.fetch(
+            f"SELECT {COLUMNS} FROM agent_messages WHERE seq > $1 ORDER BY seq LIMIT $2",
+            after_seq, limit
+        )
+
+    async def fetch_messages(self, message_ids=(), seqs=()):
+        return await self.pool.fetch(
+            f"""
+            SELECT {COLUMNS}
+            FROM agent_messages
+            WHERE message_id = ANY($1::uuid[]) OR seq = ANY($2::bigint[])
+            ORDER BY seq ASC
+            """,
+            list(message_ids),
+            list(seqs)
+        )
+
+    async def conversation(self, agent_id, other_agent_id, limit=50, offset=0, before=None, after=None):
+        rows = await self.pool.fetch(*conversation_query(agent_id, other_agent_id, limit, offset, before, after))
+        return rows[::-1] if after is not None else rows
+
+    async def agent_messages(self, agent_id, start_time=None, end_time=None, message_type=None,
+                             limit=100, offset=0, before=None, after=None):
+        rows = await self.pool.fetch(
+            *agent_messages_query(agent_id, start_time, end_time, message_type, limit, offset, before, after)
+        )
+        return rows[::-1] if after is not None else rows
+
+    async def export_messages(self, agent_id, start_time=None, end_time=None, message_type=None, peer_id=None,
+                              chunk_size=1000):
+        async with self.pool.acquire() as conn, conn.transaction():
+            cursor = await conn.cursor(*export_query(agent_id, start_time, end_time, message_type, peer_id))
+            while True:
+                rows = await cursor.fetch(chunk_size)
+                if not rows:
+                    return
+                yield rows
+
+    async def search_messages(self, agent_id, query, sender_id=None, recipient_id=None, message_type=None,
+                              start_time=None, end_time=None, limit=50, cursor=None):
+        return await self.pool.fetch(*search_query(
+            agent_id, query, sender_id, recipient_id, message_type, start_time, end_time, limit, cursor
+        ))
+
+    async def thread(self, correlation_id, agent_id, limit=500, after=None):
+        return await self.pool.fetch(*thread_query(correlation_id, agent_id, limit, after))
+
+    async def agent_summaries(self, agent_id):
+        return await self.pool.fetch(*agent_summaries_query(agent_id))
+
+    async def mark_read(self, agent_id, peer_id):
+        await self.pool.execute(
+            "UPDATE conversation_summaries SET unread_count = 0 WHERE agent_id = $1 AND peer_id = $2",
+            agent_id, peer_id
+        )
@@ -0,0 +1,336 @@
+import asyncio
+import concurrent.futures
+import sqlite3
+import time
+import uuid
+
+from .base import MessageStore, search_terms, summary_updates
+
+DEFAULT_PATH = "agent_comm.db"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS agent_messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id TEXT NOT NULL UNIQUE,
+        sender_id TEXT NOT NULL,
+        recipient_id TEXT,
+        message_type INTEGER NOT NULL,
+        payload BLOB,
+        timestamp REAL NOT NULL,
+        correlation_id TEXT,
+        topic TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_recipient_timestamp_id ON agent_messages(recipient_id, timestamp, message_id);
+    CREATE INDEX IF NOT EXISTS idx_sender_timestamp_id ON agent_messages(sender_id, timestamp, message_id);
+    CREATE INDEX IF NOT EXISTS idx_correlation_timestamp_id ON agent_messages(correlation_id, timestamp, message_id)
+        WHERE correlation_id IS NOT NULL;
+    DROP INDEX IF EXISTS idx_recipient_timestamp;
+    DROP INDEX IF EXISTS idx_sender_timestamp;
+    CREATE TABLE IF NOT EXISTS conversation_summaries (
+        agent_id TEXT NOT NULL,
+        peer_id TEXT NOT NULL,
+        last_message_at REAL NOT NULL,
+        last_message_preview TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        unread_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (agent_id, peer_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversation_summaries_recent
+        ON conversation_summaries(agent_id, last_message_at DESC);
+    CREATE TABLE IF NOT EXISTS agent_cursors (
+        agent_id TEXT PRIMARY KEY,
+        acked_seq INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    );
+"""
+
+# Seqs delivered just below acked_seq, comma-separated (see migration 011 for Postgres)
+CURSOR_RECENT_SCHEMA = "ALTER TABLE agent_cursors ADD COLUMN recent_seqs TEXT"
+
+# Contentless full-text index of payloads, keyed by seq; kept current by _insert
+SEARCH_SCHEMA = """
+    CREATE VIRTUAL TABLE agent_messages_fts USING fts5(body, content='');
+    INSERT INTO agent_messages_fts(rowid, body) SELECT seq, CAST(payload AS TEXT) FROM agent_messages;
+"""
+
+COLUMNS = "message_id, sender_id, recipient_id, message_type, payload, timestamp AS ts, correlation_id, seq, topic"
+
+
+class SQLiteStore(MessageStore):
+    """Single-file backend for local runs and tests without a Postgres server.
+
+    sqlite3 is blocking, so every call runs on one dedicated thread.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.conn = None
+        self._executor = None
+
+    async def connect(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        await self._run(self._open)
+
+    async def close(self):
+        if self.conn is not None:
+            await self._run(self.conn.close)
+            self.conn = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'agent_messages_fts'").fetchone():
+            self.conn.executescript(SEARCH_SCHEMA)
+        if not any(row["name"] == "recent_seqs" for row in self.conn.execute("PRAGMA table_info(agent_cursors)")):
+            self.conn.execute(CURSOR_RECENT_SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _fetch(self, query, *params):
+        return await self._run(lambda: [dict(row) for row in self.conn.execute(query, params)])
+
+    async def save_messages(self, msgs):
+        return await self._run(self._insert, msgs)
+
+    def _insert(self, msgs):
+        now = time.time()
+        saved = []
+        self.conn.execute("BEGIN")
+        try:
+            for msg in msgs:
+                message_id = str(uuid.uuid4())
+                seq = self.conn.execute(
+                    """
+                    INSERT INTO agent_messages(message_id, sender_id, recipient_id, message_type, payload,
+                                               timestamp, correlation_id, topic)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+                    RETURNING seq
+                    """,
+                    (message_id, msg.sender_id, msg.recipient_id or None, msg.message_type, msg.payload,
+                     now, msg.correlation_id or None, msg.topic or None),
+                ).fetchone()[0]
+                saved.append({"message_id": message_id, "seq": seq, "ts": now})
+            self.conn.executemany(
+                "INSERT INTO agent_messages_fts(rowid, body) VALUES(?, ?)",
+                [(row["seq"], bytes(msg.payload).decode(errors="replace")) for msg, row in zip(msgs, saved)],
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO conversation_summaries(agent_id, peer_id, last_message_at, last_message_preview,
+                                                   message_count, unread_count)
+                VALUES(?, ?, ?, ?, ?, ?)
+                ON CONFLICT(agent_id, peer_id) DO UPDATE
+                SET last_message_at = excluded.last_message_at,
+                    last_message_preview = excluded.last_message_preview,
+                    message_count = message_count + excluded.message_count,
+                    unread_count = unread_count + excluded.unread_count
+                """,
+                [(agent_id, peer_id, now, preview, count, unread)
+                 for agent_id, peer_id, preview, count, unread in summary_updates(msgs)],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        for msg, row in zip(msgs, saved):
+            msg.seq = row["seq"]
+        return saved
+
+    def is_data_error(self, error):
+        return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError, sqlite3.InterfaceError, ValueError))
+
+    async def get_cursor(self, agent_id):
+        rows = await self._fetch("SELECT acked_seq, recent_seqs FROM agent_cursors WHERE agent_id = ?", agent_id)
+        if not rows:
+            return None
+        recent = rows[0]["recent_seqs"]
+        return rows[0]["acked_seq"], [int(seq) for seq in recent.split(",") if seq] if recent is not None else None
+
+    async def save_cursors(self, cursors):
+        now = time.time()
+        await self._run(lambda: self.conn.executemany(
+            """
+            INSERT INTO agent_cursors(agent_id, acked_seq, recent_seqs, updated_at) VALUES(?, ?, ?, ?)
+            ON CONFLICT(agent_id) DO UPDATE
+            SET recent_seqs = CASE WHEN excluded.acked_seq >= acked_seq THEN excluded.recent_seqs ELSE recent_seqs END,
+                acked_seq = MAX(acked_seq, excluded.acked_seq),
+                updated_at = excluded.updated_at
+            """,
+            [(agent_id, seq, ",".join(map(str, recent)), now) for agent_id, (seq, recent) in cursors.items()],
+        ))
+
+    async def max_seq(self):
+        rows = await self._fetch("SELECT COALESCE(MAX(seq), 0) AS seq FROM agent_messages")
+        return rows[0]["seq"]
+
+    async def messages_after(self, agent_id, after_seq, include_sent=False):
+        if include_sent:
+            condition = "(sender_id = ? OR recipient_id = ? OR recipient_id IS NULL)"
+        else:
+            condition = "(recipient_id = ? OR recipient_id IS NULL) AND sender_id != ?"
+        return await self._fetch(
+            f"SELECT {COLUMNS} FROM agent_messages WHERE {condition} AND seq > ? ORDER BY seq ASC",
+            agent_id, agent_id, after_seq,
+        )
+
+    async def messages_since(self, after_seq, limit=1000):
+        return await self._fetch(
+            f"SELECT {COLUMNS} FROM agent_messages WHERE seq > ? ORDER BY seq LIMIT ?", after_seq, limit
+        )
+
+    async def fetch_messages(self, message_ids=(), seqs=()):
+        message_ids = [str(message_id) for message_id in message_ids]
+        seqs = list(seqs)
+        return await self._fetch(
+            f"""
+            SELECT {COLUMNS} FROM agent_messages
+            WHERE message_id IN ({",".join("?" * len(message_ids)) or "NULL"})
+               OR seq IN ({",".join("?" * len(seqs)) or "NULL"})
+            ORDER BY seq ASC
+            """,
+            *message_ids, *seqs,
+        )
+
+    def _keyset(self, query, params, limit, offset, before, after):
+        """Add a (timestamp, message_id) cursor and ordering; ``after`` pages are fetched oldest first"""
+        cursor, op, direction = (after, ">", "ASC") if after is not None else (before, "<", "DESC")
+        if cursor is not None:
+            query += f" AND (timestamp, message_id) {op} (?, ?)"
+            params.extend(cursor)
+        query += f" ORDER BY timestamp {direction}, message_id {direction} LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        return query, params
+
+    async def _page(self, query, params, limit, offset, before, after):
+        query, params = self._keyset(query, params, limit, offset, before, after)
+        rows = await self._fetch(query, *params)
+        return rows[::-1] if after is not None else rows
+
+    async def conversation(self, agent_id, other_agent_id, limit=50, offset=0, before=None, after=None):
+        return await self._page(
+            f"""
+            SELECT {COLUMNS} FROM agent_messages
+            WHERE ((sender_id = ? AND recipient_id = ?) OR (sender_id = ? AND recipient_id = ?))
+            """,
+            [agent_id, other_agent_id, other_agent_id, agent_id],
+            limit, offset, before, after,
+        )
+
+    async def agent_messages(self, agent_id, start_time=None, end_time=None, message_type=None,
+                             limit=100, offset=0, before=None, after=None):
+        query = f"SELECT {COLUMNS} FROM agent_messages WHERE (sender_id = ? OR recipient_id = ? OR recipient_id IS NULL)"
+        params = [agent_id, agent_id]
+        if start_time is not None:
+            query += " AND timestamp >= ?"
+            params.append(start_time)
+        if end_time is not None:
+            query += " AND timestamp <= ?"
+            params.append(end_time)
+        if message_type is not None:
+            query += " AND message_type = ?"
+            params.append(message_type)
+        return await self._page(query, params, limit, offset, before, after)
+
+    async def export_messages(self, agent_id, start_time=None, end_time=None, message_type=None, peer_id=None,
+                              chunk_size=1000):
+        if peer_id is not None:
+            query = f"""
+                SELECT {COLUMNS} FROM agent_messages
+                WHERE ((sender_id = ? AND recipient_id = ?) OR (sender_id = ? AND recipient_id = ?))
+            """
+            params = [agent_id, peer_id, peer_id, agent_id]
+        else:
+            query = f"SELECT {COLUMNS} FROM agent_messages WHERE (sender_id = ? OR recipient_id = ? OR recipient_id IS NULL)"
+            params = [agent_id, agent_id]
+        if start_time is not None:
+            query += " AND timestamp >= ?"
+            params.append(start_time)
+        if end_time is not None:
+            query += " AND timestamp <= ?"
+            params.append(end_time)
+        if message_type is not None:
+            query += " AND message_type = ?"
+            params.append(message_type)
+        query += " ORDER BY timestamp, message_id"
+
+        cursor = await self._run(self.conn.execute, query, params)
+        try:
+            while True:
+                rows = await self._run(cursor.fetchmany, chunk_size)
+                if not rows:
+                    return
+                yield [dict(row) for row in rows]
+        finally:
+            await self._run(cursor.close)
+
+    async def search_messages(self, agent_id, query, sender_id=None, recipient_id=None, message_type=None,
+                              start_time=None, end_time=None, limit=50, cursor=None):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        # bm25 is lower-is-better and depends on corpus statistics, so ranks can shift a little between pages
+        sql = f"""
+            SELECT {COLUMNS}, -bm25(agent_messages_fts) AS rank
+            FROM agent_messages_fts JOIN agent_messages ON agent_messages.seq = agent_messages_fts.rowid
+            WHERE agent_messages_fts MATCH ?
+              AND (sender_id = ? OR recipient_id = ? OR recipient_id IS NULL)
+        """
+        params = [" ".join(f'"{term}"' for term in terms), agent_id, agent_id]
+        for column, value in (("sender_id", sender_id), ("recipient_id", recipient_id),
+                              ("message_type", message_type)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        if start_time is not None:
+            sql += " AND timestamp >= ?"
+            params.append(start_time)
+        if end_time is not None:
+            sql += " AND timestamp <= ?"
+            params.append(end_time)
+        sql = f"SELECT * FROM ({sql}) hits"
+        if cursor is not None:
+            sql += " WHERE (rank, ts, message_id) < (?, ?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY rank DESC, ts DESC, message_id DESC LIMIT ?"
+        params.append(limit)
+        return await self._fetch(sql, *params)
+
+    async def thread(self, correlation_id, agent_id, limit=500, after=None):
+        query = f"""
+            SELECT {COLUMNS} FROM agent_messages
+            WHERE correlation_id = ?
+              AND (sender_id = ? OR recipient_id = ? OR recipient_id IS NULL)
+        """
+        params = [correlation_id, agent_id, agent_id]
+        if after is not None:
+            query += " AND (timestamp, message_id) > (?, ?)"
+            params.extend(after)
+        query += " ORDER BY timestamp, message_id LIMIT ?"
+        params.append(limit)
+        return await self._fetch(query, *params)
+
+    async def agent_summaries(self, agent_id):
+        return await self._fetch(
+            """
+            SELECT peer_id AS agent_id, last_message_at AS last_message_time,
+                   last_message_preview, message_count, unread_count
+            FROM conversation_summaries
+            WHERE agent_id = ?
+            ORDER BY last_message_at DESC
+            """,
+            agent_id,
+        )
+
+    async def mark_read(self, agent_id, peer_id):
+        await self._run(
+            self.conn.execute,
+            "UPDATE conversation_summaries SET unread_count = 0 WHERE agent_id = ? AND peer_id = ?",
+            (agent_id, peer_id),
+        )
@@ -0,0 +1,61 @@
+"""JWT verification shared by the gRPC server and the REST API.
+
+Agents and the dashboard present the same token on every call, so verified
+tokens are cached by their SHA-256 digest until they expire (or at most
+``max_ttl`` seconds). A cache hit skips the HMAC check and claim parsing.
+"""
+
+import collections
+import hashlib
+import time
+
+import jwt
+
+DEFAULT_CACHE_SIZE = 10000
+# Cached tokens are re-verified at least this often, including tokens without an exp claim
+DEFAULT_MAX_TTL = 300
+
+
+class TokenVerifier:
+    """Verifies HS256 tokens, raising PyJWT's ExpiredSignatureError / InvalidTokenError like jwt.decode"""
+
+    def __init__(self, secret, algorithm, max_size=DEFAULT_CACHE_SIZE, max_ttl=DEFAULT_MAX_TTL):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self._cache = collections.OrderedDict()  # token digest -> (claims, valid_until)
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token):
+        """Return the token's claims; the dict is shared between callers, so treat it as read-only"""
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        entry = self._cache.get(key)
+        if entry is not None:
+            claims, valid_until = entry
+            if now < valid_until:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._cache[key]
+
+        self.misses += 1
+        claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        valid_until = now + self.max_ttl
+        if isinstance(claims.get("exp"), (int, float)):
+            valid_until = min(valid_until, claims["exp"])
+        self._cache[key] = (claims, valid_until)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return claims
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._cache),
+        }
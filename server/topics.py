@@ -0,0 +1,102 @@
+"""Server-side index of agent topic subscriptions.
+
+Topics are dot-separated (``tasks.code.python``). Subscription patterns may use
+``*`` to match exactly one segment and ``#`` to match zero or more segments,
+so ``tasks.code.*`` matches ``tasks.code.python`` and ``tasks.#`` matches
+everything under ``tasks``.
+"""
+
+SINGLE_WILDCARD = "*"
+MULTI_WILDCARD = "#"
+# Cached topic -> subscribers lookups kept before the cache is reset
+MAX_CACHED_TOPICS = 10000
+
+
+class _Node:
+    __slots__ = ("children", "agents")
+
+    def __init__(self):
+        self.children = {}
+        self.agents = set()
+
+
+class SubscriptionIndex:
+    """Trie of subscription patterns with a per-topic cache of matching agents"""
+
+    def __init__(self):
+        self.root = _Node()
+        self.patterns = {}  # agent_id -> set of patterns
+        self._cache = {}    # topic -> frozenset of agent_ids
+
+    def subscribe(self, agent_id, pattern):
+        """Add a subscription; returns False if the agent already had it"""
+        patterns = self.patterns.setdefault(agent_id, set())
+        if pattern in patterns:
+            return False
+        patterns.add(pattern)
+        node = self.root
+        for segment in pattern.split("."):
+            node = node.children.setdefault(segment, _Node())
+        node.agents.add(agent_id)
+        self._cache.clear()
+        return True
+
+    def unsubscribe(self, agent_id, pattern):
+        """Remove a subscription; returns False if the agent did not have it"""
+        patterns = self.patterns.get(agent_id)
+        if not patterns or pattern not in patterns:
+            return False
+        patterns.discard(pattern)
+        if not patterns:
+            del self.patterns[agent_id]
+
+        path = [self.root]
+        for segment in pattern.split("."):
+            path.append(path[-1].children[segment])
+        path[-1].agents.discard(agent_id)
+        # Prune branches that no longer lead to any subscription
+        segments = pattern.split(".")
+        for depth in range(len(segments), 0, -1):
+            node = path[depth]
+            if node.agents or node.children:
+                break
+            del path[depth - 1].children[segments[depth - 1]]
+        self._cache.clear()
+        return True
+
+    def remove_agent(self, agent_id):
+        for pattern in list(self.patterns.get(agent_id, ())):
+            self.unsubscribe(agent_id, pattern)
+
+    def subscriptions(self, agent_id):
+        return set(self.patterns.get(agent_id, ()))
+
+    def match(self, topic):
+        """Every agent with a pattern matching this topic"""
+        agents = self._cache.get(topic)
+        if agents is None:
+            found = set()
+            self._collect(self.root, topic.split("."), 0, found)
+            if len(self._cache) >= MAX_CACHED_TOPICS:
+                self._cache.clear()
+            agents = self._cache[topic] = frozenset(found)
+        return agents
+
+    def _collect(self, node, segments, index, found):
+        multi = node.children.get(MULTI_WILDCARD)
+        if multi is not None:
+            # '#' swallows any number of the remaining segments, including none
+            for rest in range(index, len(segments) + 1):
+                self._collect(multi, segments, rest, found)
+
+        if index == len(segments):
+            found.update(node.agents)
+            return
+
+        exact = node.children.get(segments[index])
+        if exact is not None:
+            self._collect(exact, segments, index + 1, found)
+        single = node.children.get(SINGLE_WILDCARD)
+        if single is not None:
+            self._collect(single, segments, index + 1, found)
+
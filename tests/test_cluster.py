@@ -0,0 +1,125 @@
+"""Several hub nodes on localhost, each with its own MemoryStore, forwarding to each other.
+
+Covers DIRECT messages across nodes (including seqs that collide with the
+owner's own), recipients that are offline when a forward arrives, and the
+broadcast tree.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+
+import grpc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+import agent_comm_pb2  # noqa: E402
+import agent_comm_pb2_grpc  # noqa: E402
+from cluster import ClusterNode  # noqa: E402
+from delivery import DeliveredSeqs  # noqa: E402
+from main import AgentClusterServicer, AgentCommServicer, JWT_ALGORITHM, JWT_SECRET  # noqa: E402
+from storage import MemoryStore  # noqa: E402
+
+DIRECT = agent_comm_pb2.AgentMessage.DIRECT
+BROADCAST = agent_comm_pb2.AgentMessage.BROADCAST
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Node:
+    def __init__(self, node_id, nodes):
+        self.cluster = ClusterNode(node_id, nodes, JWT_SECRET, JWT_ALGORITHM)
+        self.servicer = AgentCommServicer(MemoryStore(), cluster=self.cluster)
+        self.server = grpc.aio.server()
+        agent_comm_pb2_grpc.add_AgentClusterServicer_to_server(AgentClusterServicer(self.servicer), self.server)
+        self.server.add_insecure_port(nodes[node_id])
+
+    async def start(self):
+        await self.server.start()
+        await self.servicer.start()
+
+    async def stop(self):
+        await self.servicer.stop()
+        await self.server.stop(0)
+
+    async def connect(self, agent_id):
+        """Register a stream's queue for agent_id, replaying its stored backlog like _serve_stream does"""
+        queue = await self.servicer.register_queue(agent_id, DeliveredSeqs())
+        await self.servicer.replay_backlog(agent_id, queue, 0)
+        queue.finish_replay()
+        return queue
+
+    async def send(self, sender_id, payload, recipient_id="", message_type=DIRECT):
+        await self.servicer.save_messages([agent_comm_pb2.AgentMessage(
+            sender_id=sender_id, recipient_id=recipient_id, message_type=message_type, payload=payload,
+        )])
+
+
+def owned_agent(node, prefix):
+    """An agent id the ring assigns to this node"""
+    return next(f"{prefix}-{i}" for i in range(10000) if node.cluster.owns(f"{prefix}-{i}"))
+
+
+async def received(queue, count, timeout=5.0):
+    payloads = []
+    for _ in range(count):
+        frame = await asyncio.wait_for(queue.get(), timeout)
+        payloads.append(frame.msg.payload)
+    return payloads
+
+
+def run_cluster(node_count, scenario):
+    async def main():
+        nodes = {f"n{i}": f"127.0.0.1:{free_port()}" for i in range(1, node_count + 1)}
+        cluster = [Node(node_id, nodes) for node_id in nodes]
+        for node in cluster:
+            await node.start()
+        try:
+            await scenario(*cluster)
+        finally:
+            for node in cluster:
+                await node.stop()
+    asyncio.run(main())
+
+
+def test_direct_across_nodes_with_colliding_seqs():
+    async def scenario(n1, n2):
+        sender, recipient = owned_agent(n1, "s"), owned_agent(n2, "r")
+        queue = await n2.connect(recipient)
+        # Both nodes number their own stores from 1
+        await n2.send(owned_agent(n2, "local"), b"local", recipient)
+        await n1.send(sender, b"remote", recipient)
+        assert sorted(await received(queue, 2)) == [b"local", b"remote"]
+
+    run_cluster(2, scenario)
+
+
+def test_forward_to_offline_recipient_is_replayed_on_connect():
+    async def scenario(n1, n2):
+        sender, recipient = owned_agent(n1, "s"), owned_agent(n2, "r")
+        await n1.send(sender, b"while offline", recipient)
+        for _ in range(100):
+            if await n2.servicer.store.messages_after(recipient, 0):
+                break
+            await asyncio.sleep(0.05)
+        queue = await n2.connect(recipient)
+        assert await received(queue, 1) == [b"while offline"]
+
+    run_cluster(2, scenario)
+
+
+def test_broadcast_reaches_every_node_once():
+    async def scenario(*nodes):
+        queues = [await node.connect(owned_agent(node, "b")) for node in nodes]
+        await nodes[0].send(owned_agent(nodes[0], "sender"), b"hello all", message_type=BROADCAST)
+        for queue in queues:
+            assert await received(queue, 1) == [b"hello all"]
+        await asyncio.sleep(0.2)
+        assert [queue.qsize() for queue in queues] == [0] * len(nodes)
+
+    run_cluster(4, scenario)
@@ -0,0 +1,121 @@
+"""EXPLAIN checks for the UNION ALL inbox queries in server/storage/postgres.py.
+
+Each branch of these queries exists to use one index, so every branch's scan
+on agent_messages must be an index scan with an Index Cond on the branch's
+key column (broadcast branches: a partial index on recipient_id IS NULL),
+and no Filter may fall back to an OR across the columns.
+
+Needs a Postgres database from the AGENT_DB_* settings (the migrations are
+applied on connect); skipped when none is reachable.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from storage import create_store  # noqa: E402
+from storage.postgres import agent_messages_query, conversation_query, export_query, inbox_query  # noqa: E402
+
+AGENT = "plan-test-agent"
+PEER = "plan-test-peer"
+HOUR_AGO = time.time() - 3600
+CURSOR = (HOUR_AGO, "00000000-0000-0000-0000-000000000000")
+
+RECIPIENT, SENDER, BROADCAST = "recipient_id", "sender_id", "broadcast"
+
+# name -> (query and params, key of each UNION ALL branch)
+CASES = {
+    "inbox": (inbox_query(AGENT, 0), [RECIPIENT, BROADCAST]),
+    "inbox with sent": (inbox_query(AGENT, 0, include_sent=True), [RECIPIENT, BROADCAST, SENDER]),
+    "messages": (agent_messages_query(AGENT), [RECIPIENT, BROADCAST, SENDER]),
+    "messages filtered": (agent_messages_query(AGENT, start_time=HOUR_AGO, message_type=0),
+                          [RECIPIENT, BROADCAST, SENDER]),
+    "messages before cursor": (agent_messages_query(AGENT, before=CURSOR), [RECIPIENT, BROADCAST, SENDER]),
+    "conversation": (conversation_query(AGENT, PEER), [SENDER, SENDER]),
+    "conversation after cursor": (conversation_query(AGENT, PEER, after=CURSOR), [SENDER, SENDER]),
+    "export": (export_query(AGENT), [RECIPIENT, BROADCAST, SENDER]),
+    "export with peer": (export_query(AGENT, peer_id=PEER), [SENDER, SENDER]),
+}
+
+SCAN_TYPES = ("Index Scan", "Index Only Scan", "Bitmap Index Scan")
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from walk(child)
+
+
+async def explain_cases():
+    store = create_store("postgres")
+    try:
+        await store.connect()
+    except Exception as e:  # refused connections as well as asyncpg's auth and missing-database errors
+        pytest.skip(f"Postgres not available: {e}")
+    plans = {}
+    try:
+        async with store.pool.acquire() as conn, conn.transaction():
+            # An empty test table makes a seq scan cheapest; this asks whether the index scans are possible at all
+            await conn.execute("SET LOCAL enable_seqscan = off")
+            for name, ((query, *params), _) in CASES.items():
+                plan = json.loads(await conn.fetchval("EXPLAIN (FORMAT JSON) " + query, *params))[0]
+                plans[name] = list(walk(plan["Plan"]))
+            index_names = {node["Index Name"] for nodes in plans.values() for node in nodes if "Index Name" in node}
+            rows = await conn.fetch("SELECT indexname, indexdef FROM pg_indexes WHERE indexname = ANY($1)",
+                                    list(index_names))
+            index_defs = {row["indexname"]: row["indexdef"] for row in rows}
+    finally:
+        await store.close()
+    return plans, index_defs
+
+
+@pytest.fixture(scope="module")
+def plans():
+    return asyncio.run(explain_cases())
+
+
+def branch_key(node, index_defs):
+    """Which kind of branch an index scan serves, or None if it has no usable Index Cond"""
+    condition = node.get("Index Cond", "")
+    if f"{RECIPIENT} =" in condition and f"{SENDER} =" not in condition:
+        return RECIPIENT
+    if f"{SENDER} =" in condition:
+        return SENDER
+    # Broadcast branches have no key column; their partial index's predicate is the condition
+    if "WHERE (recipient_id IS NULL)" in index_defs.get(node["Index Name"], ""):
+        return BROADCAST
+    return None
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_union_branches_use_their_index(plans, name):
+    nodes, index_defs = plans[0][name], plans[1]
+    expected = CASES[name][1]
+    tables = [node for node in nodes if node.get("Relation Name", "").startswith("agent_messages")]
+    scans = [node for node in nodes if node["Node Type"] in SCAN_TYPES and "Index Name" in node]
+    assert not [node for node in tables if node["Node Type"] == "Seq Scan"], f"{name} has a sequential scan"
+
+    keys = [branch_key(node, index_defs) for node in scans]
+    assert None not in keys, f"{name} has an index scan without a branch key: {scans[keys.index(None)]}"
+    for key in set(expected):
+        # A partitioned table has one scan per partition for each branch
+        assert keys.count(key) >= expected.count(key), f"{name}: no {key} branch in {keys}"
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_no_or_filters(plans, name):
+    for node in plans[0][name]:
+        for field in ("Filter", "Recheck Cond"):
+            assert " OR " not in node.get(field, ""), f"{name}: {field} {node[field]}"
+
+
+@pytest.mark.parametrize("name", ["export", "export with peer"])
+def test_export_merges_branches_in_index_order(plans, name):
+    types = [node["Node Type"] for node in plans[0][name]]
+    assert "Merge Append" in types and "Sort" not in types, f"{name}: {types}"